@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Admission control of the work of customs agents.
+
+Customs agents do customs checks of containers and assist PA officers with physical inspections.
+A PA officer takes its agent out of the customs checks for the whole walk to the container and the
+inspection, so under load the PA assistance can starve the customs checks (and vice versa).
+"""
+from components import AgentState
+import utils
+
+# classes of pending work (also used as keys of the queue-wait statistics)
+PA_CHECK = 'pa-check'
+CUSTOMS_CHECK = 'customs-check'
+PA_ASSISTANCE = 'pa-assistance'
+
+
+class AdmissionControl:
+    def __init__(self, reserve: int = 0, limit: int = 0, priority: str = CUSTOMS_CHECK, meet_at_container: bool = False):
+        if priority not in (CUSTOMS_CHECK, PA_ASSISTANCE):
+            raise ValueError(f'unknown priority {priority}, use {CUSTOMS_CHECK} or {PA_ASSISTANCE}')
+        self.reserve = reserve
+        self.limit = limit
+        self.priority = priority
+        self.meet_at_container = meet_at_container
+
+    @classmethod
+    def from_config(cls, config: utils.ConfigAdmission):
+        return cls(config.reserve, config.limit, config.priority, config.meet_at_container)
+
+    def agents_for_checks(self, agents: list) -> list:
+        """Idle agents which may start a customs check, the last reserve of them is kept for PA assistance"""
+        idle = [agent for agent in agents if agent.state == AgentState.IDLE]
+        return idle[:max(0, len(idle) - self.reserve)]
+
+    def agents_for_assistance(self, agents: list, officers: list) -> list:
+        """Idle agents which may be paired with PA officers without exceeding the limit"""
+        idle = [agent for agent in agents if agent.state == AgentState.IDLE]
+        if self.limit:
+            paired = sum(1 for officer in officers if officer.paired)
+            idle = idle[:max(0, self.limit - paired)]
+        return idle
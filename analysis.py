@@ -1,22 +1,292 @@
 #!/usr/bin/env python3
-import subprocess
-import shlex
-from utils import CONFIG
-from random import getrandbits
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+import logging
+import os
+import random
+import threading
+import time
+import utils
+
+LATENCIES = deque(maxlen=1000)  # durations of the recent analysis calls (in seconds)
+COUNTERS = Counter()  # calls, failures, timeouts, fallbacks... of the analysis (see ResilientAnalysis)
+
+# fallbacks of failed analysis calls
+CACHE = 'cache'  # the last decision for the same input (or INSPECT if there is none)
+INSPECT = 'inspect'  # the positive (conservative) decision, i.e. inspect the container
+FAKE = 'fake'  # the fake analysis
+
+# launchers of the analysis
+ECLIPSE = 'eclipse'
+APPCDS = 'appcds'  # tuned JVM flags and application class data sharing
+
+_archive_lock = threading.Lock()
+_archive_attempted = False  # whether a call creating the class data sharing archive was made
+
+PREFETCHER = None  # set by configure if the analysis is prefetched
+_configured = False
+
+_decisions = threading.local()  # source of random decisions of the fake analysis in the current thread
+
+
+def class_data_sharing_flags(archive: str) -> list[str]:
+    """JVM flags creating the archive of loaded classes (by the first call only) or using it once it exists"""
+    global _archive_attempted
+    if os.path.exists(archive):
+        return ['-XX:SharedArchiveFile=' + archive]
+    with _archive_lock:
+        create = not _archive_attempted
+        _archive_attempted = True
+    if create:
+        logging.warning('Creating the class data sharing archive %s', archive)
+        return ['-XX:ArchiveClassesAtExit=' + archive]
+    return []
+
+
+def reset_class_data_sharing(archive: str) -> None:
+    """Removes the archive, it is created again by the next call"""
+    global _archive_attempted
+    if os.path.exists(archive):
+        os.remove(archive)
+    _archive_attempted = False
+
+
+def launcher_arguments(config: utils.ConfigAnalysis) -> list[str]:
+    """Additional arguments of the analysis launcher"""
+    if config.launcher == APPCDS:
+        # the JVM flags are appended to the ones of eclipse.ini
+        return ['--launcher.appendVmargs', '-vmargs'] + config.jvm_flags + class_data_sharing_flags(config.cds_archive)
+    return []
+
+
+class AnalysisError(Exception):
+    """Failed call of the analysis"""
+
+
+class AnalysisTimeout(AnalysisError):
+    pass
 
 
 def actual_execute_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
-    args = shlex.split("analysis/eclipse -f " + CONFIG.analysis.model_path + " -u " + scenario + " -c " + variable_name + ":" + variable_value)
-    decision = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if decision.returncode == 10:
+    import subprocess
+    import shlex
+    import signal
+    config = utils.CONFIG.analysis
+    args = shlex.split(config.executable + " -f " + config.model_path + " -u " + scenario + " -c " + variable_name + ":" + variable_value)
+    args += launcher_arguments(config)
+    # in its own process group, so that the JVM started by the launcher is killed with it
+    try:
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    except OSError as e:  # missing or not executable launcher, failed fork
+        raise AnalysisError(f'cannot start {args[0]}: {e}') from e
+    try:
+        process.communicate(timeout=config.timeout or None)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        raise AnalysisTimeout(f'no decision in {config.timeout} s') from None
+    if process.returncode == 10:
         return True
-    return False
+    if process.returncode == 0:
+        return False
+    raise AnalysisError(f'exit code {process.returncode}')
+
+
+class CircuitBreaker:
+    """Opens after the threshold of consecutive failures; when open, calls are not made until the reset timeout
+    elapses, then a single trial call closes it again (or opens it for another reset timeout); a trial which does
+    not report back within the reset timeout is replaced by another one"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened = 0.  # time of opening, or of the start of the trial call when half-open
+
+    def allow(self) -> bool:
+        if self.state != CircuitBreaker.CLOSED and time.monotonic() - self._opened >= self.reset_timeout:
+            self.state = CircuitBreaker.HALF_OPEN
+            self._opened = time.monotonic()
+            return True
+        return self.state == CircuitBreaker.CLOSED
+
+    def success(self) -> None:
+        self.state = CircuitBreaker.CLOSED
+        self._failures = 0
+
+    def failure(self) -> bool:
+        """Records the failure, returns whether the breaker opened"""
+        self._failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN or (self.state == CircuitBreaker.CLOSED and self._failures >= self.threshold):
+            self.state = CircuitBreaker.OPEN
+            self._opened = time.monotonic()
+            return True
+        return False
+
+
+class ResilientAnalysis:
+    """Analysis backend whose failed calls (and calls while the circuit breaker is open) are decided by the fallback"""
+
+    def __init__(self, backend, fallback: str = INSPECT, threshold: int = 5, reset_timeout: float = 30., cache_size: int = 4096):
+        if fallback not in (CACHE, INSPECT, FAKE):
+            raise ValueError(f'unknown fallback {fallback}, use {CACHE}, {INSPECT} or {FAKE}')
+        self.backend = backend
+        self.fallback = fallback
+        self.breaker = CircuitBreaker(threshold, reset_timeout)
+        self.cache_size = cache_size
+        self._decisions = OrderedDict()  # the last decisions by inputs, the least recently used first
+        self._lock = threading.Lock()
+
+    def __call__(self, scenario: str, variable_name: str, variable_value: str) -> bool:
+        key = (scenario, variable_name, variable_value)
+        with self._lock:
+            COUNTERS['calls'] += 1
+            allowed = self.breaker.allow()
+            if not allowed:
+                COUNTERS['short_circuited'] += 1
+        if not allowed:
+            return self.decide_by_fallback(key)
+        try:
+            decision = self.backend(scenario, variable_name, variable_value)
+        except AnalysisError as e:
+            logging.warning('Analysis %s/%s:%s failed: %s', scenario, variable_name, variable_value, e)
+            with self._lock:
+                COUNTERS['timeouts' if isinstance(e, AnalysisTimeout) else 'failures'] += 1
+                if self.breaker.failure():
+                    COUNTERS['breaker_opened'] += 1
+                    logging.warning('Analysis circuit breaker opened for %g s', self.breaker.reset_timeout)
+            return self.decide_by_fallback(key)
+        except BaseException:
+            with self._lock:  # not a failure of the analysis, but the breaker must not wait for the call forever
+                COUNTERS['failures'] += 1
+                if self.breaker.failure():
+                    COUNTERS['breaker_opened'] += 1
+            raise
+        with self._lock:
+            self.breaker.success()
+            if self.fallback == CACHE:
+                self._decisions[key] = decision
+                self._decisions.move_to_end(key)
+                if len(self._decisions) > self.cache_size:
+                    self._decisions.popitem(last=False)
+        return decision
+
+    def decide_by_fallback(self, key: tuple) -> bool:
+        with self._lock:
+            COUNTERS['fallbacks'] += 1
+            if self.fallback == CACHE and key in self._decisions:
+                return self._decisions[key]
+        if self.fallback == FAKE:
+            return fake_execute_analysis(*key)
+        return True
+
+
+@contextmanager
+def random_source(source):
+    """Random decisions of the fake analysis in the current thread are taken from the source (the global one by default)"""
+    previous = getattr(_decisions, 'random', None)
+    _decisions.random = source
+    try:
+        yield
+    finally:
+        _decisions.random = previous
 
 
 def fake_execute_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
-    return not getrandbits(1)
+    return not (getattr(_decisions, 'random', None) or random).getrandbits(1)
+
+
+class Prefetcher:
+    """Analysis queries executed speculatively in background threads, their results are used by the same queries later
+
+    A query is kept while a container which prefetched it is in the terminal. If the inputs change meanwhile
+    (e.g. the error rate of a country), the later query differs and is executed again.
+    """
+
+    def __init__(self, backend, workers: int = 4):
+        from concurrent.futures import ThreadPoolExecutor
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='Prefetch')
+        self._pending = {}  # query -> future decision
+        self._references = Counter()  # query -> number of containers which prefetched it
+        self._lock = threading.Lock()
+
+    def prefetch(self, queries: list) -> None:
+        with self._lock:
+            for query in queries:
+                self._references[query] += 1
+                if query not in self._pending:
+                    self._pending[query] = self._executor.submit(self.backend, *query)
+
+    def release(self, queries) -> None:
+        with self._lock:
+            for query in queries:
+                self._references[query] -= 1
+                if self._references[query] <= 0:
+                    del self._references[query]
+                    self._pending.pop(query, None)
+
+    def execute_analysis(self, scenario: str, variable_name: str, variable_value: str) -> bool:
+        with self._lock:
+            future = self._pending.get((scenario, variable_name, variable_value))
+            COUNTERS['prefetch_misses' if future is None else 'prefetch_hits'] += 1
+        if future is None:
+            return self.backend(scenario, variable_name, variable_value)
+        return future.result()
+
+
+def prefetching() -> bool:
+    """Whether the analysis queries are prefetched (see Prefetcher)"""
+    if not _configured:
+        configure(utils.CONFIG.analysis)
+    return PREFETCHER is not None
+
+
+def prefetch(queries: list) -> tuple:
+    """Starts the queries in the background, returns them to be released when not needed anymore"""
+    PREFETCHER.prefetch(queries)
+    return tuple(queries)
+
+
+def release(queries) -> None:
+    if queries and PREFETCHER is not None:
+        PREFETCHER.release(queries)
+
+
+def timed(backend):
+    """Wraps the backend so that durations of its calls are recorded to LATENCIES"""
+    def timed_execute_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
+        start = time.perf_counter()
+        try:
+            return backend(scenario, variable_name, variable_value)
+        finally:
+            LATENCIES.append(time.perf_counter() - start)
+    return timed_execute_analysis
+
+
+def configure(config: utils.ConfigAnalysis) -> None:
+    """Selects the analysis backend used by execute_analysis"""
+    global execute_analysis, PREFETCHER, _configured
+    _configured = True
+    PREFETCHER = None
+    execute_analysis = timed(fake_execute_analysis)
+    if not config.fake:
+        backend = ResilientAnalysis(actual_execute_analysis, config.fallback, config.failure_threshold, config.reset_timeout)
+        if config.decision_table:
+            import decision_tables
+            backend = decision_tables.table_backend(config, backend)
+        if config.prefetch:
+            # the fake analysis is not prefetched, its random decisions would not be reproducible
+            PREFETCHER = Prefetcher(backend, config.prefetch_workers)
+            backend = PREFETCHER.execute_analysis
+        execute_analysis = timed(backend)
 
 
-execute_analysis = fake_execute_analysis
-if not CONFIG.analysis.fake:
-    execute_analysis = actual_execute_analysis
+def execute_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
+    """Replaced by the backend selected from the current configuration on the first call"""
+    configure(utils.CONFIG.analysis)
+    return execute_analysis(scenario, variable_name, variable_value)
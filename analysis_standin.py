@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Stand-in for the analysis launcher (analysis/eclipse) for testing without the dataflow analysis.
+
+Accepts the same arguments (-f model -u scenario -c variable:value [--launcher.appendVmargs] [-vmargs flags...]),
+exits with 10 for the positive decision like the analysis. The decisions are simple thresholds, the durations
+imitate the JVM startup: the class data sharing archive (-XX:SharedArchiveFile) and the C1-only compilation
+(-XX:TieredStopAtLevel=1) shorten it, creating the archive (-XX:ArchiveClassesAtExit) prolongs it.
+
+Use it by setting analysis->executable to "python analysis_standin.py".
+"""
+import os
+import sys
+import time
+
+STARTUP = 0.3  # in seconds
+CDS_SAVING = 0.12
+C1_SAVING = 0.04
+ARCHIVING = 0.2
+
+
+def decide(scenario: str, variable_name: str, value: str) -> bool:
+    if scenario == 'Dangerous':
+        return value == 'Dangerous'
+    if scenario == 'VirtualInspection':
+        return float(value) > 0.1
+    if scenario == 'Tax':
+        return not 0.5 <= float(value) <= 1.5
+    return False
+
+
+def main(argv: list[str]) -> int:
+    options = {}
+    vmargs = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == '-vmargs':
+            vmargs = argv[i + 1:]
+            break
+        if argv[i] in ('-f', '-u', '-c'):
+            options[argv[i]] = argv[i + 1]
+            i += 2
+        else:
+            i += 1
+    duration = STARTUP
+    archive_to_create = None
+    for flag in vmargs:
+        if flag.startswith('-XX:SharedArchiveFile=') and os.path.exists(flag.split('=', 1)[1]):
+            duration -= CDS_SAVING
+        elif flag.startswith('-XX:ArchiveClassesAtExit='):
+            archive_to_create = flag.split('=', 1)[1]
+            duration += ARCHIVING
+        elif flag == '-XX:TieredStopAtLevel=1':
+            duration -= C1_SAVING
+    time.sleep(duration)
+    if archive_to_create:
+        with open(archive_to_create, 'wb') as f:
+            f.write(b'stand-in class data archive')
+    variable_name, value = options['-c'].split(':', 1)
+    return 10 if decide(options['-u'], variable_name, value) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
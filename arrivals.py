@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Sources of containers arriving to the terminal."""
+import json
+import logging
+import queue
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import cache
+
+from components import Container, ContainerPool, Declaration, ListOfItems
+import helpers
+
+
+class ArrivalSource(ABC):
+    """Checked by the simulation in each step; a ready container waits until there is a place for it"""
+
+    @abstractmethod
+    def ready(self, tick: int) -> bool:
+        """Whether a container is ready to arrive at the step"""
+
+    @abstractmethod
+    def take(self, tick: int) -> Container:
+        """The ready container, called only if ready() returned True"""
+
+
+class GeneratedArrivals(ArrivalSource):
+    """Randomly generated containers (see helpers.generate_container) arriving periodically"""
+
+    def __init__(self, period: int, pool: ContainerPool = None):
+        self.period = period
+        self.pool = pool
+        self.next_arrival = 1
+
+    def ready(self, tick: int) -> bool:
+        return tick >= self.next_arrival
+
+    def take(self, tick: int) -> Container:
+        self.next_arrival = tick + self.period + 1
+        return helpers.generate_container(self.pool)
+
+
+@dataclass(frozen=True)
+class Manifest:
+    arrival: int
+    items: ListOfItems
+    declared_items: ListOfItems
+    source: int
+    destination: int
+    company: int
+    tax: int
+    declared_tax: int
+
+
+@cache
+def catalog() -> dict:
+    """Items of the catalog keyed by their titles"""
+    items = {}
+    for item in helpers.items():
+        items.setdefault(item.description, item)
+    return items
+
+
+def parse_manifest(record: dict) -> Manifest:
+    """Manifest from a JSON record with the keys
+
+    items (list of catalog keys, i.e., item titles), source, destination, company, declared_tax and optionally
+    arrival (step, default 0, i.e. as soon as possible), declared_items (default items), tax (default computed from items)
+    """
+    items_by_key = catalog()
+    items = [items_by_key[key] for key in record['items']]
+    declared_items = [items_by_key[key] for key in record['declared_items']] if 'declared_items' in record else items
+    countries = helpers.country_ids()
+    return Manifest(int(record.get('arrival', 0)), items, declared_items,
+                    countries.intern(record['source']), countries.intern(record['destination']),
+                    helpers.company_ids().intern(record['company']),
+                    int(record['tax']) if 'tax' in record else helpers.get_items_tax(items),
+                    int(record['declared_tax']))
+
+
+_END = object()
+
+
+class ManifestArrivals(ArrivalSource):
+    """Containers of manifests read from a JSON-lines file (one manifest per line, ordered by arrival)
+
+    A background thread parses the file ahead into a bounded buffer, so the memory does not depend on the size
+    of the file and parsing does not delay the steps.
+    """
+
+    def __init__(self, path: str, read_ahead: int = 1024, pool: ContainerPool = None):
+        self.path = path
+        self.pool = pool if pool is not None else ContainerPool()
+        self._buffer = queue.Queue(maxsize=read_ahead)
+        self._next = None
+        self._finished = False
+        self._reader = threading.Thread(target=self._read, name='ManifestReader', daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        manifest = parse_manifest(json.loads(line))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logging.warning('Skipping manifest on line %d of %s: %r', line_number, self.path, e)
+                        continue
+                    self._buffer.put(manifest)
+        except OSError as e:
+            logging.error('Cannot read manifests from %s: %s', self.path, e)
+        finally:
+            self._buffer.put(_END)
+
+    def ready(self, tick: int) -> bool:
+        if self._next is None:
+            if self._finished:
+                return False
+            manifest = self._buffer.get()  # blocks only if the reader is behind
+            if manifest is _END:
+                self._finished = True
+                return False
+            self._next = manifest
+        return self._next.arrival <= tick
+
+    def take(self, tick: int) -> Container:
+        manifest = self._next
+        self._next = None
+        return self.pool.acquire(helpers.next_container_id(), manifest.company, manifest.items, manifest.tax,
+                                         Declaration(manifest.declared_items, manifest.source, manifest.destination, manifest.declared_tax))
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+
+def create_arrivals(manifests: str, period: int, read_ahead: int, pool: ContainerPool = None) -> ArrivalSource:
+    if manifests:
+        return ManifestArrivals(manifests, read_ahead, pool)
+    return GeneratedArrivals(period, pool)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""Benchmarks of the simulation.
+
+Usage: python benchmarks.py <benchmark> [options], see python benchmarks.py --help
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ('tkinter', 'PIL', 'yaml', 'dataclass_wizard', 'subprocess', 'multiprocessing')
+
+FIRST_STEP = 'import utils; utils.load_config(); from simulation import Simulation; Simulation().step()'
+
+
+def import_time(module: str) -> (int, list[str]):
+    """Cumulative import time of the module in us (as reported by python -X importtime) and heavy modules it loads"""
+    code = f'import sys, {module}; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1])
+    return cumulative, [m for m in result.stdout.strip().split(',') if m]
+
+
+def process_time(code: str) -> float:
+    """Wall time of a new interpreter executing the code (in seconds)"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True)
+    return time.perf_counter() - start
+
+
+def benchmark_startup(args):
+    baseline = statistics.median(process_time('pass') for _ in range(args.repeat))
+    print(f'interpreter startup: {baseline * 1000:.1f} ms')
+    for module in args.modules:
+        times = []
+        heavy = []
+        for _ in range(args.repeat):
+            cumulative, heavy = import_time(module)
+            times.append(cumulative)
+        print(f'import {module}: {statistics.median(times) / 1000:.1f} ms, heavy modules loaded: {", ".join(heavy) or "none"}')
+    first_step = statistics.median(process_time(FIRST_STEP) for _ in range(args.repeat))
+    print(f'startup to the first simulation step: {(first_step - baseline) * 1000:.1f} ms (excluding interpreter startup)')
+
+
+def benchmark_scheduling(args):
+    import runner
+    import scheduling
+    import utils
+    utils.load_config()
+    for name in scheduling.SCHEDULERS.keys():
+        utils.CONFIG.simulation.scheduler = name
+        statistics, elapsed = runner.run(args.steps, args.seed)
+        removed = statistics.containers_stat['removed']
+        print(f'{name}: throughput {removed * 1000 / args.steps:.1f} containers per 1000 steps, '
+              f'mean dwell time {statistics.mean_dwell_time():.1f} steps, {args.steps / elapsed:.0f} steps/s')
+
+
+def benchmark_launcher(args):
+    import analysis
+    import utils
+    utils.load_config()
+    config = utils.CONFIG.analysis
+    if args.executable:
+        config.executable = args.executable
+    for launcher in (analysis.ECLIPSE, analysis.APPCDS):
+        config.launcher = launcher
+        analysis.reset_class_data_sharing(config.cds_archive)
+        times = []
+        for _ in range(args.calls + 1):
+            start = time.perf_counter()
+            analysis.actual_execute_analysis('VirtualInspection', 'incidentRate', '0.5')
+            times.append(time.perf_counter() - start)
+        print(f'{launcher}: cold call {times[0] * 1000:.0f} ms, warm call {statistics.median(times[1:]) * 1000:.0f} ms (median of {args.calls})')
+
+
+def benchmark_agents(args):
+    import hashlib
+    import components
+    import utils
+    from simulation import Simulation
+    utils.load_config()
+    utils.CONFIG.simulation.stepping = 'sequential'
+    random.seed(args.seed)
+    simulation = Simulation()
+    agents = simulation.agents + simulation.paagents
+    timer = time.perf_counter
+    elapsed = 0.
+    calls = 0
+    step = components.Agent.step
+
+    def timed_step(agent):
+        nonlocal elapsed, calls
+        start = timer()
+        step(agent)
+        elapsed += timer() - start
+        calls += 1
+    components.Agent.step = timed_step
+    digest = hashlib.sha256()  # of the states and positions of the agents after each step
+    try:
+        for _ in range(args.steps):
+            simulation.step()
+            digest.update(repr([(agent.state.value, agent.pos_x, agent.pos_y) for agent in agents]).encode())
+    finally:
+        components.Agent.step = step
+    print(f'{elapsed / calls * 1e6:.2f} us per agent step ({calls} steps of customs agents and PA officers), trace {digest.hexdigest()[:16]}')
+
+
+def scale_run(data_dir: str, steps: int, seed: int, manifests: bool, results) -> None:
+    """Measurements of a simulation of the world in the data directory (in a new process, the data are cached by helpers)"""
+    import resource
+    import helpers
+    import history
+    import utils
+    from simulation import Simulation
+    utils.load_config()
+    utils.CONFIG.simulation.data_dir = data_dir
+    if manifests:
+        utils.CONFIG.simulation.manifests = os.path.join(data_dir, 'manifests.jsonl')
+    result = {}
+    start = time.perf_counter()
+    helpers.items(), helpers.country_ids(), helpers.company_ids()
+    result['load'] = time.perf_counter() - start
+    start = time.perf_counter()
+    statistics = helpers.Statistics()
+    result['statistics'] = time.perf_counter() - start
+    random.seed(seed)
+    simulation = Simulation(statistics)
+    simulation.step()  # the first step loads the catalog of manifests
+    start = time.perf_counter()
+    for _ in range(steps):
+        simulation.step()
+    result['steps_per_second'] = steps / (time.perf_counter() - start)
+    for name, function in (('history_sample', lambda: history.sample(simulation)), ('shared_counters', statistics.shared_counters),
+                           ('summary', statistics.summary)):
+        start = time.perf_counter()
+        for _ in range(10):
+            function()
+        result[name] = (time.perf_counter() - start) / 10
+    result['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # in MB (reported in KB on Linux)
+    results.put(result)
+
+
+def benchmark_scale(args):
+    import multiprocessing
+    import tempfile
+    import worldgen
+    context = multiprocessing.get_context('spawn')
+    print('countries companies items: data load, Statistics(), steps/s, history sample, shared counters (terminal sync), summary, max RSS')
+    for size in args.sizes:
+        countries, companies, items = (int(n) for n in size.split(':'))
+        data_dir = os.path.join(args.worlds or tempfile.gettempdir(), f'world-{countries}-{companies}-{items}')
+        if not os.path.exists(os.path.join(data_dir, 'amazondata_electronics.txt')):
+            start = time.perf_counter()
+            worldgen.generate(data_dir, countries, companies, items, args.steps // 10 if args.manifests else 0, args.seed)
+            print(f'(world {size} generated in {time.perf_counter() - start:.1f} s)')
+        results = context.Queue()
+        process = context.Process(target=scale_run, args=(data_dir, args.steps, args.seed, args.manifests, results))
+        process.start()
+        result = results.get()
+        process.join()
+        print(f'{countries} {companies} {items}: {result["load"]:.2f} s, {result["statistics"] * 1000:.1f} ms, {result["steps_per_second"]:.0f} steps/s, '
+              f'{result["history_sample"] * 1e6:.0f} us, {result["shared_counters"] * 1000:.2f} ms, {result["summary"] * 1000:.1f} ms, '
+              f'{result["max_rss"]:.0f} MB')
+
+
+def stepping_run(stepping: str, plan_workers: int, steps: int, seed: int, results) -> None:
+    """Summary of a headless run with the stepping (in a new process, as the planning threads and caches are per process)"""
+    import runner
+    import utils
+    utils.load_config()
+    utils.CONFIG.simulation.stepping = stepping
+    utils.CONFIG.simulation.plan_workers = plan_workers
+
+    class Replanned:
+        def __init__(self):
+            self.count = 0
+
+        def tick(self, simulation, tick):
+            self.count = simulation.replanned
+    replanned = Replanned()
+    statistics, elapsed = runner.run(steps, seed, [replanned])
+    results.put((statistics.summary(), steps / elapsed, replanned.count))
+
+
+def benchmark_stepping(args):
+    import multiprocessing
+    context = multiprocessing.get_context('spawn')
+    modes = [('sequential', 1)] + [('two-phase', workers) for workers in args.plan_workers]
+    different = 0
+    for seed in range(args.first_seed, args.first_seed + args.seeds):
+        runs = []
+        for stepping, workers in modes:
+            results = context.Queue()
+            process = context.Process(target=stepping_run, args=(stepping, workers, args.steps, seed, results))
+            process.start()
+            runs.append(results.get())
+            process.join()
+        same = all(summary == runs[0][0] for summary, _, _ in runs)
+        different += not same
+        print(f'seed {seed}: {"same" if same else "DIFFERENT"}, ' + ', '.join(
+            f'{stepping} {workers}: {rate:.0f} steps/s' + (f' ({replanned} plans repeated)' if stepping == 'two-phase' else '')
+            for (stepping, workers), (_, rate, replanned) in zip(modes, runs)))
+    if different:
+        sys.exit(1)
+
+
+def benchmark_memory(args):
+    import tracemalloc
+    import utils
+    from memory import steady_memory
+    from simulation import Simulation
+    utils.load_config()
+    random.seed(args.seed)
+    tracemalloc.start()  # before the warmup, otherwise the replacement of the untraced objects looks like a growth
+    simulation = Simulation()
+    for _ in range(args.warmup):
+        simulation.step()
+    gc.collect()
+    base = steady_memory()
+    growth = []
+    for checkpoint in range(1, args.checkpoints + 1):
+        for _ in range(args.steps):
+            simulation.step()
+        gc.collect()
+        growth.append(steady_memory() - base)
+        print(f'{args.warmup + checkpoint * args.steps} steps: {growth[-1] / 1024:.0f} KiB since the warmup')
+    tracemalloc.stop()
+    late = growth[-1] - growth[len(growth) // 2 - 1] if len(growth) > 1 else growth[-1]
+    print(f'growth in the second half: {late / 1024:.0f} KiB (tolerance {args.tolerance} KiB)')
+    if late > args.tolerance * 1024:
+        sys.exit(1)
+
+
+def benchmark_detectors(args):
+    import detectors
+    import runner
+    import utils
+    from components import CustomsAgent, LeadCustomsAgent
+    from helpers import Statistics
+    from rules import CustomsAgentAnomalyRule, CustomsAgentTooLazyRule
+    from special import LazyCustomsAgent
+    utils.load_config()
+    utils.CONFIG.simulation.lazy_agents = args.lazy
+
+    class Inspections:
+        """Steps of the first inspection of each agent"""
+        def __init__(self):
+            self.first = {}
+
+        def tick(self, simulation, tick):
+            for agent in simulation.lead_agent.agents_under_inspection():
+                self.first.setdefault(agent, tick)
+
+    methods = (detectors.THRESHOLD, detectors.SPRT, detectors.EWMA)
+    for method in methods:
+        utils.CONFIG.detector.method = method
+        latencies = []
+        false_alarms = 0
+        for seed in range(args.seeds):
+            inspections = Inspections()
+            runner.run(args.steps, seed, [inspections])
+            for agent, tick in inspections.first.items():
+                if isinstance(agent, LazyCustomsAgent):
+                    latencies.append(tick)
+                else:
+                    false_alarms += 1
+        detected = f'{statistics.median(latencies):.0f} steps' if latencies else '-'
+        print(f'{method}: lazy agents detected {len(latencies)}/{args.lazy * args.seeds}, median step of the detection {detected}, '
+              f'diligent agents inspected {false_alarms}')
+
+    # cost of the rules with many agents, each of them deciding once per 10 steps
+    rng = random.Random(1)
+    for method in methods:
+        utils.CONFIG.detector.method = method
+        counters = Statistics()
+        agents = [CustomsAgent(f'DetectorAgent{i:05}', (0, 0), counters) for i in range(args.agents)]
+        lead_agent = LeadCustomsAgent('DetectorLeadAgent', (0, 0), counters)
+        if method == detectors.THRESHOLD:
+            rule = CustomsAgentTooLazyRule(lead_agent, counters, agents)
+        else:
+            rule = CustomsAgentAnomalyRule(lead_agent, agents)
+            counters.inspection_listeners.append(detectors.create_detector(utils.CONFIG.detector, rule.alarm).observe)
+        start = time.perf_counter()
+        for tick in range(args.ticks):
+            for agent in agents[tick % 10::10]:
+                if rng.random() < 0.05:
+                    counters.report_agent_virtually_inspected(agent.ident)
+                else:
+                    counters.report_agent_physically_inspected(agent.ident)
+            rule.evaluate()
+        print(f'{method} with {args.agents} agents: {(time.perf_counter() - start) / args.ticks * 1e6:.0f} us per step')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the simulation.')
+    subparsers = parser.add_subparsers(required=True)
+
+    startup = subparsers.add_parser('startup', help='import and startup times (python -X importtime)')
+    startup.add_argument('--repeat', type=int, default=5, help='number of measurements (median is reported)')
+    startup.add_argument('modules', nargs='*', default=['simulation', 'runner', 'gui'], help='modules to import')
+    startup.set_defaults(benchmark=benchmark_startup)
+
+    scheduling = subparsers.add_parser('scheduling', help='throughput and dwell time of the assignment policies')
+    scheduling.add_argument('--steps', type=int, default=20000, help='number of simulation steps')
+    scheduling.add_argument('--seed', type=int, default=1, help='random seed')
+    scheduling.set_defaults(benchmark=benchmark_scheduling)
+
+    launcher = subparsers.add_parser('launcher', help='latency of analysis calls with the eclipse and appcds launchers')
+    launcher.add_argument('--calls', type=int, default=5, help='number of warm calls')
+    launcher.add_argument('--executable', help='launcher of the analysis (default analysis->executable), e.g. "python analysis_standin.py"')
+    launcher.set_defaults(benchmark=benchmark_launcher)
+
+    agents = subparsers.add_parser('agents', help='cost of a step of an agent and a digest of the trace of the agents (equal for equal behavior)')
+    agents.add_argument('--steps', type=int, default=20000, help='number of simulation steps')
+    agents.add_argument('--seed', type=int, default=1, help='random seed')
+    agents.set_defaults(benchmark=benchmark_agents)
+
+    scale = subparsers.add_parser('scale', help='costs of the simulation with synthetic worlds of growing sizes (see worldgen.py)')
+    scale.add_argument('--steps', type=int, default=5000, help='number of simulation steps')
+    scale.add_argument('--seed', type=int, default=1, help='random seed')
+    scale.add_argument('--manifests', action='store_true', help='containers from generated manifests (skewed traffic) instead of random ones')
+    scale.add_argument('--worlds', help='directory of the generated worlds (reused by the next runs), default is the temporary directory')
+    scale.add_argument('sizes', nargs='*', default=['195:29:1500', '10000:1000:100000', '100000:10000:1000000'],
+                       help='sizes of the worlds as countries:companies:items')
+    scale.set_defaults(benchmark=benchmark_scale)
+
+    stepping = subparsers.add_parser('stepping', help='summaries of the sequential and two-phase stepping (exits with 1 if they differ)')
+    stepping.add_argument('--steps', type=int, default=3000, help='number of simulation steps')
+    stepping.add_argument('--seeds', type=int, default=5, help='number of seeds')
+    stepping.add_argument('--first-seed', type=int, default=1, help='the first of the seeds')
+    stepping.add_argument('--plan-workers', type=int, nargs='+', default=[1, 4], help='planning threads of the two-phase runs')
+    stepping.set_defaults(benchmark=benchmark_stepping)
+
+    memory = subparsers.add_parser('memory', help='growth of the traced memory of a long headless run (exits with 1 if it grows)')
+    memory.add_argument('--warmup', type=int, default=2000, help='steps before the measurement')
+    memory.add_argument('--steps', type=int, default=5000, help='steps between the checkpoints')
+    memory.add_argument('--checkpoints', type=int, default=4, help='number of checkpoints')
+    memory.add_argument('--tolerance', type=int, default=4, help='allowed growth in the second half of the checkpoints (in KiB)')
+    memory.add_argument('--seed', type=int, default=1, help='random seed')
+    memory.set_defaults(benchmark=benchmark_memory)
+
+    detectors = subparsers.add_parser('detectors', help='detection of lazy customs agents by the detectors and their cost')
+    detectors.add_argument('--steps', type=int, default=3000, help='number of simulation steps')
+    detectors.add_argument('--seeds', type=int, default=10, help='number of simulations (seeds 0, 1, ...)')
+    detectors.add_argument('--lazy', type=int, default=1, help='number of lazy customs agents')
+    detectors.add_argument('--agents', type=int, default=2000, help='number of agents in the measurement of the cost')
+    detectors.add_argument('--ticks', type=int, default=200, help='number of steps in the measurement of the cost')
+    detectors.set_defaults(benchmark=benchmark_detectors)
+
+    args = parser.parse_args()
+    args.benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
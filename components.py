@@ -2,10 +2,11 @@
 
 from enum import Enum
 from dataclasses import dataclass
-from random import getrandbits
+import math
+import random
 import logging
-from shapely.geometry import LineString
-from analysis import execute_analysis
+import analysis
+from symbols import AGENTS
 
 
 @dataclass(frozen=True)
@@ -23,8 +24,8 @@ ListOfItems = list[Item]
 @dataclass(frozen=True)
 class Declaration:
     items: ListOfItems
-    source: str
-    destination: str
+    source: int  # country id
+    destination: int  # country id
     declared_tax: int
 
     def has_dangerous(self) -> bool:
@@ -34,13 +35,57 @@ class Declaration:
         return False
 
 
+def move_towards(position: (int, int), target: (int, int), distance: float) -> (float, float):
+    """Position after moving the distance along the line from position to target (not beyond the target)"""
+    x, y = position
+    dx = target[0] - x
+    dy = target[1] - y
+    length = math.hypot(dx, dy)
+    if length <= distance * (1 + 1e-9):  # a rest shorter than a rounding error is not another step
+        return float(target[0]), float(target[1])
+    fraction = distance / length
+    return x + dx * fraction, y + dy * fraction
+
+
+def country_query(container, statistics) -> (str, str, str):
+    """Analysis query whether the error rate of the source country requires an inspection"""
+    return "VirtualInspection", "incidentRate", str(statistics.country_error_rate(container.declaration.source))
+
+
+def tax_query(container, statistics) -> (str, str, str):
+    """Analysis query whether the difference from the last declared tax of the company requires an inspection"""
+    return "Tax", "tax", str(container.declaration.declared_tax / statistics.company_last_tax(container.company))
+
+
+def dangerous_query(container) -> (str, str, str):
+    """Analysis query whether the declared items require a proper check"""
+    return "Dangerous", "con", "Dangerous" if container.declaration.has_dangerous() else "NonDangerous"
+
+
+def analysis_queries(container, statistics) -> list:
+    """All analysis queries about the container known at its arrival"""
+    return [dangerous_query(container), country_query(container, statistics), tax_query(container, statistics)]
+
+
 class ContainerState(Enum):
     DELIVERED = 0
     CLEARED = 1
     UNCLEARED = 2
 
 
+# decision paths of containers (how the PA officer decided)
+PATH_VIRTUAL = 'virtual'
+PATH_CUSTOMS_COMPUTER = 'customs-computer'
+PATH_PHYSICAL = 'physical'
+PATHS = (PATH_VIRTUAL, PATH_CUSTOMS_COMPUTER, PATH_PHYSICAL)
+
+# stages of processing of containers, named by the step finishing them (see ContainerRecord.stage_latencies)
+STAGES = ('pa-assignment', 'pa-decision', 'customs-assignment', 'inspection-start', 'removal')
+
+
 class Component:
+    __slots__ = ('__identification',)
+
     def __init__(self, identification: str):
         super().__init__()
         self.__identification = identification
@@ -49,40 +94,75 @@ class Component:
     def identification(self) -> str:
         return self.__identification
 
+    def __str__(self) -> str:
+        return self.identification
+
     def step(self):
         pass
 
 
 class Component2D(Component):
+    __slots__ = ('_pos_x', '_pos_y')  # accessed directly by the steps of agents, the properties are for the others
+
     def __init__(self, identification: str):
         super().__init__(identification)
-        self.__pos_x = 0
-        self.__pos_y = 0
+        self._pos_x = 0
+        self._pos_y = 0
 
     @property
     def pos_x(self) -> int:
-        return self.__pos_x
+        return self._pos_x
 
     @pos_x.setter
     def pos_x(self, x: int):
-        self.__pos_x = x
+        self._pos_x = x
 
     @property
     def pos_y(self) -> int:
-        return self.__pos_y
+        return self._pos_y
 
     @pos_y.setter
     def pos_y(self, y: int):
-        self.__pos_y = y
+        self._pos_y = y
 
     @property
     def position(self) -> (int, int):
-        return self.__pos_x, self.__pos_y
+        return self._pos_x, self._pos_y
+
+
+@dataclass(frozen=True)
+class ContainerRecord:
+    """Summary of a container removed from the terminal"""
+    ident: int
+    company: int
+    source: int  # country id
+    destination: int  # country id
+    state: ContainerState
+    path: str  # decision path of the PA officer
+    arrived: int
+    stamps: tuple  # steps of the STAGES (None = stage not reached)
+
+    @property
+    def dwell_time(self) -> int:
+        return self.stamps[-1] - self.arrived
+
+    def stage_latencies(self):
+        """Pairs (stage, steps since the previous reached stage) of the reached stages, in their order"""
+        previous = self.arrived
+        for stage, stamp in zip(STAGES, self.stamps):
+            if stamp is not None:
+                yield stage, stamp - previous
+                previous = stamp
 
 
 class Container(Component2D):
-    def __init__(self, identification: str, company: str, items: ListOfItems, tax: int, declaration: Declaration, state: ContainerState = ContainerState.DELIVERED):
-        super().__init__(identification)
+    def __init__(self, ident: int, company: int, items: ListOfItems, tax: int, declaration: Declaration, state: ContainerState = ContainerState.DELIVERED):
+        super().__init__(None)
+        self.reset(ident, company, items, tax, declaration, state)
+
+    def reset(self, ident: int, company: int, items: ListOfItems, tax: int, declaration: Declaration, state: ContainerState = ContainerState.DELIVERED):
+        """Initializes the container (also a reused one, see ContainerPool)"""
+        self.ident = ident
         self._company = company
         self._items = items
         self._declaration = declaration
@@ -91,13 +171,35 @@ class Container(Component2D):
         self._dangerous = False
         self._cleared_by_customs = ContainerState.DELIVERED
         self._cleared_by_pa = ContainerState.DELIVERED
+        self.arrived = None  # step of the arrival to the terminal
+        self.waiting_since = None  # step since which the container waits for a PA officer or a customs agent
+        # steps of the stages (None = stage not reached)
+        self.pa_assigned = None
+        self.pa_decided = None
+        self.customs_assigned = None
+        self.inspection_started = None
+        self.removed = None
+        self.path = None  # decision path of the PA officer
+        self.prefetched = ()  # analysis queries started at the arrival (see analysis.prefetch)
         for item in self._declaration.items:
             if item.is_dangerous:
                 self._dangerous = True
                 break
 
+    def record(self) -> ContainerRecord:
+        return ContainerRecord(self.ident, self._company, self._declaration.source, self._declaration.destination, self._state, self.path,
+                               self.arrived, (self.pa_assigned, self.pa_decided, self.customs_assigned, self.inspection_started, self.removed))
+
+    @property
+    def identification(self) -> str:
+        return f'Container{self.ident:03}'
+
+    def start_inspection(self, tick: int):
+        if self.inspection_started is None:
+            self.inspection_started = tick
+
     @property
-    def company(self) -> str:
+    def company(self) -> int:
         return self._company
 
     @property
@@ -141,6 +243,29 @@ class Container(Component2D):
         self._cleared_by_pa = state
 
 
+class ContainerPool:
+    """Removed containers kept (up to the capacity) to be reused for arriving ones"""
+
+    def __init__(self, capacity: int = 0):
+        self.capacity = capacity
+        self._free = []
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, ident: int, company: int, items: ListOfItems, tax: int, declaration: Declaration) -> Container:
+        if self._free:
+            container = self._free.pop()
+            container.reset(ident, company, items, tax, declaration)
+            return container
+        return Container(ident, company, items, tax, declaration)
+
+    def release(self, container: Container) -> None:
+        """The container must not be used by anyone anymore"""
+        if len(self._free) < self.capacity:
+            self._free.append(container)
+
+
 class AgentState(Enum):
     IDLE = 0
     CHECK = 1
@@ -153,25 +278,125 @@ class AgentState(Enum):
     PA_DETAILED_CHECK = 8
 
 
+class Decisions:
+    """Random bits of the decisions of an agent (its own stream, see Simulation)
+
+    The words drawn by a plan are kept until the next plan starts, so a repeated plan (see Simulation.step_agents_in_two_phases)
+    draws the same bits as the first one. getrandbits(k) gives the same bits as random.Random(seed).getrandbits(k) for k <= 32.
+    """
+    __slots__ = ('_random', '_drawn', '_position')
+
+    def __init__(self, seed: int):
+        self._random = random.Random(seed)
+        self._drawn = []  # words drawn by the current plan and not yet consumed ones of the repeated plan
+        self._position = 0  # of the next word in _drawn
+
+    def getrandbits(self, k: int) -> int:
+        if self._position < len(self._drawn):
+            word = self._drawn[self._position]
+        else:
+            word = self._random.getrandbits(32)
+            self._drawn.append(word)
+        self._position += 1
+        return word >> (32 - k)
+
+    def start_plan(self) -> None:
+        """Forgets the consumed words"""
+        if self._position:
+            del self._drawn[:self._position]
+            self._position = 0
+
+    def repeat_plan(self) -> None:
+        """The words drawn since start_plan are drawn again"""
+        self._position = 0
+
+
+class Intent:
+    """Changes of an agent planned in a step (None = unchanged) and its effects on other objects, see Agent.commit
+
+    The plan depends on the agent and on the objects in reads; the objects changed by committing it are given by changes.
+    """
+    __slots__ = ('state', 'in_current_state', 'position', 'effects', 'reads')
+
+    def __init__(self):
+        self.state = None
+        self.in_current_state = None
+        self.position = None
+        self.effects = []
+        self.reads = ()
+
+    def then(self, function, *args) -> None:
+        self.effects.append((function, args))
+
+    def read(self, *objects) -> None:
+        """The plan depends on the objects (besides the agent itself)"""
+        self.reads += objects
+
+    def changes(self, agent, statistics) -> list:
+        """Objects changed by committing the intent of the agent: the agent, the objects of the effects and their arguments,
+        and the statistics (reported by most of the effects)"""
+        if self.state is None and self.in_current_state is None and self.position is None and not self.effects:
+            return []
+        changed = [agent]
+        if self.effects:
+            changed.append(statistics)
+            for function, args in self.effects:
+                changed.append(getattr(function, '__self__', None))
+                changed.extend(arg for arg in args if isinstance(arg, Component))
+        return changed
+
+
+def no_log(msg, *args) -> None:
+    pass
+
+
 class Agent(Component2D):
+    __slots__ = ('ident', '_state', '_home_position', '_target_position', '_in_current_state', '_container', 'statistics',
+                 'under_inspection', 'random')
+    PLANNERS = {}  # state -> function(agent, intent, container, log) planning a step of the agent in the state
+
     def __init__(self,  identification: str, home_position: (int, int), statistics):
         super().__init__(identification)
+        self.ident = AGENTS.intern(identification)
         self._state = AgentState.IDLE
         self._home_position = home_position
         self._target_position = home_position
-        self.pos_x = home_position[0]
-        self.pos_y = home_position[1]
+        self._pos_x = home_position[0]
+        self._pos_y = home_position[1]
         self._in_current_state = 0
         self._container = None
         self.statistics = statistics
         self.under_inspection = False
+        self.random = random  # source of random decisions, own Decisions of each agent of a simulation
 
     @property
     def state(self) -> AgentState:
         return self._state
 
+    def plan(self) -> Intent:
+        """Decides the step from the current state of the simulation without changing anything"""
+        intent = Intent()
+        planner = self.PLANNERS.get(self._state)
+        if planner is None:
+            logging.info('%s in unknown state', self)
+        else:
+            # the log level is checked once per step, not by each message
+            planner(self, intent, self._container, logging.info if logging.root.isEnabledFor(logging.INFO) else no_log)
+        return intent
+
+    def commit(self, intent: Intent) -> None:
+        """Applies the planned changes"""
+        if intent.state is not None:
+            self._state = intent.state
+        if intent.in_current_state is not None:
+            self._in_current_state = intent.in_current_state
+        if intent.position is not None:
+            self._pos_x, self._pos_y = intent.position
+        for function, args in intent.effects:
+            function(*args)
+
     def step(self):
-        pass
+        self.commit(self.plan())
 
     @property
     def home_position(self) -> (int, int):
@@ -182,6 +407,7 @@ class Agent(Component2D):
 
 
 class CustomsAgent(Agent):
+    __slots__ = ('_partner',)
     CHECK_DUR = 2
     INSPECTION_DUR = 2
     SPEED = 50
@@ -191,6 +417,7 @@ class CustomsAgent(Agent):
 
     def __init__(self,  identification: str, home_position: (int, int), statistics):
         super().__init__(identification, home_position, statistics)
+        self._partner = None  # PA officer the agent inspects the container with
 
     def assign_container(self, container: Container):
         self._container = container
@@ -198,17 +425,17 @@ class CustomsAgent(Agent):
         self._in_current_state = 0
 
     def decide_to_proper_check(self) -> bool:
-        if execute_analysis("VirtualInspection", "incidentRate", str(self.statistics.country_error_rate(self._container.declaration.source))):
-            logging.info('%s discovers too high error rate (or unknown) for a source country of %s', self.identification, self._container.identification)
+        if analysis.execute_analysis(*country_query(self._container, self.statistics)):
+            logging.info('%s discovers too high error rate (or unknown) for a source country of %s', self, self._container)
             return True
         if self.statistics.company_error_rate(self._container.company) >= CustomsAgent.TRESHOLD_COMPANY_ERROR_RATE_FOR_INSPECTION:
-            logging.info('%s discovers too high error rate (or unknown) for a shipping company of %s', self.identification, self._container.identification)
+            logging.info('%s discovers too high error rate (or unknown) for a shipping company of %s', self, self._container)
             return True
-        if execute_analysis("Tax", "tax", str(self._container.declaration.declared_tax / self.statistics.company_last_tax(self._container.company))):
-            logging.info('%s discovers too big difference from the last declared tax of the same company of %s', self.identification, self._container.identification)
+        if analysis.execute_analysis(*tax_query(self._container, self.statistics)):
+            logging.info('%s discovers too big difference from the last declared tax of the same company of %s', self, self._container)
             return True
         # for the rest of containers, throw a die to decide
-        return not getrandbits(2)
+        return not self.random.getrandbits(2)
 
     def inspect_container(self) -> bool:
         """Compares that items in the container are the same as the items in the container declaration"""
@@ -223,12 +450,12 @@ class CustomsAgent(Agent):
     def is_at_container(self) -> bool:
         return (self._target_position == self.position) and (self._state == AgentState.INSPECTION)
 
-    def ask_inspection(self, container: Container):
-        """Called by PA to ask the agent to go for physical inspection"""
+    def ask_inspection(self, container: Container, partner=None):
+        """Called by PA to ask the agent to go for physical inspection (the inspection starts when the partner is at the container)"""
         self._state = AgentState.INSPECTION
         self._container = container
-        self.statistics.report_agent_physically_inspected(self.identification)
-        pass
+        self._partner = partner
+        self.statistics.report_agent_physically_inspected(self.ident)
 
     def wait_for_pa(self):
         self._state = AgentState.A_WAITING_PA
@@ -238,85 +465,105 @@ class CustomsAgent(Agent):
         self._container = None
         self._target_position = None
 
-    def step(self):
-        if self._state == AgentState.IDLE:
-            logging.info('%s does nothing', self.identification)
-            pass
-        elif self._state == AgentState.CHECK:
-            self._in_current_state += 1
-            logging.info('%s evaluates %s', self.identification, self._container.identification)
-            if self._in_current_state == CustomsAgent.CHECK_DUR:
-                self._in_current_state = 0
-                if self.decide_to_proper_check():
-                    logging.info('%s does proper check of %s', self.identification, self._container.identification)
-                    self.statistics.report_agent_physically_inspected(self.identification)
-                    self._state = AgentState.INSPECTION
-                else:
-                    logging.info('%s does quick check of %s', self.identification, self._container.identification)
-                    self.statistics.report_agent_virtually_inspected(self.identification)
-                    logging.info('%s clears %s', self.identification, self._container.identification)
-                    self._container.cleared_by_customs = ContainerState.CLEARED
-                    self.statistics.report_country_correct(self._container.declaration.source)
-                    self.statistics.report_company_correct(self._container.company)
-                    if (set(self._container.declaration.items) == set(self._container.items)) and (self._container.declaration.declared_tax == self._container.tax):
-                        self.statistics.container_cleared_correctly()
-                    else:
-                        self.statistics.container_cleared_incorrectly()
-                    self._state = AgentState.IDLE
-        elif self._state == AgentState.A_WAITING_PA:
-            logging.info('%s waits for PA', self.identification)
-        elif self._state == AgentState.INSPECTION:
-            # logging.debug('%s at position %d,%d and target is %d,%d', self.identification, self.pos_x, self.pos_y, self._target_position[0], self._target_position[1])
-            if self._target_position != self.position:
-                logging.info('%s moving to %s', self.identification, self._container.identification)
-                path = LineString([self.position, self._target_position])
-                pos = path.interpolate(CustomsAgent.SPEED)
-                self.pos_x = pos.x
-                self.pos_y = pos.y
+    def clear_virtually(self, container: Container, correct: bool):
+        self._container = None
+        container.cleared_by_customs = ContainerState.CLEARED
+        self.statistics.report_country_correct(container.declaration.source)
+        self.statistics.report_company_correct(container.company)
+        if correct:
+            self.statistics.container_cleared_correctly()
+        else:
+            self.statistics.container_cleared_incorrectly()
+
+    def finish_inspection(self, container: Container, items_correct: bool, tax_correct: bool):
+        if items_correct:
+            if tax_correct:
+                logging.info('%s cleared %s', self, container)
+                container.cleared_by_customs = ContainerState.CLEARED
+                self.statistics.report_country_correct(container.declaration.source)
+                self.statistics.report_company_correct(container.company)
+                self.statistics.container_cleared_correctly()
+                self.statistics.put_company_last_tax(container.company, container.tax)
             else:
-                logging.info('%s inspecting %s', self.identification, self._container.identification)
-                if self._in_current_state < CustomsAgent.INSPECTION_DUR:
-                    self._in_current_state += 1
-                else:
-                    self._in_current_state = 0
-                    if self.inspect_container():
-                        if self.inspect_tax():
-                            logging.info('%s cleared %s', self.identification, self._container.identification)
-                            self._container.cleared_by_customs = ContainerState.CLEARED
-                            self.statistics.report_country_correct(self._container.declaration.source)
-                            self.statistics.report_company_correct(self._container.company)
-                            self.statistics.container_cleared_correctly()
-                            self.statistics.put_company_last_tax(self._container.company, self._container.tax)
-                        else:
-                            logging.info('%s rejects %s because of incorrect declared tax', self.identification, self._container.identification)
-                            self._container.cleared_by_customs = ContainerState.UNCLEARED
-                            self.statistics.report_country_error(self._container.declaration.source)
-                            self.statistics.report_company_error(self._container.company)
-                            self.statistics.container_rejected()
-                    else:
-                        logging.info('%s rejects %s because of incorrect declaration', self.identification, self._container.identification)
-                        self._container.cleared_by_customs = ContainerState.UNCLEARED
-                        self.statistics.report_country_error(self._container.declaration.source)
-                        self.statistics.report_company_error(self._container.company)
-                        self.statistics.container_rejected()
-                    self._state = AgentState.RETURNING
-                    self._container = None
-        elif self._state == AgentState.RETURNING:
-            if self.position != self._home_position:
-                logging.info('%s moving home', self.identification)
-                path = LineString([self.position, self._home_position])
-                pos = path.interpolate(CustomsAgent.SPEED)
-                self.pos_x = pos.x
-                self.pos_y = pos.y
+                logging.info('%s rejects %s because of incorrect declared tax', self, container)
+                container.cleared_by_customs = ContainerState.UNCLEARED
+                self.statistics.report_country_error(container.declaration.source)
+                self.statistics.report_company_error(container.company)
+                self.statistics.container_rejected()
+        else:
+            logging.info('%s rejects %s because of incorrect declaration', self, container)
+            container.cleared_by_customs = ContainerState.UNCLEARED
+            self.statistics.report_country_error(container.declaration.source)
+            self.statistics.report_company_error(container.company)
+            self.statistics.container_rejected()
+        self._container = None
+        self._partner = None
+
+    def plan_idle(self, intent: Intent, container: Container, log) -> None:
+        log('%s does nothing', self)
+
+    def plan_check(self, intent: Intent, container: Container, log) -> None:
+        intent.in_current_state = self._in_current_state + 1
+        log('%s evaluates %s', self, container)
+        if intent.in_current_state == CustomsAgent.CHECK_DUR:
+            intent.in_current_state = 0
+            intent.read(self.statistics)  # error rates and last taxes
+            if self.decide_to_proper_check():
+                log('%s does proper check of %s', self, container)
+                intent.then(self.statistics.report_agent_physically_inspected, self.ident)
+                intent.state = AgentState.INSPECTION
             else:
-                logging.info('%s is home', self.identification)
-                self._state = AgentState.IDLE
+                log('%s does quick check of %s', self, container)
+                intent.then(self.statistics.report_agent_virtually_inspected, self.ident)
+                log('%s clears %s', self, container)
+                intent.then(self.clear_virtually, container, self.inspect_container() and self.inspect_tax())
+                intent.state = AgentState.IDLE
+
+    def plan_waiting_for_pa(self, intent: Intent, container: Container, log) -> None:
+        log('%s waits for PA', self)
+
+    def plan_inspection(self, intent: Intent, container: Container, log) -> None:
+        position = (self._pos_x, self._pos_y)
+        target = self._target_position
+        if target != position:
+            log('%s moving to %s', self, container)
+            intent.position = move_towards(position, target, CustomsAgent.SPEED)
+            return
+        partner = self._partner
+        if partner is not None:
+            intent.read(partner)
+            if (partner._pos_x, partner._pos_y) != target:
+                log('%s waits at %s for %s', self, container, partner)
+                return
+        log('%s inspecting %s', self, container)
+        intent.then(container.start_inspection, self.statistics.tick)
+        if self._in_current_state < CustomsAgent.INSPECTION_DUR:
+            intent.in_current_state = self._in_current_state + 1
         else:
-            logging.info('%s in unknown state', self.identification)
-            pass
+            intent.in_current_state = 0
+            intent.then(self.finish_inspection, container, self.inspect_container(), self.inspect_tax())
+            intent.state = AgentState.RETURNING
+
+    def plan_returning(self, intent: Intent, container: Container, log) -> None:
+        position = (self._pos_x, self._pos_y)
+        if position != self._home_position:
+            log('%s moving home', self)
+            intent.position = move_towards(position, self._home_position, CustomsAgent.SPEED)
+        else:
+            log('%s is home', self)
+            intent.state = AgentState.IDLE
+
+    PLANNERS = {
+        AgentState.IDLE: plan_idle,
+        AgentState.CHECK: plan_check,
+        AgentState.A_WAITING_PA: plan_waiting_for_pa,
+        AgentState.INSPECTION: plan_inspection,
+        AgentState.RETURNING: plan_returning,
+    }
 
 
 class PortAuthorityOfficer(Agent):
+    __slots__ = ('_container_position', '_agent', '_cust_computer_position')
     CHECK_DUR = 2
     INSPECTION_DUR = 2
     SPEED = 50
@@ -328,18 +575,18 @@ class PortAuthorityOfficer(Agent):
         self._cust_computer_position = cust_computer_position
 
     def decide_to_proper_check(self):
-        dangerous = "NonDangerous"
-        if self._container.declaration.has_dangerous():
-            dangerous = "Dangerous"
-            # return False
-        if execute_analysis("Dangerous", "con", dangerous): #self._container.declaration.has_dangerous():
+        if analysis.execute_analysis(*dangerous_query(self._container)):
             # for dangerous items, proper check is mandatory
             return True
         # otherwise, throw a die
-        return not getrandbits(1)
+        return not self.random.getrandbits(1)
 
     def decide_phys_inspection(self):
-        return not getrandbits(1)
+        return not self.random.getrandbits(1)
+
+    def decided(self, container: Container, path: str):
+        container.pa_decided = self.statistics.tick
+        container.path = path
 
     @property
     def assigned_agent(self) -> CustomsAgent:
@@ -352,6 +599,19 @@ class PortAuthorityOfficer(Agent):
         self._state = AgentState.PA_MOVING_TO_A
         self._target_position = agent.home_position
 
+    @property
+    def paired(self) -> bool:
+        """Whether the officer is going for (or doing) an inspection with a customs agent"""
+        return self._state in (AgentState.PA_MOVING_TO_A, AgentState.PA_CHECK_WITH_A, AgentState.INSPECTION)
+
+    def meet_agent_at_container(self, agent: CustomsAgent):
+        """Alternative to assigned_agent, the officer and the agent go directly to the container"""
+        self._agent = agent
+        self._state = AgentState.INSPECTION
+        self._target_position = self._container_position
+        agent.ask_inspection(self._container, self)
+        agent.set_container_position(self._container_position)
+
     def assign_container(self, container: Container, container_position: (int, int)):
         self._container = container
         self._state = AgentState.CHECK
@@ -365,98 +625,112 @@ class PortAuthorityOfficer(Agent):
     def set_target_position(self, position: (int, int)):
         self._target_position = position
 
-    def step(self):
-        if self._state == AgentState.IDLE:
-            logging.info('%s does nothing', self.identification)
-            pass
-        elif self._state == AgentState.CHECK:
-            self._in_current_state += 1
-            logging.info('%s evaluates %s', self.identification, self._container.identification)
-            if self._in_current_state == PortAuthorityOfficer.CHECK_DUR:
-                self._in_current_state = 0
-                if self.decide_to_proper_check():
-                    logging.info('%s decided to proper check %s', self.identification, self._container.identification)
-                    self._state = AgentState.PA_DETAILED_CHECK
-                else:
-                    logging.info('%s does quick check of %s', self.identification, self._container.identification)
-                    self.statistics.report_pa_virtually_inspected(self.identification)
-                    logging.info('%s clears %s', self.identification, self._container.identification)
-                    self._container.cleared_by_pa = ContainerState.CLEARED
-                    self._state = AgentState.IDLE
-        elif self._state == AgentState.PA_DETAILED_CHECK:
-            if self.position != self._cust_computer_position:
-                # need to move to the customs computer
-                logging.info('%s moving to the customs computer', self.identification)
-                path = LineString([self.position, self._cust_computer_position])
-                pos = path.interpolate(PortAuthorityOfficer.SPEED)
-                self.pos_x = pos.x
-                self.pos_y = pos.y
+    def clear(self, container: Container, path: str):
+        self.decided(container, path)
+        container.cleared_by_pa = ContainerState.CLEARED
+
+    def finish_inspection(self, container: Container, decision: ContainerState):
+        # the status of the container is "copied" form the customs agent
+        container.cleared_by_pa = decision
+        self.reset_container()
+
+    def plan_idle(self, intent: Intent, container: Container, log) -> None:
+        log('%s does nothing', self)
+
+    def plan_check(self, intent: Intent, container: Container, log) -> None:
+        intent.in_current_state = self._in_current_state + 1
+        log('%s evaluates %s', self, container)
+        if intent.in_current_state == PortAuthorityOfficer.CHECK_DUR:
+            intent.in_current_state = 0
+            if self.decide_to_proper_check():
+                log('%s decided to proper check %s', self, container)
+                intent.state = AgentState.PA_DETAILED_CHECK
             else:
-                # at the customs computer
-                self._in_current_state += 1
-                logging.info('%s reading full declaration of %s', self.identification, self._container.identification)
-                if self._in_current_state == PortAuthorityOfficer.CHECK_DUR:
-                    self._in_current_state = 0
-                    if self.decide_phys_inspection():  # whether to go for inspection
-                        logging.info('%s decided for inspection of %s and asks for the cust agent', self.identification, self._container.identification)
-                        self.statistics.report_pa_physically_inspected(self.identification)
-                        self._state = AgentState.PA_REQUEST_A
-                    else:  # no inspection decided, thus clear the container and go home
-                        logging.info('%s clears %s from the customs office', self.identification, self._container.identification)
-                        self.statistics.report_pa_computer_inspected(self.identification)
-                        self._container.cleared_by_pa = ContainerState.CLEARED
-                        self.reset_container()
-                        self._state = AgentState.RETURNING
-        elif self._state == AgentState.PA_REQUEST_A:
-            logging.info('%s waits for customs agent assignment', self.identification)
-        elif self._state == AgentState.PA_MOVING_TO_A:
-            if self._target_position != self.position:
-                logging.info('%s moving to %s', self.identification, self._agent.identification)
-                path = LineString([self.position, self._target_position])
-                pos = path.interpolate(PortAuthorityOfficer.SPEED)
-                self.pos_x = pos.x
-                self.pos_y = pos.y
-            else:
-                self._state = AgentState.PA_CHECK_WITH_A
-        elif self._state == AgentState.PA_CHECK_WITH_A:
-            self._state = AgentState.INSPECTION
-            self._target_position = self._container_position
-            self._agent.ask_inspection(self._container)
-            self._agent.set_container_position(self._container_position)
-        elif self._state == AgentState.INSPECTION:
-            if self._target_position != self.position:  # moving to container
-                logging.info('%s moving to %s', self.identification, self._container.identification)
-                path = LineString([self.position, self._target_position])
-                pos = path.interpolate(PortAuthorityOfficer.SPEED)
-                self.pos_x = pos.x
-                self.pos_y = pos.y
-            else:   # already at the container
-                # actual inspection is done by the customs agent
-                if self._container.cleared_by_customs != ContainerState.DELIVERED:
-                    logging.info('%s inspects the container with %s', self.identification, self._agent.identification)
-                    # the status of the container is "copied" form the customs agent
-                    # actual check is done by the customs agent
-                    self._container.cleared_by_pa = self._container.cleared_by_customs
-                    self._state = AgentState.RETURNING
-                    self.reset_container()
-                else:  # do nothing and wait for customs agent
-                    logging.info('%s waits at container for %s', self.identification, self._agent.identification)
-        elif self._state == AgentState.RETURNING:
-            if self.position != self._home_position:
-                logging.info('%s moving home', self.identification)
-                path = LineString([self.position, self._home_position])
-                pos = path.interpolate(PortAuthorityOfficer.SPEED)
-                self.pos_x = pos.x
-                self.pos_y = pos.y
-            else:
-                logging.info('%s is home', self.identification)
-                self._state = AgentState.IDLE
+                log('%s does quick check of %s', self, container)
+                intent.then(self.statistics.report_pa_virtually_inspected, self.ident)
+                log('%s clears %s', self, container)
+                intent.then(self.clear, container, PATH_VIRTUAL)
+                intent.state = AgentState.IDLE
+
+    def plan_detailed_check(self, intent: Intent, container: Container, log) -> None:
+        position = (self._pos_x, self._pos_y)
+        if position != self._cust_computer_position:
+            # need to move to the customs computer
+            log('%s moving to the customs computer', self)
+            intent.position = move_towards(position, self._cust_computer_position, PortAuthorityOfficer.SPEED)
+            return
+        # at the customs computer
+        intent.in_current_state = self._in_current_state + 1
+        log('%s reading full declaration of %s', self, container)
+        if intent.in_current_state == PortAuthorityOfficer.CHECK_DUR:
+            intent.in_current_state = 0
+            if self.decide_phys_inspection():  # whether to go for inspection
+                log('%s decided for inspection of %s and asks for the cust agent', self, container)
+                intent.then(self.statistics.report_pa_physically_inspected, self.ident)
+                intent.then(self.decided, container, PATH_PHYSICAL)
+                intent.state = AgentState.PA_REQUEST_A
+            else:  # no inspection decided, thus clear the container and go home
+                log('%s clears %s from the customs office', self, container)
+                intent.then(self.statistics.report_pa_computer_inspected, self.ident)
+                intent.then(self.clear, container, PATH_CUSTOMS_COMPUTER)
+                intent.then(self.reset_container)
+                intent.state = AgentState.RETURNING
+
+    def plan_request(self, intent: Intent, container: Container, log) -> None:
+        log('%s waits for customs agent assignment', self)
+
+    def plan_moving_to_agent(self, intent: Intent, container: Container, log) -> None:
+        position = (self._pos_x, self._pos_y)
+        if self._target_position != position:
+            log('%s moving to %s', self, self._agent)
+            intent.position = move_towards(position, self._target_position, PortAuthorityOfficer.SPEED)
         else:
-            logging.info('%s in unknown state', self.identification)
-            pass
+            intent.state = AgentState.PA_CHECK_WITH_A
+
+    def plan_check_with_agent(self, intent: Intent, container: Container, log) -> None:
+        intent.state = AgentState.INSPECTION
+        intent.then(self.set_target_position, self._container_position)
+        intent.then(self._agent.ask_inspection, container)
+        intent.then(self._agent.set_container_position, self._container_position)
+
+    def plan_inspection(self, intent: Intent, container: Container, log) -> None:
+        position = (self._pos_x, self._pos_y)
+        if self._target_position != position:  # moving to container
+            log('%s moving to %s', self, container)
+            intent.position = move_towards(position, self._target_position, PortAuthorityOfficer.SPEED)
+            return
+        intent.read(container)
+        # already at the container, actual inspection is done by the customs agent
+        if container.cleared_by_customs != ContainerState.DELIVERED:
+            log('%s inspects the container with %s', self, self._agent)
+            intent.then(self.finish_inspection, container, container.cleared_by_customs)
+            intent.state = AgentState.RETURNING
+        else:  # do nothing and wait for customs agent
+            log('%s waits at container for %s', self, self._agent)
+
+    def plan_returning(self, intent: Intent, container: Container, log) -> None:
+        position = (self._pos_x, self._pos_y)
+        if position != self._home_position:
+            log('%s moving home', self)
+            intent.position = move_towards(position, self._home_position, PortAuthorityOfficer.SPEED)
+        else:
+            log('%s is home', self)
+            intent.state = AgentState.IDLE
+
+    PLANNERS = {
+        AgentState.IDLE: plan_idle,
+        AgentState.CHECK: plan_check,
+        AgentState.PA_DETAILED_CHECK: plan_detailed_check,
+        AgentState.PA_REQUEST_A: plan_request,
+        AgentState.PA_MOVING_TO_A: plan_moving_to_agent,
+        AgentState.PA_CHECK_WITH_A: plan_check_with_agent,
+        AgentState.INSPECTION: plan_inspection,
+        AgentState.RETURNING: plan_returning,
+    }
 
 
 class LeadCustomsAgent(Agent):
+    __slots__ = ('__agents_under_inspection', '__agents_after_inspection')
     INSPECTION_DURATION = 100
     INSPECTION_COOLDOWN = 500  # how many steps after inspection is an agent ignored
 
@@ -467,7 +741,7 @@ class LeadCustomsAgent(Agent):
 
     def inspect_lazy_agent(self, agent: CustomsAgent) -> None:
         if agent not in self.__agents_under_inspection.keys():
-            logging.info(f'{self.identification} starts inspecting {agent.identification}')
+            logging.info('%s starts inspecting %s', self, agent)
             self.__agents_under_inspection[agent] = 1
 
     def agents_under_inspection(self) -> list[CustomsAgent]:
@@ -481,7 +755,7 @@ class LeadCustomsAgent(Agent):
             self.__agents_under_inspection[agent] += 1
             if self.__agents_under_inspection[agent] > LeadCustomsAgent.INSPECTION_DURATION:
                 agent.punish()
-                logging.info(f'{self.identification} punishes {agent.identification}')
+                logging.info('%s punishes %s', self, agent)
                 self.__agents_under_inspection.pop(agent)
                 self.__agents_after_inspection[agent] = 1
         for agent in list(self.__agents_after_inspection.keys()):
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Fixtures of the tests: a small synthetic world (see worldgen.py) simulated with the fake analysis."""
+import copy
+
+import pytest
+
+import utils
+import worldgen
+
+
+@pytest.fixture(scope='session')
+def world(tmp_path_factory) -> str:
+    """Data directory of a world of 50 countries, 20 companies and 500 items"""
+    directory = str(tmp_path_factory.mktemp('world'))
+    worldgen.generate(directory, 50, 20, 500)
+    return directory
+
+
+@pytest.fixture
+def config(world):
+    """The default configuration with the fake analysis and the world, current during the test"""
+    previous = utils.CONFIG
+    utils.CONFIG = copy.deepcopy(utils.default_config)
+    utils.CONFIG.analysis.fake = True
+    utils.CONFIG.simulation.data_dir = world
+    yield utils.CONFIG
+    utils.CONFIG = previous
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Decision tables of the analysis scenarios.
+
+The scenarios are threshold functions of a single input (or functions of a categorical input), so they can be
+probed offline with the real analysis and stored in a table, which then answers in the simulation instead of
+the analysis. The table is valid for the model it was compiled from (see model_hash).
+
+Usage: python decision_tables.py [--output decision_table.json], see python decision_tables.py --help
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+
+import utils
+
+FORMAT = 1
+
+
+def tax_ratio_domain() -> tuple:
+    """Ratios of the declared tax to the last tax of the company (see components.tax_query)
+
+    Before the first container of a company is checked, its last tax is helpers.DEFAULT_LAST_TAX, so the ratios
+    reach the declared taxes themselves. The usual ratios up to 10 are sampled as densely as the rest.
+    """
+    import helpers
+    high = helpers.max_declared_tax() / helpers.DEFAULT_LAST_TAX
+    return (0., 10., high) if high > 10 else (0., 10.)
+
+
+# scenario, variable name, breakpoints of the domain of numeric inputs (low, ..., high; sampled uniformly
+# between each two, or a function returning them) or the list of categorical inputs
+SCENARIOS = (
+    ('VirtualInspection', 'incidentRate', (0., 1.)),  # error rate of the source country
+    ('Tax', 'tax', tax_ratio_domain),  # ratio of the declared tax to the last tax of the company
+    ('Dangerous', 'con', ['Dangerous', 'NonDangerous']),
+)
+
+VERIFICATION = Counter()  # verified calls and mismatches of the table and the analysis
+
+
+def model_hash(model_path: str) -> str:
+    """Hash of the model path and of the contents of all files of the model"""
+    digest = hashlib.sha256(model_path.encode())
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, model_path).encode())
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sample_points(domain: tuple, samples: int) -> list[float]:
+    """Samples spread uniformly between each two breakpoints of the domain"""
+    points = []
+    for low, high in zip(domain, domain[1:]):
+        points.extend(low + (high - low) * i / (samples - 1) for i in range(samples - 1))
+    points.append(domain[-1])
+    return points
+
+
+def find_boundaries(decide, points: list[float], resolution: float) -> (list[float], list[bool]):
+    """Boundaries of a piecewise constant decision on the range of the sorted points and its values between them
+
+    Each change of the decision between neighbouring points is located by binary search up to the resolution.
+    Intervals shorter than the distance of the points may be missed.
+    """
+    decisions = [decide(x) for x in points]
+    boundaries = []
+    values = [decisions[0]]
+    for i in range(1, len(points)):
+        if decisions[i] == decisions[i - 1]:
+            continue
+        lo, hi = points[i - 1], points[i]
+        while hi - lo > resolution:
+            middle = (lo + hi) / 2
+            if decide(middle) == decisions[i - 1]:
+                lo = middle
+            else:
+                hi = middle
+        boundaries.append(hi)  # the first input with the new decision
+        values.append(decisions[i])
+    return boundaries, values
+
+
+def compile_table(execute_analysis, model_path: str, samples: int = 64, resolution: float = 1e-4) -> dict:
+    """Decision table of SCENARIOS probed with the analysis backend"""
+    scenarios = {}
+    for scenario, variable, domain in SCENARIOS:
+        if isinstance(domain, list):
+            table = {'values': {value: execute_analysis(scenario, variable, value) for value in domain}}
+        else:
+            if callable(domain):
+                domain = domain()
+            boundaries, values = find_boundaries(lambda x: execute_analysis(scenario, variable, str(x)), sample_points(domain, samples), resolution)
+            table = {'low': domain[0], 'high': domain[-1], 'boundaries': boundaries, 'values': values}
+        logging.warning('%s/%s: %s', scenario, variable, table)
+        scenarios[f'{scenario}/{variable}'] = table
+    return {'format': FORMAT, 'model_path': model_path, 'model_hash': model_hash(model_path),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scenarios': scenarios}
+
+
+class DecisionTable:
+    def __init__(self, table: dict):
+        self.model_path = table['model_path']
+        self.model_hash = table['model_hash']
+        self._scenarios = table['scenarios']
+
+    @classmethod
+    def load(cls, path: str) -> 'DecisionTable':
+        with open(path) as f:
+            table = json.load(f)
+        if table.get('format') != FORMAT:
+            raise ValueError(f'unsupported format of the decision table {path}')
+        return cls(table)
+
+    def decide(self, scenario: str, variable_name: str, variable_value: str):
+        """Decision of the analysis or None if the input is not covered by the table"""
+        table = self._scenarios.get(f'{scenario}/{variable_name}')
+        if table is None:
+            return None
+        if 'boundaries' not in table:
+            return table['values'].get(variable_value)
+        value = float(variable_value)
+        if not table['low'] <= value <= table['high']:
+            return None
+        return table['values'][bisect.bisect_right(table['boundaries'], value)]
+
+
+def table_backend(config: utils.ConfigAnalysis, analysis_backend):
+    """Backend answering from the decision table (the analysis answers inputs not covered by the table)
+
+    The analysis backend is returned if the table does not exist or was compiled from another model.
+    With a positive verify rate, the fraction of calls is also sent to the analysis and mismatches are reported.
+    """
+    try:
+        table = DecisionTable.load(config.decision_table)
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning('Decision table not used: %s', e)
+        return analysis_backend
+    if table.model_path != config.model_path or table.model_hash != model_hash(config.model_path):
+        logging.warning('Decision table %s not used: compiled from another model', config.decision_table)
+        return analysis_backend
+    sampling = random.Random()  # does not disturb the random numbers of the simulation
+
+    def table_execute_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
+        decision = table.decide(scenario, variable_name, variable_value)
+        if decision is None:
+            return analysis_backend(scenario, variable_name, variable_value)
+        if config.verify_rate and sampling.random() < config.verify_rate:
+            actual = analysis_backend(scenario, variable_name, variable_value)
+            VERIFICATION['verified'] += 1
+            if actual != decision:
+                VERIFICATION['mismatches'] += 1
+                logging.warning('Decision table drift: %s/%s:%s is %s in the table but %s in the analysis',
+                                scenario, variable_name, variable_value, decision, actual)
+            return actual
+        return decision
+    return table_execute_analysis
+
+
+def main():
+    import analysis
+    utils.load_config()
+    parser = argparse.ArgumentParser(description='Probes the analysis and stores its decisions in a table.')
+    parser.add_argument('--output', default=utils.CONFIG.analysis.decision_table or 'decision_table.json', help='decision table file')
+    parser.add_argument('--samples', type=int, default=64, help='number of uniform samples between the breakpoints of each numeric input')
+    parser.add_argument('--resolution', type=float, default=1e-4, help='precision of the boundaries')
+    args = parser.parse_args()
+    config = utils.CONFIG.analysis
+    if config.fake:
+        # random decisions would be stored as boundaries and trusted as decisions of the model
+        parser.error('analysis->fake is set, the decision table can be compiled only from the actual analysis')
+    table = compile_table(analysis.actual_execute_analysis, config.model_path, args.samples, args.resolution)
+    with open(args.output, 'w') as f:
+        json.dump(table, f, indent=2)
+    print(f'Decision table of {config.model_path} written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
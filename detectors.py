@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Streaming detection of lazy customs agents from their decisions (virtual or physical inspection).
+
+Each decision updates a constant state of its agent; the rule engine is notified (by the on_alarm callback
+with the id of the agent) only when the statistic of the agent crosses the alarm boundary.
+"""
+import math
+from statistics import NormalDist
+
+THRESHOLD = 'threshold'  # the cumulative ratios checked by rules.CustomsAgentTooLazyRule in every step
+SPRT = 'sprt'
+EWMA = 'ewma'
+
+
+class SequentialProbabilityRatioTest:
+    """Wald's test of the rate of virtual inspections of each agent: normal rate (H0) against lazy rate (H1)
+
+    The log-likelihood ratio of the decisions since the last conclusion is compared with the boundaries given
+    by the false alarm and miss rates; after each conclusion the test starts again, so old decisions are forgotten.
+    """
+
+    def __init__(self, on_alarm, normal_rate: float, lazy_rate: float, false_alarm: float, miss_rate: float):
+        if not 0 < normal_rate < lazy_rate < 1:
+            raise ValueError(f'rates must be 0 < normal ({normal_rate}) < lazy ({lazy_rate}) < 1')
+        self.on_alarm = on_alarm
+        self.virtual_step = math.log(lazy_rate / normal_rate)
+        self.physical_step = math.log((1 - lazy_rate) / (1 - normal_rate))
+        self.upper = math.log((1 - miss_rate) / false_alarm)  # accepting H1, i.e., an alarm
+        self.lower = math.log(miss_rate / (1 - false_alarm))  # accepting H0
+        self.ratios = []  # agent id -> log-likelihood ratio
+
+    def observe(self, agent: int, virtual: bool) -> None:
+        ratios = self.ratios
+        if agent >= len(ratios):
+            ratios.extend([0.] * (agent + 1 - len(ratios)))
+        ratio = ratios[agent] + (self.virtual_step if virtual else self.physical_step)
+        if ratio >= self.upper:
+            ratio = 0.
+            self.on_alarm(agent)
+        elif ratio <= self.lower:
+            ratio = 0.
+        ratios[agent] = ratio
+
+
+class EwmaChart:
+    """Exponentially weighted moving average of the virtual inspections (1) and physical ones (0) of each agent
+
+    The alarm is raised when the average exceeds the upper control limit of the normal rate (set by the
+    false alarm rate of a single decision), and rearmed when it falls below it again.
+    """
+
+    def __init__(self, on_alarm, normal_rate: float, false_alarm: float, weight: float):
+        self.on_alarm = on_alarm
+        self.normal_rate = normal_rate
+        self.weight = weight
+        width = NormalDist().inv_cdf(1 - false_alarm)
+        self.limit = normal_rate + width * math.sqrt(normal_rate * (1 - normal_rate) * weight / (2 - weight))
+        self.averages = []  # agent id -> moving average
+        self.alarms = []  # agent id -> whether the average is over the limit
+
+    def observe(self, agent: int, virtual: bool) -> None:
+        averages = self.averages
+        if agent >= len(averages):
+            averages.extend([self.normal_rate] * (agent + 1 - len(averages)))
+            self.alarms.extend([False] * (agent + 1 - len(self.alarms)))
+        average = averages[agent] + self.weight * ((1. if virtual else 0.) - averages[agent])
+        averages[agent] = average
+        over = average > self.limit
+        if over != self.alarms[agent]:
+            self.alarms[agent] = over
+            if over:
+                self.on_alarm(agent)
+
+
+def create_detector(config, on_alarm):
+    """Detector of the method of the configuration (see utils.ConfigDetector)"""
+    if config.method == SPRT:
+        return SequentialProbabilityRatioTest(on_alarm, config.normal_rate, config.lazy_rate, config.false_alarm, config.miss_rate)
+    if config.method == EWMA:
+        return EwmaChart(on_alarm, config.normal_rate, config.false_alarm, config.ewma_weight)
+    raise ValueError(f'unknown detector {config.method}, use {THRESHOLD}, {SPRT} or {EWMA}')
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+from components import ContainerState
+from history import History, SERIES
+from outputs import Outputs
+from simulation import Simulation
+from sprites import SpriteCache
+import scene
+import utils
+
+from tkinter import *
+import logging
+from collections import deque
+
+
+def terminate_app(root, app):
+    logging.info('Terminating')
+    app.outputs.stop()
+    app.outputs.report()
+    print(app.simulation.statistics.print_statistics())
+    root.destroy()
+
+
+class HistoryChart(Canvas):
+    """Charts of the series of the history, one strip per series, redrawn by a timer independent of the simulation
+
+    The canvas items are created once; a redraw only moves the points of the lines (and only if there are new samples).
+    """
+
+    WIDTH = 600
+    STRIP = 60  # height of the chart of a series
+    MARGIN = 160  # width of the labels
+
+    def __init__(self, parent, history: History, span: int, refresh: float):
+        super().__init__(parent, width=HistoryChart.WIDTH, height=HistoryChart.STRIP * len(SERIES), background='white')
+        self.pack()
+        self.history = history
+        self.span = span
+        self.refresh = int(refresh * 1000)
+        self._drawn_tick = None
+        self._lines = {}
+        self._labels = {}
+        for i, name in enumerate(SERIES):
+            top = i * HistoryChart.STRIP
+            self.create_line(0, top, HistoryChart.WIDTH, top, fill='lightgray')
+            self._labels[name] = self.create_text(4, top + 4, anchor=NW, text=name, font=('Monospace 9'))
+            self._lines[name] = self.create_line(0, 0, 0, 0, fill='blue')
+        self.after(self.refresh, self.on_timer)
+
+    def redraw(self):
+        plot_width = HistoryChart.WIDTH - HistoryChart.MARGIN
+        for i, name in enumerate(SERIES):
+            ticks, values = self.history.series(name, self.span, plot_width)
+            if len(values) < 2:
+                continue
+            top = i * HistoryChart.STRIP + 4
+            height = HistoryChart.STRIP - 8
+            highest = max(values) or 1.
+            first = self.history.last_tick - self.span
+            coords = []
+            for tick, value in zip(ticks, values):
+                coords.append(HistoryChart.MARGIN + max(0., tick - first) * plot_width / self.span)
+                coords.append(top + height - value * height / highest)
+            self.coords(self._lines[name], *coords)
+            self.itemconfigure(self._labels[name], text=f'{name}\n{values[-1]:.3g} (max {highest:.3g})')
+
+    def on_timer(self):
+        if not self.winfo_exists():  # the window was closed
+            return
+        if self.history.last_tick != self._drawn_tick:
+            self._drawn_tick = self.history.last_tick
+            self.redraw()
+        self.after(self.refresh, self.on_timer)
+
+
+class App(Canvas):
+
+    STEP = 100
+    WIDTH = scene.WIDTH
+    REMOVALS = 1024  # removed containers kept until the next update (the oldest ones are dropped)
+
+    def __init__(self, parent):
+        self.simulation = Simulation()
+        self.height = scene.height(self.simulation)
+        super().__init__(parent, width=App.WIDTH, height=self.height)
+        self.root = parent
+        self.pack()
+        self.sprites = SpriteCache()
+        self.sprites.preload(scene.SPRITES)
+        self.draw_background()
+
+        self.agentimtk = self.sprites.photo('agent')
+        self.leadagentimtk = self.sprites.photo('leadagent')
+        self.authagentimtk = self.sprites.photo('authagent')
+        self.inspimtk = self.sprites.photo('magnify')
+        # canvas items are referenced by their ids (keyed by ids of agents and containers), so no tags are composed during the simulation
+        self._agent_items = {}
+        for agent in self.simulation.agents:
+            self._agent_items[agent.ident] = self.create_image(agent.pos_x, agent.pos_y, image=self.agentimtk, anchor=NW)
+        self.create_image(self.simulation.lead_agent.pos_x, self.simulation.lead_agent.pos_y, image=self.leadagentimtk, anchor=NW)
+        for agent in self.simulation.paagents:
+            self._agent_items[agent.ident] = self.create_image(agent.pos_x, agent.pos_y, image=self.authagentimtk, anchor=NW)
+        self._inspection_items = {}
+        self._container_items = {}
+        self._removals = deque(maxlen=App.REMOVALS)  # records of the containers removed since the last update
+        self.simulation.removal_sinks.append(self._removals.append)
+        # the same outputs as those of headless runs (without the recording, the window shows the scene)
+        self.outputs = Outputs(utils.CONFIG.memory.every, utils.CONFIG.metrics.port, utils.CONFIG.metrics.file, utils.CONFIG.history.chart)
+        self.history = self.outputs.history
+        config = utils.CONFIG.history
+        if config.chart:
+            window = Toplevel(parent)
+            window.title('FluidTrust history')
+            HistoryChart(window, self.history, config.chart_span, config.chart_refresh)
+        self.after(App.STEP, self.on_timer)
+        self._terminate = False
+        self.bind("<F10>", self.terminate_simulation)
+        self.focus_set()
+
+    def draw_background(self):
+        """Covers the canvas (sized by the number of slots) by tiles and places the offices over them"""
+        tile = self.sprites.photo('back', box=scene.YARD_TILE)
+        tile_width = scene.YARD_TILE[2] - scene.YARD_TILE[0]
+        tile_height = scene.YARD_TILE[3] - scene.YARD_TILE[1]
+        for y in range(0, self.height, tile_height):
+            for x in range(0, App.WIDTH, tile_width):
+                self.create_image(x, y, image=tile, anchor=NW, tags="bg")
+        self.create_image(scene.OFFICES[0], scene.OFFICES[1], image=self.sprites.photo('back', box=scene.OFFICES), anchor=NW, tags="bg")
+
+    def update_containers(self):
+        for slot in self.simulation.slots:
+            container = slot.container
+            if container is not None:
+                x, y = slot.position
+                items = self._container_items.get(container.ident)
+                if items is None:
+                    image = self.create_image(x, y, image=self.sprites.photo(scene.container_sprite(container)), anchor=NW)
+                    text, color = scene.customs_badge(container)
+                    cust_text = self.create_text(x + scene.CUSTOMS_BADGE[0], y + scene.CUSTOMS_BADGE[1], anchor=NW, text=text, fill=color, font=f'Monospace {scene.BADGE_FONT} bold')
+                    text, color = scene.pa_badge(container)
+                    pa_text = self.create_text(x + scene.PA_BADGE[0], y + scene.PA_BADGE[1], anchor=NW, text=text, fill=color, font=f'Monospace {scene.BADGE_FONT} bold')
+                    items = [image, cust_text, pa_text]
+                    marker = scene.faked_marker(container)
+                    if marker is not None:
+                        items.append(self.create_text(x + scene.FAKED_MARKER[0], y + scene.FAKED_MARKER[1], anchor=NW, text=marker, font=f'Monospace {scene.MARKER_FONT} bold', fill='orange'))
+                    self._container_items[container.ident] = items
+                else:
+                    if container.cleared_by_pa != ContainerState.DELIVERED:
+                        text, color = scene.pa_badge(container)
+                        self.itemconfigure(items[2], text=text, fill=color)
+                    if container.cleared_by_customs != ContainerState.DELIVERED:
+                        text, color = scene.customs_badge(container)
+                        self.itemconfigure(items[1], text=text, fill=color)
+
+        removals = self._removals
+        while removals:
+            for item in self._container_items.pop(removals.popleft().ident, ()):
+                self.delete(item)
+
+    def update_agents(self):
+        under_inspection = self.simulation.lead_agent.agents_under_inspection()
+        for agent in self.simulation.agents:
+            self.coords(self._agent_items[agent.ident], agent.pos_x, agent.pos_y)
+            items = self._inspection_items.get(agent.ident)
+            if agent in under_inspection:
+                if items is None:
+                    self._inspection_items[agent.ident] = (
+                        self.create_text(agent.pos_x + scene.INSPECTION_TEXT[0], agent.pos_y + scene.INSPECTION_TEXT[1], anchor=NW, text='UNDER INSPECTION',
+                                         font=f'Monospace {scene.INSPECTION_TEXT_FONT} bold', fill='red'),
+                        self.create_image(agent.pos_x + scene.INSPECTION_SPRITE[0], agent.pos_y + scene.INSPECTION_SPRITE[1], image=self.inspimtk, anchor=NW)
+                    )
+                else:
+                    self.coords(items[0], agent.pos_x + scene.INSPECTION_TEXT[0], agent.pos_y + scene.INSPECTION_TEXT[1])
+                    self.coords(items[1], agent.pos_x + scene.INSPECTION_SPRITE[0], agent.pos_y + scene.INSPECTION_SPRITE[1])
+            elif items is not None:
+                self.delete(items[0])
+                self.delete(items[1])
+                del self._inspection_items[agent.ident]
+
+    def update_paagents(self):
+        for agent in self.simulation.paagents:
+            self.coords(self._agent_items[agent.ident], agent.pos_x, agent.pos_y)
+
+    def on_timer(self):
+        if not self._terminate:
+            logging.info('Tick')
+            self.simulation.step()
+            self.outputs.tick(self.simulation, self.simulation.tick)
+            self.update_agents()
+            self.update_paagents()
+            self.update_containers()
+            self.after(App.STEP, self.on_timer)
+        else:
+            terminate_app(self.root, self)
+
+    def terminate_simulation(self, event):
+        self.create_text(App.WIDTH//2, self.height//2, anchor=CENTER, text='Terminating....')
+        self._terminate = True
+
+
+def main():
+    root = Tk()
+    root.title('FluidTrust demo')
+    root.tk.call('wm', 'iconphoto', root._w, PhotoImage(file='images/icon.png'))
+    app = App(root)
+    root.resizable(width=False, height=False)
+    root.protocol("WM_DELETE_WINDOW", lambda: terminate_app(root, app))
+    root.mainloop()
@@ -1,16 +1,24 @@
 #!/usr/bin/env python3
 
-from components import Item, ListOfItems, Container, Declaration
+from components import Item, ListOfItems, Container, ContainerPool, ContainerRecord, Declaration, PATHS, STAGES
+from quantiles import QuantileSketch
+from symbols import SymbolTable, AGENTS
+import heapq
+import os
 import re
+import utils
 from random import getrandbits, randrange
 from dataclasses import dataclass
 from collections import defaultdict, Counter
+from functools import cache
 
 #https://github.com/sameeravithana/Amazon-E-commerce-Data-set
 
 NUMBER_OF_ITEMS_IN_THE_CONTAINER = 10
 CURRENT_CONTAINER = 0
 TAX = 15  # in percents
+WRONG_TAX = 3  # declared by some containers instead of the tax of their items
+DEFAULT_LAST_TAX = 1  # last tax of a company before its first container is checked
 
 #ITEM_RE  = re.compile('ITEM ([0-9]+)')
 TITLE_RE = re.compile('Title=(.+)')
@@ -19,10 +27,18 @@ PRICE_RE = re.compile('ListPrice=([0-9]*)USD.*')
 
 DANGEROUS_TYPES = ['GPS_OR_NAVIGATION_SYSTEM', 'SURVEILANCE_SYSTEMS']
 
+ALL_PATHS = 'all'  # stage latencies of all containers
+DWELL = 'dwell'  # stage latency from the arrival to the removal
+
+
+def data_path(name: str) -> str:
+    """Path of the data file in the data directory (see simulation->data-dir)"""
+    return os.path.join(utils.CONFIG.simulation.data_dir, name)
+
 
 def read_items() -> list:
     items = []
-    with open('amazondata_electronics.txt') as f:
+    with open(data_path('amazondata_electronics.txt')) as f:
         title = None
         kind = None
         price = 0
@@ -51,7 +67,7 @@ def read_items() -> list:
 
 def read_shipping_companies() -> list:
     companies = []
-    with open('shipping.txt') as f:
+    with open(data_path('shipping.txt')) as f:
         for line in f:
             line = line.strip()
             companies.append(line)
@@ -72,90 +88,292 @@ class Location:
 
 def read_locations() -> list:
     locations = []
-    with open('locations.txt') as f:
+    with open(data_path('locations.txt')) as f:
         for line in f:
             line = line.strip()
             locations.append(Location.from_line(line))
     return locations
 
 
-ITEMS = read_items()
-LOCATIONS = read_locations()
-COMPANIES = read_shipping_companies()
+# the data files are read on the first use
+
+@cache
+def items() -> list[Item]:
+    return read_items()
+
+
+@cache
+def locations() -> list[Location]:
+    return read_locations()
+
+
+@cache
+def companies() -> list[str]:
+    return read_shipping_companies()
+
+
+@cache
+def country_ids() -> SymbolTable:
+    return SymbolTable(location.name for location in locations())
+
+
+@cache
+def company_ids() -> SymbolTable:
+    return SymbolTable(companies())
+
+
+_DATA = {'ITEMS': items, 'LOCATIONS': locations, 'COMPANIES': companies, 'COUNTRY_IDS': country_ids, 'COMPANY_IDS': company_ids}
+
+
+def __getattr__(name: str):
+    """ITEMS, LOCATIONS, COMPANIES, COUNTRY_IDS and COMPANY_IDS are loaded on the first access"""
+    if name in _DATA:
+        return _DATA[name]()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class ErrorCounters:
+    """Numbers of incorrect and correct declarations indexed by a country (or company) id"""
+
+    def __init__(self, errors: list[int] = None, ok: list[int] = None):
+        self.errors = errors if errors is not None else []
+        self.ok = ok if ok is not None else []
+
+    def _grow(self, symbol: int):
+        missing = symbol + 1 - len(self.errors)
+        self.errors.extend([0] * missing)
+        self.ok.extend([0] * missing)
+
+    def report_error(self, symbol: int):
+        if symbol >= len(self.errors):
+            self._grow(symbol)
+        self.errors[symbol] += 1
+
+    def report_correct(self, symbol: int):
+        if symbol >= len(self.ok):
+            self._grow(symbol)
+        self.ok[symbol] += 1
+
+    def get(self, symbol: int) -> (int, int):
+        if symbol < len(self.errors):
+            return self.errors[symbol], self.ok[symbol]
+        return 0, 0
+
+    def add_at(self, symbol: int, errors: int, ok: int):
+        if symbol >= len(self.errors):
+            self._grow(symbol)
+        self.errors[symbol] += errors
+        self.ok[symbol] += ok
+
+    def add(self, errors: list[int], ok: list[int]):
+        if len(errors) > len(self.errors):
+            self._grow(len(errors) - 1)
+        for i, (e, o) in enumerate(zip(errors, ok)):
+            self.errors[i] += e
+            self.ok[i] += o
+
+    def counters(self) -> (list[int], list[int]):
+        return list(self.errors), list(self.ok)
+
+    def reported(self):
+        """Ids with at least one report"""
+        return (i for i, (e, o) in enumerate(zip(self.errors, self.ok)) if e or o)
+
+
+def error_rate(local: ErrorCounters, remote: ErrorCounters, symbol: int) -> float:
+    errors, ok = local.get(symbol)
+    remote_errors, remote_ok = remote.get(symbol)
+    errors += remote_errors
+    s = errors + ok + remote_ok
+    if not s:
+        return 1.  # no info yet, thus returning max value
+    return errors / s
 
 
 class Statistics:
+    """Counters of the simulation; countries, companies and agents are identified by their ids (see symbols.py)"""
+
     def __init__(self):
-        self.country_stat = defaultdict(Counter)
-        self.company_stat = defaultdict(Counter)
+        countries, companies = len(country_ids()), len(company_ids())
+        self.country_stat = ErrorCounters([0] * countries, [0] * countries)
+        self.company_stat = ErrorCounters([0] * companies, [0] * companies)
         self.containers_stat = Counter()
-        self.last_tax = defaultdict(lambda: 1)  # TODO workaround
+        self.last_tax = defaultdict(lambda: DEFAULT_LAST_TAX)  # TODO workaround
         self.agent_stat = defaultdict(Counter)
         self.pa_officer_stat = defaultdict(Counter)
         self.pairing_stat = defaultdict(Counter)
+        self.queue_wait = defaultdict(Counter)  # class of work -> number of waits, total and maximal wait
+        self.stage_latency = defaultdict(QuantileSketch)  # (decision path or ALL_PATHS, stage or DWELL) -> steps
+        self.yard_stat = Counter()  # steps, total and maximal length of the yard queue, overflowing arrivals, steps of blocked ones
+        self.tick = 0  # current step of the simulation, the agents stamp the stages of containers with it
+        self.inspection_listeners = []  # called with the agent id and whether the decision was a virtual inspection
+        # error counters reported by other terminals (see terminals.py)
+        self.remote_country_stat = ErrorCounters()
+        self.remote_company_stat = ErrorCounters()
 
-    def report_country_error(self, country: str):
-        self.country_stat[country].update(error=1)
+    def report_country_error(self, country: int):
+        self.country_stat.report_error(country)
 
-    def report_country_correct(self, country: str):
-        self.country_stat[country].update(ok=1)
+    def report_country_correct(self, country: int):
+        self.country_stat.report_correct(country)
 
-    def country_error_rate(self, country: str) -> float:
-        s = self.country_stat[country]["error"] + self.country_stat[country]["ok"]
-        if not s:
-            return 1.  # no info yet, thus returning max value
-        return self.country_stat[country]["error"] / s
+    def country_error_rate(self, country: int) -> float:
+        return error_rate(self.country_stat, self.remote_country_stat, country)
 
-    def report_company_error(self, country: str):
-        self.company_stat[country].update(error=1)
+    def report_company_error(self, company: int):
+        self.company_stat.report_error(company)
 
-    def report_company_correct(self, country: str):
-        self.company_stat[country].update(ok=1)
+    def report_company_correct(self, company: int):
+        self.company_stat.report_correct(company)
 
-    def company_error_rate(self, country: str) -> float:
-        s = self.company_stat[country]["error"] + self.company_stat[country]["ok"]
-        if not s:
-            return 1.  # no info yet, thus returning max value
-        return self.company_stat[country]["error"] / s
+    def company_error_rate(self, company: int) -> float:
+        return error_rate(self.company_stat, self.remote_company_stat, company)
 
     def container_cleared_correctly(self):
-        self.containers_stat.update(cleared_ok=1)
+        self.containers_stat['cleared_ok'] += 1
 
     def container_cleared_incorrectly(self):
-        self.containers_stat.update(cleared_bad=1)
+        self.containers_stat['cleared_bad'] += 1
 
     def container_rejected(self):
-        self.containers_stat.update(rejected=1)
-
-    def company_last_tax(self, company) -> int:
+        self.containers_stat['rejected'] += 1
+
+    def report_container_removed(self, record: ContainerRecord):
+        dwell_time = record.dwell_time
+        self.containers_stat['removed'] += 1
+        self.containers_stat['dwell_time'] += dwell_time
+        paths = (ALL_PATHS, record.path) if record.path is not None else (ALL_PATHS,)
+        for path in paths:
+            self.stage_latency[(path, DWELL)].add(dwell_time)
+            for stage, latency in record.stage_latencies():
+                self.stage_latency[(path, stage)].add(latency)
+
+    def latency_percentiles(self) -> dict:
+        """p50, p95 and p99 of the stage latencies (in steps) by decision paths and stages"""
+        percentiles = defaultdict(dict)
+        for (path, stage), sketch in self.stage_latency.items():
+            percentiles[path][stage] = {'count': sketch.count, 'p50': sketch.quantile(0.5), 'p95': sketch.quantile(0.95), 'p99': sketch.quantile(0.99)}
+        return dict(percentiles)
+
+    def report_queue_wait(self, kind: str, wait: int):
+        counter = self.queue_wait[kind]
+        counter['count'] += 1
+        counter['total'] += wait
+        if wait > counter['max']:
+            counter['max'] = wait
+
+    def mean_queue_wait(self, kind: str) -> float:
+        counter = self.queue_wait[kind]
+        return counter['total'] / counter['count'] if counter['count'] else 0.
+
+    def report_yard_length(self, length: int):
+        self.yard_stat['steps'] += 1
+        self.yard_stat['length_total'] += length
+        if length > self.yard_stat['max_length']:
+            self.yard_stat['max_length'] = length
+
+    def report_yard_overflow(self, overflow: str):
+        """Arrival not admitted to the full yard: blocked (once, when first refused), dropped or diverted"""
+        self.yard_stat[overflow] += 1
+
+    def report_yard_blocked_step(self):
+        """Step in which a blocked arrival waits outside the terminal"""
+        self.yard_stat['blocked_steps'] += 1
+
+    def mean_yard_length(self) -> float:
+        steps = self.yard_stat['steps']
+        return self.yard_stat['length_total'] / steps if steps else 0.
+
+    def mean_dwell_time(self) -> float:
+        removed = self.containers_stat['removed']
+        return self.containers_stat['dwell_time'] / removed if removed else 0.
+
+    def company_last_tax(self, company: int) -> int:
         return self.last_tax[company]
 
-    def put_company_last_tax(self, company, tax):
+    def put_company_last_tax(self, company: int, tax):
         self.last_tax[company] = tax
 
-    def report_agent_physically_inspected(self, agent):
-        self.agent_stat[agent].update(physical=1)
+    def report_agent_physically_inspected(self, agent: int):
+        self.agent_stat[agent]['physical'] += 1
+        for listener in self.inspection_listeners:
+            listener(agent, False)
 
-    def report_agent_virtually_inspected(self, agent):
-        self.agent_stat[agent].update(virtual=1)
+    def report_agent_virtually_inspected(self, agent: int):
+        self.agent_stat[agent]['virtual'] += 1
+        for listener in self.inspection_listeners:
+            listener(agent, True)
 
-    def agent_physically_inspected(self, agent) -> int:
+    def agent_physically_inspected(self, agent: int) -> int:
         return self.agent_stat[agent]['physical']
 
-    def agent_virtually_inspected(self, agent) -> int:
+    def agent_virtually_inspected(self, agent: int) -> int:
         return self.agent_stat[agent]['virtual']
 
-    def report_pa_physically_inspected(self, officer):
-        self.pa_officer_stat[officer].update(physical=1)
-
-    def report_pa_computer_inspected(self, officer):
-        self.pa_officer_stat[officer].update(computer=1)
+    def report_pa_physically_inspected(self, officer: int):
+        self.pa_officer_stat[officer]['physical'] += 1
+
+    def report_pa_computer_inspected(self, officer: int):
+        self.pa_officer_stat[officer]['computer'] += 1
+
+    def report_pa_virtually_inspected(self, officer: int):
+        self.pa_officer_stat[officer]['virtual'] += 1
+
+    def report_pa_paired_with_agent(self, officer: int, agent: int):
+        self.pairing_stat[officer][agent] += 1
+
+    def shared_counters(self) -> dict:
+        """Local country and company error counters (to be sent to other terminals)"""
+        return {
+            'country': self.country_stat.counters(),
+            'company': self.company_stat.counters(),
+        }
+
+    def update_remote_counters(self, counters: dict):
+        """Replaces the counters of other terminals by the ones received from the aggregator"""
+        self.remote_country_stat = ErrorCounters(*counters['country'])
+        self.remote_company_stat = ErrorCounters(*counters['company'])
+
+    def summary(self) -> dict:
+        """All counters as plain (picklable) dicts keyed by names"""
+        return {
+            'containers': dict(self.containers_stat),
+            'country': {country_ids().name(i): {'error': self.country_stat.errors[i], 'ok': self.country_stat.ok[i]} for i in self.country_stat.reported()},
+            'company': {company_ids().name(i): {'error': self.company_stat.errors[i], 'ok': self.company_stat.ok[i]} for i in self.company_stat.reported()},
+            'agent': {AGENTS.name(k): dict(v) for k, v in self.agent_stat.items()},
+            'pa_officer': {AGENTS.name(k): dict(v) for k, v in self.pa_officer_stat.items()},
+            'pairing': {AGENTS.name(k): {AGENTS.name(a): n for a, n in v.items()} for k, v in self.pairing_stat.items()},
+            'queue_wait': {k: dict(v) for k, v in self.queue_wait.items()},
+            'yard': dict(self.yard_stat),
+            'stage_latency': {f'{path}/{stage}': sketch.to_dict() for (path, stage), sketch in self.stage_latency.items()},
+        }
 
-    def report_pa_virtually_inspected(self, officer):
-        self.pa_officer_stat[officer].update(virtual=1)
-
-    def report_pa_paired_with_agent(self, officer, agent):
-        self.pairing_stat[officer].update({agent: 1})
+    @classmethod
+    def from_summaries(cls, summaries: list[dict]):
+        """Sums up summaries of several simulations (e.g. terminals) into a single statistics"""
+        statistics = cls()
+        for summary in summaries:
+            statistics.containers_stat.update(summary['containers'])
+            for counters, table, key in ((statistics.country_stat, country_ids(), 'country'), (statistics.company_stat, company_ids(), 'company')):
+                for name, counts in summary[key].items():
+                    counters.add_at(table.intern(name), counts['error'], counts['ok'])
+            for stat, key in ((statistics.agent_stat, 'agent'), (statistics.pa_officer_stat, 'pa_officer')):
+                for name, counts in summary[key].items():
+                    stat[AGENTS.intern(name)].update(counts)
+            for name, counts in summary['pairing'].items():
+                statistics.pairing_stat[AGENTS.intern(name)].update({AGENTS.intern(a): n for a, n in counts.items()})
+            for kind, counts in summary['queue_wait'].items():
+                counter = statistics.queue_wait[kind]
+                counter['count'] += counts.get('count', 0)
+                counter['total'] += counts.get('total', 0)
+                counter['max'] = max(counter['max'], counts.get('max', 0))
+            max_length = max(statistics.yard_stat['max_length'], summary['yard'].get('max_length', 0))
+            statistics.yard_stat.update(summary['yard'])
+            statistics.yard_stat['max_length'] = max_length
+            for key, sketch in summary['stage_latency'].items():
+                path, stage = key.split('/')
+                statistics.stage_latency[(path, stage)].merge(QuantileSketch.from_dict(sketch))
+        return statistics
 
     def print_statistics(self):
         print('Statistics')
@@ -163,43 +381,59 @@ class Statistics:
         print('Containers')
         print('----------')
         print(f'Cleared: {self.containers_stat["cleared_ok"] + self.containers_stat["cleared_bad"]}, out of it incorrectly {self.containers_stat["cleared_bad"]}, Rejected: {self.containers_stat["rejected"]}')
+        print(f'Removed: {self.containers_stat["removed"]}, mean dwell time: {self.mean_dwell_time():.1f} steps')
         print('Countries error rate')
         print('--------------------')
-        for country in self.country_stat.keys():
-            print(f'{country}: {self.country_error_rate(country)}')
+        for country in self.country_stat.reported():
+            print(f'{country_ids().name(country)}: {self.country_error_rate(country)}')
         print('Companies error rate')
         print('--------------------')
-        for company in self.company_stat.keys():
-            print(f'{company}: {self.company_error_rate(company)}')
+        for company in self.company_stat.reported():
+            print(f'{company_ids().name(company)}: {self.company_error_rate(company)}')
         print('Customs agents')
         print('--------------')
-        for agent in sorted(self.agent_stat.keys()):
-            print(f'{agent} inspected: physically {self.agent_stat[agent]["physical"]}, virtually {self.agent_stat[agent]["virtual"]}')
+        for agent in sorted(self.agent_stat.keys(), key=AGENTS.name):
+            print(f'{AGENTS.name(agent)} inspected: physically {self.agent_stat[agent]["physical"]}, virtually {self.agent_stat[agent]["virtual"]}')
         print('PA officers')
         print('-----------')
-        for officer in sorted(self.pa_officer_stat.keys()):
-            print(f'{officer} inspected: physically {self.pa_officer_stat[officer]["physical"]}, from customs computer {self.pa_officer_stat[officer]["computer"]}, virtually {self.pa_officer_stat[officer]["virtual"]}')
+        for officer in sorted(self.pa_officer_stat.keys(), key=AGENTS.name):
+            print(f'{AGENTS.name(officer)} inspected: physically {self.pa_officer_stat[officer]["physical"]}, from customs computer {self.pa_officer_stat[officer]["computer"]}, virtually {self.pa_officer_stat[officer]["virtual"]}')
         print('Pairing')
         print('-------')
-        for officer in sorted(self.pairing_stat.keys()):
-            print(f'{officer} paired with: ', end='')
-            for agent in sorted(self.pairing_stat[officer]):
-                print(f'{agent} {self.pairing_stat[officer][agent]} times ', end='')
+        for officer in sorted(self.pairing_stat.keys(), key=AGENTS.name):
+            print(f'{AGENTS.name(officer)} paired with: ', end='')
+            for agent in sorted(self.pairing_stat[officer], key=AGENTS.name):
+                print(f'{AGENTS.name(agent)} {self.pairing_stat[officer][agent]} times ', end='')
             print()
+        print('Queue waits')
+        print('-----------')
+        for kind in sorted(self.queue_wait.keys()):
+            print(f'{kind}: {self.queue_wait[kind]["count"]} times, mean {self.mean_queue_wait(kind):.1f} steps, max {self.queue_wait[kind]["max"]} steps')
+        print('Yard')
+        print('----')
+        print(f'Length: mean {self.mean_yard_length():.2f}, max {self.yard_stat["max_length"]}; arrivals blocked {self.yard_stat["blocked"]} (waiting {self.yard_stat["blocked_steps"]} steps), dropped {self.yard_stat["dropped"]}, diverted {self.yard_stat["diverted"]}')
+        print('Stage latencies')
+        print('---------------')
+        for path in (ALL_PATHS, ) + PATHS:
+            for stage in STAGES + (DWELL, ):
+                sketch = self.stage_latency.get((path, stage))
+                if sketch:
+                    print(f'{path} {stage}: p50 {sketch.quantile(0.5):.1f}, p95 {sketch.quantile(0.95):.1f}, p99 {sketch.quantile(0.99):.1f} steps ({sketch.count} containers)')
         print('END-OF-STATISTICS')
 
 
 def get_random_list_of_items(size: int) -> ListOfItems:
-    length = len(ITEMS)
+    all_items = items()
+    length = len(all_items)
     item_ids = []
     while len(item_ids) != size:
         i = randrange(0, length)  # get random item
         if i not in item_ids:     # do not repeat items in the list
             item_ids.append(i)
-    items = []
+    selected = []
     for i in item_ids:
-        items.append(ITEMS[i])
-    return items
+        selected.append(all_items[i])
+    return selected
 
 
 def get_items_tax(lst: ListOfItems) -> int:
@@ -210,6 +444,11 @@ def get_items_tax(lst: ListOfItems) -> int:
     return tax if tax else 1
 
 
+def max_declared_tax() -> int:
+    """Upper bound of the tax declared by a generated container (of its most expensive items or WRONG_TAX)"""
+    return max(get_items_tax(heapq.nlargest(NUMBER_OF_ITEMS_IN_THE_CONTAINER, items(), key=lambda item: item.price)), WRONG_TAX)
+
+
 def get_list_for_declaration_and_tax(lst: ListOfItems) -> (ListOfItems, int):
     """With small probability return another list and maybe also a wrong tax"""
     modify = not getrandbits(2)
@@ -218,7 +457,7 @@ def get_list_for_declaration_and_tax(lst: ListOfItems) -> (ListOfItems, int):
         return newlist, get_items_tax(newlist)
     else:
         if not getrandbits(2):
-            return lst, 3
+            return lst, WRONG_TAX
         else:
             return lst, get_items_tax(lst)
 
@@ -233,19 +472,26 @@ def pretend_not_dangerous(lst: ListOfItems) -> ListOfItems:
 
 
 def get_random_source_and_destination() -> tuple:
-    length = len(LOCATIONS)
-    return LOCATIONS[randrange(0, length)], LOCATIONS[randrange(0, length)]
+    all_locations = locations()
+    length = len(all_locations)
+    return all_locations[randrange(0, length)], all_locations[randrange(0, length)]
 
 
-def get_random_company() -> str:
-    return COMPANIES[randrange(0, len(COMPANIES))]
+def get_random_company() -> int:
+    all_companies = companies()
+    return company_ids().id(all_companies[randrange(0, len(all_companies))])
 
 
-def generate_container() -> Container:
+def next_container_id() -> int:
+    global CURRENT_CONTAINER
+    CURRENT_CONTAINER += 1
+    return CURRENT_CONTAINER
+
+
+def generate_container(pool: ContainerPool = None) -> Container:
     actual_items = get_random_list_of_items(NUMBER_OF_ITEMS_IN_THE_CONTAINER)
     source, destination = get_random_source_and_destination()
     declared_items, tax = get_list_for_declaration_and_tax(actual_items)
     actual_tax = get_items_tax(actual_items)
-    global CURRENT_CONTAINER
-    CURRENT_CONTAINER += 1
-    return Container(f'Container{CURRENT_CONTAINER:03}', get_random_company(), actual_items, actual_tax, Declaration(declared_items, source.name, destination.name, tax))
+    create = pool.acquire if pool is not None else Container
+    return create(next_container_id(), get_random_company(), actual_items, actual_tax, Declaration(declared_items, country_ids().id(source.name), country_ids().id(destination.name), tax))
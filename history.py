@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""History of the simulation: time series of its metrics in fixed memory.
+
+The metrics are sampled every few steps and consolidated into round-robin archives (as in RRDtool): each
+archive keeps a fixed number of rows, each row is the average and the maximum of a fixed number of samples,
+so fine archives hold the recent history and coarse ones the whole run, and the memory does not grow.
+"""
+import math
+import operator
+from array import array
+
+from components import AgentState, ContainerState
+
+AVERAGE = 'average'
+MAXIMUM = 'maximum'
+
+
+def queue_lengths(simulation) -> (int, int, int):
+    """Numbers of occupied slots and of containers waiting for a PA officer and for a customs agent"""
+    occupied = waiting_for_pa = waiting_for_customs = 0
+    for slot in simulation.slots.slots:
+        container = slot.container
+        if container is None:
+            continue
+        occupied += 1
+        if slot.agent is None:
+            if container.cleared_by_pa == ContainerState.DELIVERED:
+                waiting_for_pa += 1
+            elif container.cleared_by_customs == ContainerState.DELIVERED:
+                waiting_for_customs += 1
+    return occupied, waiting_for_pa, waiting_for_customs
+
+
+def ratio(part: int, total: int) -> float:
+    return part / total if total else 0.
+
+
+def decision_rate(simulation, outcome: str) -> float:
+    containers = simulation.statistics.containers_stat
+    return ratio(containers[outcome], containers['cleared_ok'] + containers['cleared_bad'] + containers['rejected'])
+
+
+def counters_error_rate(counters) -> float:
+    errors = sum(counters.errors)
+    return ratio(errors, errors + sum(counters.ok))
+
+
+def inspection_ratios(simulation) -> (float, float):
+    """Ratio of virtual inspections of all customs agents and the highest one of an agent (as checked by rules.too_lazy_agent)"""
+    virtually = physically = 0
+    highest = 0.
+    for agent in simulation.agents:
+        inspected = simulation.statistics.agent_stat[agent.ident]
+        virtual, physical = inspected['virtual'], inspected['physical']
+        virtually += virtual
+        physically += physical
+        if virtual + physical > 10:
+            highest = max(highest, virtual / (virtual + physical))
+    return ratio(virtually, virtually + physically), highest
+
+
+SERIES = ('occupied_slots', 'waiting_for_pa', 'waiting_for_customs', 'yard', 'busy_agents', 'rejected', 'cleared_incorrectly',
+          'country_errors', 'company_errors', 'virtual_ratio', 'laziest_ratio')
+
+
+def sample(simulation) -> list[float]:
+    """Current values of SERIES"""
+    statistics = simulation.statistics
+    return [
+        *queue_lengths(simulation),
+        len(simulation.yard),
+        sum(agent.state != AgentState.IDLE for agent in simulation.agents),
+        decision_rate(simulation, 'rejected'),
+        decision_rate(simulation, 'cleared_bad'),
+        counters_error_rate(statistics.country_stat),
+        counters_error_rate(statistics.company_stat),
+        *inspection_ratios(simulation),
+    ]
+
+
+class Archive:
+    """Ring buffer of rows consolidating a fixed number of samples of each series
+
+    An archive is fed by the samples or by the rows of a finer archive (merged rows of the same number of samples).
+    """
+
+    def __init__(self, step: int, rows: int, series: int, merged: int = 1):
+        self.step = step  # samples per row
+        self.rows = rows
+        self.merged = merged  # inputs per row (samples, or rows of the finer archive)
+        self.average = [array('d', [math.nan]) * rows for _ in range(series)]
+        self.maximum = [array('d', [math.nan]) * rows for _ in range(series)]
+        self.written = 0  # rows written since the start, the oldest ones are overwritten
+        self._sums = None  # of the inputs of the current row
+        self._maxima = None
+        self._inputs = 0
+
+    def add(self, averages: list[float], maxima: list[float]):
+        """Adds a sample (the same values twice) or a row of the finer archive, returns the written row or None"""
+        if self._inputs:
+            averages = list(map(operator.add, self._sums, averages))
+            maxima = list(map(max, self._maxima, maxima))
+        self._inputs += 1
+        if self._inputs < self.merged:
+            self._sums = averages
+            self._maxima = maxima
+            return None
+        if self.merged > 1:
+            averages = [value / self.merged for value in averages]
+        row = self.written % self.rows
+        for data, value in zip(self.average, averages):
+            data[row] = value
+        for data, value in zip(self.maximum, maxima):
+            data[row] = value
+        self._inputs = 0
+        self.written += 1
+        return averages, maxima
+
+    def first_row(self) -> int:
+        """Index (since the start) of the oldest kept row"""
+        return max(0, self.written - self.rows)
+
+    def values(self, index: int, consolidation: str = AVERAGE, rows: int = None) -> list[float]:
+        """Last rows (all kept by default) of the series, the oldest first"""
+        data = (self.average if consolidation == AVERAGE else self.maximum)[index]
+        kept = min(self.written, self.rows)
+        rows = kept if rows is None else min(rows, kept)
+        end = self.written % self.rows
+        if rows <= end:
+            return data[end - rows:end].tolist()
+        return data[self.rows - (rows - end):].tolist() + data[:end].tolist()
+
+
+class History:
+    """Round-robin archives of SERIES sampled every few steps (an observer of runner.run)
+
+    The archives are given as (samples per row, rows), from the finest to the coarsest; the samples per row
+    of each archive are a multiple of those of the finer one, which feeds it.
+    """
+
+    def __init__(self, archives=((1, 2000), (20, 2000), (400, 2000)), every: int = 10):
+        self.every = every
+        self._index = {name: i for i, name in enumerate(SERIES)}
+        self.archives = []
+        finer = 1
+        for step, rows in archives:
+            if step % finer:
+                raise ValueError(f'samples per row of the archives must be multiples of the finer ones, {step} is not a multiple of {finer}')
+            self.archives.append(Archive(step, rows, len(SERIES), step // finer))
+            finer = step
+        self.first_tick = None  # step of the first sample
+        self.last_tick = None
+
+    def tick(self, simulation, tick: int) -> None:
+        if tick % self.every == 0:
+            self.add(tick, sample(simulation))
+
+    def add(self, tick: int, values: list[float]) -> None:
+        if self.first_tick is None:
+            self.first_tick = tick
+        self.last_tick = tick
+        row = values, values
+        for archive in self.archives:
+            row = archive.add(*row)
+            if row is None:
+                break
+
+    def row_tick(self, archive: Archive, row: int) -> int:
+        """Step of the last sample of the row"""
+        return self.first_tick + ((row + 1) * archive.step - 1) * self.every
+
+    def archive_for(self, span: int, points: int = None) -> Archive:
+        """The finest archive covering the last span steps (in at most the points rows), the coarsest if none does"""
+        for archive in self.archives:
+            steps_per_row = archive.step * self.every
+            if archive.rows * steps_per_row >= span and (points is None or span <= points * steps_per_row):
+                return archive
+        return self.archives[-1]
+
+    def series(self, name: str, span: int = None, points: int = None, consolidation: str = AVERAGE) -> (list[int], list[float]):
+        """Steps and values of the series in the last span steps (the whole history by default)"""
+        if self.first_tick is None:
+            return [], []
+        if span is None:
+            span = self.last_tick - self.first_tick + 1
+        archive = self.archive_for(span, points)
+        rows = min(archive.written, math.ceil(span / (archive.step * self.every)))
+        values = archive.values(self._index[name], consolidation, rows)
+        first = archive.written - len(values)
+        return [self.row_tick(archive, row) for row in range(first, archive.written)], values
+
+    def memory(self) -> int:
+        """Bytes of the archives"""
+        return sum(data.itemsize * len(data) for archive in self.archives for data in archive.average + archive.maximum)
+
+    def to_dict(self) -> dict:
+        """All kept rows of all archives (JSON serializable)"""
+        archives = []
+        for archive in self.archives:
+            first = archive.first_row()
+            series = {}
+            for name, i in self._index.items():
+                series[name] = {AVERAGE: archive.values(i, AVERAGE), MAXIMUM: archive.values(i, MAXIMUM)}
+            archives.append({'step': archive.step * self.every,
+                             'ticks': [self.row_tick(archive, row) for row in range(first, archive.written)],
+                             'series': series})
+        return {'first_tick': self.first_tick, 'last_tick': self.last_tick, 'archives': archives}
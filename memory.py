@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Memory accounting of a running simulation.
+
+Every few steps a sample is taken: the traced memory attributed to the modules allocating it (tracemalloc),
+the numbers of live containers, items and declarations, and the sizes of the collections of the simulation
+which may grow in long runs. The cost is paid only when a sample is taken, except for tracemalloc, which
+slows down all allocations while it is enabled.
+"""
+import gc
+import logging
+import logging.handlers
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+
+import analysis
+import quantiles
+from components import Container, ContainerRecord, Declaration, Item
+
+COUNTED = (Container, ContainerRecord, Item, Declaration)
+
+
+def object_counts() -> dict:
+    """Numbers of live instances of COUNTED (walks all objects tracked by the garbage collector)"""
+    counts = Counter(map(type, gc.get_objects()))
+    return {cls.__name__: counts[cls] for cls in COUNTED}
+
+
+def logging_buffers() -> int:
+    """Records held by the buffering handlers (e.g. MemoryHandler) of all loggers"""
+    loggers = [logging.root] + [logger for logger in logging.root.manager.loggerDict.values() if isinstance(logger, logging.Logger)]
+    return sum(len(handler.buffer) for logger in loggers for handler in logger.handlers
+               if isinstance(handler, logging.handlers.BufferingHandler))
+
+
+def collection_sizes(simulation) -> dict:
+    """Lengths of the collections of the simulation, its statistics, rules and agents"""
+    statistics = simulation.statistics
+    lead_agent = simulation.lead_agent
+    under_inspection = len(lead_agent.agents_under_inspection())
+    return {
+        'yard': len(simulation.yard),
+        'container_pool': len(simulation.pool),
+        'statistics.country_stat': len(statistics.country_stat.errors),
+        'statistics.company_stat': len(statistics.company_stat.errors),
+        'statistics.last_tax': len(statistics.last_tax),
+        'statistics.agent_stat': len(statistics.agent_stat),
+        'statistics.pairing_stat': sum(map(len, statistics.pairing_stat.values())),
+        'statistics.stage_latency_buckets': sum(len(sketch.buckets) for sketch in statistics.stage_latency.values()),
+        'rules.instantiated_rules': sum(len(getattr(rule, 'instantiated_rules', ())) for rule in simulation.rules),
+        'rules.alarms': sum(len(getattr(rule, 'alarms', ())) for rule in simulation.rules),
+        'lead_agent.under_inspection': under_inspection,
+        'lead_agent.after_inspection': len(lead_agent.agents_inspected()) - under_inspection,
+        'analysis.latencies': len(analysis.LATENCIES),
+        'logging.buffers': logging_buffers(),
+    }
+
+
+def steady_memory() -> int:
+    """Traced bytes except the snapshots and the buckets of the quantile sketches, which grow with the range of
+    the values (see quantiles.py) rather than with the length of the run"""
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                           tracemalloc.Filter(False, quantiles.__file__)])
+    return sum(statistic.size for statistic in snapshot.statistics('filename'))
+
+
+def module_files() -> dict:
+    """File name -> name of the loaded module"""
+    return {module.__file__: name for name, module in list(sys.modules.items()) if getattr(module, '__file__', None)}
+
+
+def traced_by_module(snapshot: tracemalloc.Snapshot) -> Counter:
+    """Bytes allocated by each module, an allocation is attributed to the most recent frame in a source file"""
+    files = module_files()
+    modules = Counter()
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])  # the snapshots themselves
+    for statistic in snapshot.statistics('traceback'):
+        filename = statistic.traceback[-1].filename  # the most recent frame
+        for frame in reversed(statistic.traceback):
+            if not frame.filename.startswith('<'):  # not generated code, e.g. __init__ of dataclasses
+                filename = frame.filename
+                break
+        modules[files.get(filename, filename)] += statistic.size
+    return modules
+
+
+class MemoryMonitor:
+    """Samples the memory every few steps (an observer of runner.run), the last sample is a JSON serializable dict"""
+
+    def __init__(self, every: int = 1000, trace: bool = False, frames: int = 1, top: int = 10):
+        self.every = every
+        self.trace = trace
+        self.top = top
+        self.last = None
+        self.samples = deque(maxlen=1000)  # (step, traced bytes), the oldest are dropped
+        self._first_modules = None
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def tick(self, simulation, tick: int) -> None:
+        if tick % self.every == 0:
+            self.sample(simulation, tick)
+
+    def sample(self, simulation, tick: int) -> dict:
+        start = time.perf_counter()
+        sample = {'tick': tick}
+        if self.trace:
+            traced, peak = tracemalloc.get_traced_memory()
+            modules = traced_by_module(tracemalloc.take_snapshot())
+            if self._first_modules is None:
+                self._first_modules = modules
+            growth = modules.copy()
+            growth.subtract(self._first_modules)
+            sample.update(traced=traced, peak=peak, modules=dict(modules.most_common(self.top)),
+                          growth=dict(growth.most_common(self.top)))
+            self.samples.append((tick, traced))
+        sample['objects'] = object_counts()
+        sample['collections'] = collection_sizes(simulation)
+        sample['seconds'] = time.perf_counter() - start  # cost of the sample
+        self.last = sample  # a new dict, never modified after it is published
+        return sample
+
+    def stop(self) -> None:
+        if self.trace:
+            tracemalloc.stop()
+
+    def print_report(self) -> None:
+        sample = self.last
+        if sample is None:
+            return
+        print('Memory')
+        print('======')
+        print(f'Step {sample["tick"]}, sampled every {self.every} steps in {sample["seconds"] * 1000:.1f} ms')
+        if self.trace:
+            first_tick, first = self.samples[0]
+            print(f'Traced: {sample["traced"] / 1024:.0f} KiB, peak {sample["peak"] / 1024:.0f} KiB, '
+                  f'{(sample["traced"] - first) / 1024:+.0f} KiB since step {first_tick}')
+            print('By module: ' + ', '.join(f'{module} {size / 1024:.0f} KiB' for module, size in sample['modules'].items()))
+            print('Growth by module: ' + ', '.join(f'{module} {size / 1024:+.0f} KiB' for module, size in sample['growth'].items()))
+        print('Objects: ' + ', '.join(f'{name} {count}' for name, count in sample['objects'].items()))
+        print('Collections: ' + ', '.join(f'{name} {size}' for name, size in sample['collections'].items()))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Live metrics of a running simulation.
+
+The simulation loop publishes a snapshot every few steps. A snapshot is a new dict that is never modified
+after publishing, so the HTTP server and the snapshot file writer only read the reference to the latest one;
+they need no locks and never slow down the simulation.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import analysis
+from components import AgentState
+from history import queue_lengths
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Percentile of sorted values (nearest rank)"""
+    if not values:
+        return 0.
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def error_rate(errors: int, total: int) -> float:
+    return errors / total if total else 0.
+
+
+class MetricsPublisher:
+    def __init__(self, every: int = 10):
+        self.every = every
+        self.memory = None  # memory.MemoryMonitor whose last sample is published
+        self.snapshot = {}
+        self._last_tick = 0
+        self._last_time = time.perf_counter()
+
+    def tick(self, simulation, tick: int) -> None:
+        """Called by the simulation loop after each step"""
+        if tick % self.every == 0:
+            self.publish(simulation, tick)
+
+    def publish(self, simulation, tick: int) -> None:
+        now = time.perf_counter()
+        ticks_per_second = (tick - self._last_tick) / (now - self._last_time) if now > self._last_time else 0.
+        self._last_tick = tick
+        self._last_time = now
+
+        occupied, waiting_for_pa, waiting_for_customs = queue_lengths(simulation)
+        agent_states = Counter(agent.state.name for agent in simulation.agents)
+        pa_states = Counter(agent.state.name for agent in simulation.paagents)
+
+        latencies = sorted(analysis.LATENCIES)
+        statistics = simulation.statistics
+        containers = statistics.containers_stat
+        decided = containers['cleared_ok'] + containers['cleared_bad'] + containers['rejected']
+        country_errors = sum(statistics.country_stat.errors)
+        company_errors = sum(statistics.company_stat.errors)
+
+        self.snapshot = {
+            'tick': tick,
+            'time': time.time(),
+            'ticks_per_second': ticks_per_second,
+            'queues': {
+                'occupied_slots': occupied,
+                'slots': simulation.slots.number_of_slots(),
+                'waiting_for_pa': waiting_for_pa,
+                'waiting_for_customs': waiting_for_customs,
+                'pa_waiting_for_agent': pa_states[AgentState.PA_REQUEST_A.name],
+                'yard': len(simulation.yard),
+                'yard_capacity': simulation.yard.capacity,
+            },
+            'agent_states': dict(agent_states),
+            'pa_officer_states': dict(pa_states),
+            'analysis_latency': {
+                'calls': len(latencies),
+                'p50': percentile(latencies, 0.5),
+                'p90': percentile(latencies, 0.9),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else 0.,
+            },
+            'analysis_calls': dict(analysis.COUNTERS),
+            'queue_waits': {kind: statistics.mean_queue_wait(kind) for kind in statistics.queue_wait.keys()},
+            'yard': dict(statistics.yard_stat),
+            'stage_latency': statistics.latency_percentiles(),
+            'containers': dict(containers),
+            'error_rates': {
+                'rejected': error_rate(containers['rejected'], decided),
+                'cleared_incorrectly': error_rate(containers['cleared_bad'], decided),
+                'countries': error_rate(country_errors, country_errors + sum(statistics.country_stat.ok)),
+                'companies': error_rate(company_errors, company_errors + sum(statistics.company_stat.ok)),
+            },
+        }
+        if self.memory is not None and self.memory.last is not None:
+            self.snapshot['memory'] = self.memory.last
+
+
+def start_server(publisher: MetricsPublisher, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serves the latest snapshot as JSON (GET /metrics) from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = json.dumps(publisher.snapshot).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug('metrics: ' + format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    logging.warning('Metrics served at http://%s:%d/metrics', host, server.server_address[1])
+    return server
+
+
+class SnapshotFileWriter(threading.Thread):
+    """Periodically (and once more when stopped) rewrites the file with the latest snapshot"""
+
+    def __init__(self, publisher: MetricsPublisher, path: str, interval: float):
+        super().__init__(name='MetricsFileWriter', daemon=True)
+        self._publisher = publisher
+        self._path = path
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            self.write()
+        self.write()
+
+    def write(self):
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._publisher.snapshot, f)
+        os.replace(tmp, self._path)  # readers never see a partially written file
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
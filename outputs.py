@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Outputs of a single terminal besides the statistics (memory samples, live metrics, history, recording).
+
+The outputs are observers of the simulation steps, shared by the headless runner and the GUI.
+Their modules are loaded only when they are enabled.
+"""
+import utils
+
+
+def memory_monitor(every: int):
+    """Monitor of the memory sampled every few steps, None if disabled"""
+    if not every:
+        return None
+    from memory import MemoryMonitor
+    config = utils.CONFIG.memory
+    return MemoryMonitor(every, config.trace, config.frames, config.top)
+
+
+def metrics_publisher(port: int, file: str, monitor=None):
+    """Publisher of the live metrics served on the port and written to the file with its writer, (None, None) if both are disabled"""
+    if not (port or file):
+        return None, None
+    import metrics
+    config = utils.CONFIG.metrics
+    publisher = metrics.MetricsPublisher(config.publish_every)
+    publisher.memory = monitor
+    if port:
+        metrics.start_server(publisher, port)
+    writer = None
+    if file:
+        writer = metrics.SnapshotFileWriter(publisher, file, config.interval)
+        writer.start()
+    return publisher, writer
+
+
+def history(enabled: bool):
+    """History of the metrics, None if disabled"""
+    if not enabled:
+        return None
+    from history import History
+    config = utils.CONFIG.history
+    return History(config.archives, config.every)
+
+
+def recorder(output: str, every: int):
+    """Recorder of the frames to the output, None if disabled"""
+    if not output:
+        return None
+    from recorder import Recorder  # PIL and the encoder are loaded only for recording
+    config = utils.CONFIG.record
+    return Recorder(output, every, config.fps, config.buffers, config.scale)
+
+
+class Outputs:
+    """The enabled outputs; observers are notified in the order memory, metrics (publishing the last memory sample), history, recording"""
+
+    def __init__(self, memory_every: int = 0, metrics_port: int = 0, metrics_file: str = '', history_enabled: bool = False,
+                 record: str = '', record_every: int = 10):
+        self.monitor = memory_monitor(memory_every)
+        self.publisher, self.writer = metrics_publisher(metrics_port, metrics_file, self.monitor)
+        self.history = history(history_enabled)
+        self.recorder = recorder(record, record_every)
+        self.observers = [observer for observer in (self.monitor, self.publisher, self.history, self.recorder) if observer is not None]
+
+    def tick(self, simulation, tick: int) -> None:
+        for observer in self.observers:
+            observer.tick(simulation, tick)
+
+    def stop(self) -> None:
+        """Writes the last metrics and waits for the recording (also after a failure, the shared memory must be released)"""
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    def report(self) -> None:
+        """Prints the memory report"""
+        if self.monitor is not None:
+            self.monitor.stop()
+            self.monitor.print_report()
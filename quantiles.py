@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Streaming quantiles of non-negative values (e.g. latencies in steps)."""
+import math
+
+
+class QuantileSketch:
+    """Quantiles with a bounded relative error from counts of values in logarithmic buckets (as in DDSketch)
+
+    The memory depends only on the range of the values (about 350 buckets per decade for 1 % accuracy),
+    not on their number, and sketches of several simulations can be merged.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}  # index -> number of values in (gamma^(index-1), gamma^index]
+        self.zeros = 0
+        self.count = 0
+        self.max = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return min(2 * self._gamma ** index / (self._gamma + 1), self.max)
+        return self.max
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Adds the values of other sketch (with the same accuracy)"""
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        """Plain (picklable and JSON serializable) form, see from_dict"""
+        return {'accuracy': self.relative_accuracy, 'buckets': {str(i): n for i, n in self.buckets.items()},
+                'zeros': self.zeros, 'count': self.count, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'QuantileSketch':
+        sketch = cls(data['accuracy'])
+        sketch.buckets = {int(i): n for i, n in data['buckets'].items()}
+        sketch.zeros = data['zeros']
+        sketch.count = data['count']
+        sketch.max = data['max']
+        return sketch
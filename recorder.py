@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Recording of the simulation to an image sequence or a video.
+
+The renderer draws the scene of the GUI (see scene.py) with PIL into frames, which are passed through
+shared memory buffers to an encoder process, so the simulation does not wait for the compression
+(only for a free buffer when the encoder falls behind).
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import time
+from multiprocessing import shared_memory
+
+from PIL import Image, ImageDraw, ImageFont
+
+import scene
+from sprites import SpriteCache
+
+FONTS = ('DejaVuSansMono-Bold.ttf', 'LiberationMono-Bold.ttf', 'Courier New Bold.ttf')
+
+
+def load_font(size: int):
+    for name in FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
+
+class FrameRenderer:
+    """Draws the scene of the simulation (as the GUI shows it) into PIL images"""
+
+    def __init__(self, simulation, sprites: SpriteCache = None, scale: float = 1.0):
+        self.simulation = simulation
+        self.sprites = sprites if sprites is not None else SpriteCache()
+        self.scale = scale
+        height = scene.height(simulation)
+        self.size = (round(scene.WIDTH * scale), round(height * scale))
+        self._fonts = {size: load_font(round(size * scale)) for size in (scene.BADGE_FONT, scene.MARKER_FONT, scene.INSPECTION_TEXT_FONT)}
+        self._background = self.draw_background(height)
+
+    def sprite(self, name: str, box=None) -> Image.Image:
+        return self.sprites.image(name, self.scale, box)
+
+    def point(self, x: float, y: float, offset=(0, 0)) -> (int, int):
+        return round((x + offset[0]) * self.scale), round((y + offset[1]) * self.scale)
+
+    def draw_background(self, height: int) -> Image.Image:
+        background = Image.new('RGB', self.size)
+        tile = self.sprite('back', scene.YARD_TILE)
+        tile_width = scene.YARD_TILE[2] - scene.YARD_TILE[0]
+        tile_height = scene.YARD_TILE[3] - scene.YARD_TILE[1]
+        for y in range(0, height, tile_height):
+            for x in range(0, scene.WIDTH, tile_width):
+                background.paste(tile, self.point(x, y))
+        offices = self.sprite('back', scene.OFFICES)
+        background.paste(offices, self.point(scene.OFFICES[0], scene.OFFICES[1]))
+        return background
+
+    def paste(self, frame: Image.Image, name: str, position: (int, int)) -> None:
+        image = self.sprite(name)
+        frame.paste(image, position, image if image.mode == 'RGBA' else None)
+
+    def render(self) -> Image.Image:
+        """Frame of the current state of the simulation (the items are drawn in the order the GUI creates them)"""
+        simulation = self.simulation
+        frame = self._background.copy()
+        draw = ImageDraw.Draw(frame)
+        for agent in simulation.agents:
+            self.paste(frame, 'agent', self.point(agent.pos_x, agent.pos_y))
+        self.paste(frame, 'leadagent', self.point(simulation.lead_agent.pos_x, simulation.lead_agent.pos_y))
+        for agent in simulation.paagents:
+            self.paste(frame, 'authagent', self.point(agent.pos_x, agent.pos_y))
+
+        badge_font = self._fonts[scene.BADGE_FONT]
+        for slot in simulation.slots:
+            container = slot.container
+            if container is None:
+                continue
+            x, y = slot.position
+            self.paste(frame, scene.container_sprite(container), self.point(x, y))
+            text, color = scene.customs_badge(container)
+            draw.text(self.point(x, y, scene.CUSTOMS_BADGE), text, fill=color, font=badge_font)
+            text, color = scene.pa_badge(container)
+            draw.text(self.point(x, y, scene.PA_BADGE), text, fill=color, font=badge_font)
+            marker = scene.faked_marker(container)
+            if marker is not None:
+                draw.text(self.point(x, y, scene.FAKED_MARKER), marker, fill='orange', font=self._fonts[scene.MARKER_FONT])
+
+        for agent in simulation.lead_agent.agents_under_inspection():
+            draw.text(self.point(agent.pos_x, agent.pos_y, scene.INSPECTION_TEXT), 'UNDER INSPECTION', fill='red',
+                      font=self._fonts[scene.INSPECTION_TEXT_FONT])
+            self.paste(frame, 'magnify', self.point(agent.pos_x, agent.pos_y, scene.INSPECTION_SPRITE))
+        return frame
+
+
+def encode(output: str, size: (int, int), fps: int, buffer_name: str, ready, free) -> None:
+    """Encoder process: writes the frames from the buffers to PNG files in the output directory or by ffmpeg to a video"""
+    buffers = shared_memory.SharedMemory(buffer_name)
+    frame_size = size[0] * size[1] * 3
+    ffmpeg = None
+    if not os.path.isdir(output):
+        ffmpeg = subprocess.Popen(['ffmpeg', '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                                   '-s', f'{size[0]}x{size[1]}', '-r', str(fps), '-i', '-', '-pix_fmt', 'yuv420p', output],
+                                  stdin=subprocess.PIPE)
+    try:
+        while True:
+            message = ready.get()
+            if message is None:
+                break
+            index, tick = message
+            data = bytes(buffers.buf[index * frame_size:(index + 1) * frame_size])
+            free.put(index)
+            if ffmpeg is not None:
+                ffmpeg.stdin.write(data)
+            else:
+                Image.frombytes('RGB', size, data).save(os.path.join(output, f'frame{tick:08}.png'), compress_level=1)
+    finally:
+        if ffmpeg is not None:
+            ffmpeg.stdin.close()
+            ffmpeg.wait()
+        buffers.close()
+
+
+class Recorder:
+    """Renders every few steps of the simulation and sends the frames to the encoder (an observer of runner.run)
+
+    The output is a directory (PNG files named by the steps) or a video file encoded by ffmpeg.
+    """
+
+    def __init__(self, output: str, every: int = 10, fps: int = 30, buffers: int = 8, scale: float = 1.0):
+        if not os.path.splitext(output)[1]:
+            os.makedirs(output, exist_ok=True)
+        elif shutil.which('ffmpeg') is None:
+            raise RuntimeError(f'ffmpeg is needed for recording to {output}, record to a directory instead')
+        self.output = output
+        self.every = every
+        self.fps = fps
+        self.buffers = buffers
+        self.scale = scale
+        self.frames = 0
+        self.waited = 0.  # in seconds, spent waiting for a free buffer
+        self._renderer = None
+        self._memory = None
+        self._encoder = None
+
+    def start(self, simulation) -> None:
+        self._renderer = FrameRenderer(simulation, scale=self.scale)
+        width, height = self._renderer.size
+        self._frame_size = width * height * 3
+        self._memory = shared_memory.SharedMemory(create=True, size=self._frame_size * self.buffers)
+        context = multiprocessing.get_context('spawn')  # the encoder does not need a copy of the simulation
+        self._ready = context.Queue()
+        self._free = context.Queue()
+        for i in range(self.buffers):
+            self._free.put(i)
+        self._encoder = context.Process(target=encode, name='Encoder', daemon=True,
+                                        args=(self.output, self._renderer.size, self.fps, self._memory.name, self._ready, self._free))
+        self._encoder.start()
+
+    def tick(self, simulation, tick: int) -> None:
+        if tick % self.every:
+            return
+        if self._renderer is None:
+            self.start(simulation)
+        frame = self._renderer.render().tobytes()
+        start = time.perf_counter()
+        while True:
+            try:
+                index = self._free.get(timeout=1.)
+                break
+            except queue.Empty:
+                if not self._encoder.is_alive():
+                    raise RuntimeError(f'the encoder of {self.output} terminated (exit code {self._encoder.exitcode})') from None
+        self.waited += time.perf_counter() - start
+        self._memory.buf[index * self._frame_size:(index + 1) * self._frame_size] = frame
+        self._ready.put((index, tick))
+        self.frames += 1
+
+    def stop(self) -> None:
+        """Waits for the encoding of the remaining frames"""
+        if self._encoder is None:
+            return
+        if self._encoder.is_alive():
+            self._ready.put(None)
+        self._encoder.join()
+        self._encoder = None
+        self._memory.close()
+        self._memory.unlink()
+        logging.warning('Recorded %d frames to %s (waited %.1f s for the encoder)', self.frames, self.output, self.waited)
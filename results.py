@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of the results of simulation runs.
+
+A result is stored under the hash of all inputs of the run: the configuration, the number of steps, the seed,
+the contents of the data files and the source code of the simulation. A run with the same inputs is skipped and
+its result (the summary of the statistics and optionally the history) is read from the cache. The least recently
+used results are evicted when the cache grows over its size.
+"""
+import dataclasses
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from helpers import data_path
+import utils
+
+SOURCES = os.path.dirname(os.path.abspath(__file__))
+DATA_FILES = ('locations.txt', 'shipping.txt', 'amazondata_electronics.txt')
+OUTPUTS = ('metrics', 'history', 'record', 'memory', 'cache')  # sections of the configuration not affecting the statistics
+
+_digests = {}  # (path, size, modification time) -> digest
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the contents of the file (empty if it does not exist), computed once per version of the file"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ''
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def code_version() -> str:
+    """Digest of all Python sources of the simulation (uncommitted changes included)"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(SOURCES, '*.py'))):
+        digest.update(os.path.basename(path).encode())
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()
+
+
+def run_inputs(config: utils.Config, steps: int, seed: int) -> dict:
+    """Everything the result of a run depends on (JSON serializable)"""
+    previous = utils.CONFIG
+    utils.CONFIG = config  # the data files are found by the configuration of the run
+    try:
+        data = {name: file_digest(data_path(name)) for name in DATA_FILES}
+    finally:
+        utils.CONFIG = previous
+    for name in (config.simulation.manifests, config.analysis.decision_table):
+        if name:
+            data[name] = file_digest(name)
+    sections = {name: value for name, value in dataclasses.asdict(config).items() if name not in OUTPUTS}
+    return {'config': sections, 'steps': steps, 'seed': seed, 'data': data, 'code': code_version()}
+
+
+def run_key(config: utils.Config, steps: int, seed: int) -> str:
+    return hashlib.sha256(json.dumps(run_inputs(config, steps, seed), sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """Results stored as JSON files named by the keys of the runs in a directory"""
+
+    def __init__(self, directory: str, max_size: int = 512):
+        self.directory = directory
+        self.max_size = max_size * 1024 * 1024  # given in MB
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, key: str):
+        """Stored result of the run or None"""
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # the modification time orders the eviction
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            json.dump(result, f)
+        os.replace(f.name, path)  # readers never see a partially written result
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used results until the cache fits into its size"""
+        files = []
+        for path in glob.glob(os.path.join(self.directory, '*', '*.json')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        size = sum(file[1] for file in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            logging.info('Evicted %s from the result cache', os.path.basename(path))
+
+
+def create_cache(config: utils.ConfigCache):
+    """Result cache of the configuration or None if it is disabled"""
+    return ResultCache(config.directory, config.max_size) if config.directory else None
@@ -5,8 +5,8 @@ import logging
 
 
 def too_lazy_agent(agent: CustomsAgent, statistics: Statistics) -> bool:
-    virtually = statistics.agent_virtually_inspected(agent.identification)
-    physically = statistics.agent_physically_inspected(agent.identification)
+    virtually = statistics.agent_virtually_inspected(agent.ident)
+    physically = statistics.agent_physically_inspected(agent.ident)
     both = virtually + physically
     return virtually / both > 0.3 if both > 10 else False
 
@@ -46,7 +46,7 @@ class CustomsAgentTooLazyRule:
                     if not found:
                         r = CustomsAgentTooLazyRule(self.lead_agent, self.statistics, self.all_components)
                         r.agent = component
-                        logging.info(f'CustomsAgentTooLazyRule instantiated for {component.identification} -- it has ')
+                        logging.info('CustomsAgentTooLazyRule instantiated for %s', component)
                         self.instantiated_rules.append(r)
         # actuate instantiated rules
         for rule in self.instantiated_rules:
@@ -55,4 +55,27 @@ class CustomsAgentTooLazyRule:
         for rule in list(self.instantiated_rules):
             if not rule.__condition():
                 self.instantiated_rules.remove(rule)
-                logging.info(f'CustomsAgentTooLazyRule removed for {rule.__active_agent().identification}')
+                logging.info('CustomsAgentTooLazyRule removed for %s', rule.__active_agent())
+
+
+class CustomsAgentAnomalyRule:
+    """Inspection of customs agents reported by a detector (see detectors.py), evaluated only for the reported agents"""
+
+    def __init__(self, lead_agent: LeadCustomsAgent, agents: list[CustomsAgent]):
+        self.lead_agent = lead_agent
+        self.agents = {agent.ident: agent for agent in agents}
+        self.alarms = []  # ids of agents reported since the last evaluation
+
+    def alarm(self, agent: int) -> None:
+        self.alarms.append(agent)
+
+    def evaluate(self):
+        if not self.alarms:
+            return
+        inspected = self.lead_agent.agents_inspected()
+        for ident in self.alarms:
+            agent = self.agents.get(ident)
+            if agent is not None and agent not in inspected:
+                logging.info('CustomsAgentAnomalyRule actuated for %s', agent)
+                self.lead_agent.inspect_lazy_agent(agent)
+        self.alarms.clear()
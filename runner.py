@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Headless execution of the simulation (without the GUI)."""
+import argparse
+import json
+import logging
+import random
+import time
+
+from helpers import Statistics
+from outputs import Outputs
+from simulation import Simulation
+import analysis
+import utils
+
+
+def run(steps: int, seed=None, observers=()) -> (Statistics, float):
+    """Runs a single terminal in the current process, returns its statistics and the elapsed time
+
+    Observers are notified after each step by calling their tick(simulation, tick) method.
+    """
+    random.seed(seed)
+    statistics = Statistics()
+    simulation = Simulation(statistics)
+    start = time.perf_counter()
+    for tick in range(1, steps + 1):
+        simulation.step()
+        for observer in observers:
+            observer.tick(simulation, tick)
+    return statistics, time.perf_counter() - start
+
+
+SINGLE_TERMINAL = ('metrics_port', 'metrics_file', 'history_file', 'record', 'memory_every')  # options rejected for several terminals
+LIVE_OUTPUTS = ('metrics_port', 'metrics_file', 'record', 'memory_every')  # options disabling the cache
+
+
+def parse_args() -> argparse.Namespace:
+    """Parses the options (defaults are taken from the configuration) and sets the simulation options in the configuration"""
+    parser = argparse.ArgumentParser(description='Runs the simulation without the GUI.')
+    parser.add_argument('--steps', type=int, default=10000, help='number of simulation steps')
+    parser.add_argument('--terminals', type=int, default=utils.CONFIG.simulation.terminals, help='number of terminals (processes)')
+    parser.add_argument('--sync-interval', type=int, default=utils.CONFIG.simulation.sync_interval, help='steps between exchanges of error counters among terminals')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--manifests', default=utils.CONFIG.simulation.manifests, help='JSON-lines file with manifests of arriving containers')
+    parser.add_argument('--scheduler', default=utils.CONFIG.simulation.scheduler, help='policy assigning containers to agents (first-idle, fifo, nearest, matching)')
+    parser.add_argument('--stepping', default=utils.CONFIG.simulation.stepping, help='stepping of agents (sequential, two-phase)')
+    parser.add_argument('--plan-workers', type=int, default=utils.CONFIG.simulation.plan_workers, help='threads planning the steps of agents (two-phase stepping)')
+    parser.add_argument('--yard-capacity', type=int, default=utils.CONFIG.yard.capacity, help='containers waiting for an empty slot (0 = no yard)')
+    parser.add_argument('--yard-overflow', default=utils.CONFIG.yard.overflow, help='arrival when the yard is full (block, drop, divert)')
+    parser.add_argument('--metrics-port', type=int, default=utils.CONFIG.metrics.port, help='port of the metrics HTTP server on localhost (0 = disabled)')
+    parser.add_argument('--metrics-file', default=utils.CONFIG.metrics.file, help='file periodically rewritten with the metrics snapshot')
+    parser.add_argument('--history-file', default=utils.CONFIG.history.file, help='JSON file with the history of the metrics written at the end')
+    parser.add_argument('--record', default=utils.CONFIG.record.output, help='directory (PNG frames) or video file the run is recorded to')
+    parser.add_argument('--memory-every', type=int, default=utils.CONFIG.memory.every, help='steps between samples of the memory, each takes a few ms (0 = disabled); with memory->trace, tracemalloc slows down the whole run several times')
+    parser.add_argument('--cache', default=utils.CONFIG.cache.directory, help='directory of cached results of seeded runs (empty = no caching)')
+    parser.add_argument('--force', action='store_true', help='run even if the result is cached (and replace it)')
+    parser.add_argument('--record-every', type=int, default=utils.CONFIG.record.every, help='steps between the recorded frames')
+    args = parser.parse_args()
+    utils.CONFIG.simulation.scheduler = args.scheduler
+    utils.CONFIG.simulation.manifests = args.manifests
+    utils.CONFIG.yard.capacity = args.yard_capacity
+    utils.CONFIG.simulation.stepping = args.stepping
+    utils.CONFIG.simulation.plan_workers = args.plan_workers
+    utils.CONFIG.yard.overflow = args.yard_overflow
+    if args.terminals > 1:
+        single = ['--' + name.replace('_', '-') for name in SINGLE_TERMINAL if getattr(args, name)]
+        if single:
+            parser.error(f'{", ".join(single)} available for a single terminal only (see also the configuration)')
+        if args.cache:
+            logging.warning('Results of several terminals are not cached (the exchanges of counters make them nondeterministic)')
+    elif args.cache and args.seed is None:
+        logging.warning('Results of runs without --seed are not cached')
+    elif args.cache and any(getattr(args, name) for name in LIVE_OUTPUTS):
+        logging.warning('Results of runs with live metrics, recording or memory sampling are not cached')
+    return args
+
+
+def history_config() -> list:
+    """Configuration of the history stored with the cached result"""
+    return [utils.CONFIG.history.archives, utils.CONFIG.history.every]
+
+
+def result_cache(args: argparse.Namespace):
+    """Cache of the single terminal run and the key of its result, (None, None) if the run is not cached"""
+    if not args.cache or args.seed is None or any(getattr(args, name) for name in LIVE_OUTPUTS):
+        return None, None
+    import results  # only the statistics and the history are cached, not the live outputs
+    return results.ResultCache(args.cache, utils.CONFIG.cache.max_size), results.run_key(utils.CONFIG, args.steps, args.seed)
+
+
+def cached_result(cache, key: str, args: argparse.Namespace):
+    """The cached result usable for the run or None"""
+    if cache is None or args.force:
+        return None
+    result = cache.get(key)
+    if result is not None and args.history_file and result.get('history_config') != history_config():
+        return None  # cached without the history or with another one
+    return result
+
+
+def write_history(path: str, history: dict) -> None:
+    with open(path, 'w') as f:
+        json.dump(history, f)
+
+
+def run_single(args: argparse.Namespace) -> Statistics:
+    """Runs a single terminal with the outputs of the options, or takes its result from the cache"""
+    cache, key = result_cache(args)
+    result = cached_result(cache, key, args)
+    if result is not None:
+        if args.history_file:
+            write_history(args.history_file, result['history'])
+        print(f'Cached result {key[:12]} (computed at {result["steps_per_second"]:.0f} steps/s)')
+        return Statistics.from_summaries([result['summary']])
+    outputs = Outputs(args.memory_every, args.metrics_port, args.metrics_file, bool(args.history_file), args.record, args.record_every)
+    try:
+        statistics, elapsed = run(args.steps, args.seed, outputs.observers)
+    finally:
+        outputs.stop()
+    if outputs.history is not None:
+        write_history(args.history_file, outputs.history.to_dict())
+    if cache is not None:
+        result = {'summary': statistics.summary(), 'steps_per_second': args.steps / elapsed}
+        if outputs.history is not None:
+            result.update(history=outputs.history.to_dict(), history_config=history_config())
+        cache.put(key, result)
+    print(f'Total: {args.steps / elapsed:.0f} steps/s')
+    if analysis.COUNTERS:
+        print('Analysis calls: ' + ', '.join(f'{name} {n}' for name, n in sorted(analysis.COUNTERS.items())))
+    outputs.report()
+    return statistics
+
+
+def run_several(args: argparse.Namespace) -> Statistics:
+    """Runs the terminals in separate processes"""
+    from terminals import run_terminals  # multiprocessing is not needed for a single terminal
+    start = time.perf_counter()
+    statistics, results = run_terminals(args.terminals, args.steps, args.sync_interval, args.seed)
+    elapsed = time.perf_counter() - start
+    for i, result in enumerate(results):
+        print(f'Terminal{i + 1:02}: {result["steps"] / result["elapsed"]:.0f} steps/s')
+    print(f'Total: {args.terminals * args.steps / elapsed:.0f} steps/s')
+    return statistics
+
+
+def main():
+    utils.load_config()
+    args = parse_args()
+    statistics = run_several(args) if args.terminals > 1 else run_single(args)
+    statistics.print_statistics()
+
+
+if __name__ == '__main__':
+    main()
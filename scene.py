@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Scene of the terminal shared by the GUI (gui.py) and the offscreen renderer (recorder.py)."""
+from components import ContainerState
+from simulation import SLOT_DISTANCE
+
+WIDTH = 1200
+HEIGHT = 857
+OFFICES = (300, 0, 1200, 857)  # part of the background image with the offices
+YARD_TILE = (0, 0, 300, SLOT_DISTANCE)  # an empty part of the background image, the rest of the background is tiled by it
+SPRITES = ('back', 'agent', 'leadagent', 'authagent', 'magnify', 'container01', 'dcontainer01')
+
+# offsets of the items from the position of a container or an agent
+CUSTOMS_BADGE = (32, 0)
+PA_BADGE = (32, 15)
+FAKED_MARKER = (10, 30)
+INSPECTION_TEXT = (0, 60)
+INSPECTION_SPRITE = (10, 10)
+
+BADGE_FONT = 15
+MARKER_FONT = 20
+INSPECTION_TEXT_FONT = 15
+
+
+def height(simulation) -> int:
+    """Height of the scene (sized by the number of slots)"""
+    last_slot = simulation.slots[simulation.slots.number_of_slots() - 1]
+    return max(HEIGHT, last_slot.position[1] + SLOT_DISTANCE)
+
+
+def container_sprite(container) -> str:
+    return 'dcontainer01' if container.dangerous else 'container01'
+
+
+def customs_badge(container) -> (str, str):
+    """Text and color of the customs clearance of the container"""
+    if container.cleared_by_customs == ContainerState.CLEARED:
+        return 'CUST OK', 'green'
+    if container.cleared_by_customs == ContainerState.UNCLEARED:
+        return 'CUST  x', 'red'
+    return 'CUST  ?', 'black'
+
+
+def pa_badge(container) -> (str, str):
+    """Text and color of the clearance of the container by the PA officer"""
+    if container.cleared_by_pa == ContainerState.CLEARED:
+        return 'PA   OK', 'green'
+    if container.cleared_by_pa == ContainerState.UNCLEARED:
+        return 'PA    x', 'red'
+    return 'PA    ?', 'black'
+
+
+def faked_marker(container):
+    """Marker of a faked declaration of the container or None"""
+    if set(container.declaration.items) != set(container.items):
+        return 'FAKED'
+    if container.tax != container.declaration.declared_tax:
+        return 'FAKED TAX'
+    return None
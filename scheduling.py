@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Policies assigning containers waiting in slots to idle PA officers and customs agents."""
+import logging
+import math
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from components import AgentState, ContainerState
+from topology import travel_times
+
+
+class Scheduler(ABC):
+    """Called in each step of the simulation to assign the waiting containers"""
+    name = None
+
+    @abstractmethod
+    def assign(self, simulation) -> None:
+        pass
+
+
+def waiting_slots(simulation) -> (list, list):
+    """Unassigned slots waiting for a PA officer and for a customs agent, the longest waiting first"""
+    for_pa = []
+    for_customs = []
+    for slot in simulation.slots:
+        container = slot.container
+        if container is None or slot.agent is not None:
+            continue
+        if container.cleared_by_pa == ContainerState.DELIVERED:
+            for_pa.append(slot)
+        elif container.cleared_by_pa == ContainerState.CLEARED and container.cleared_by_customs == ContainerState.DELIVERED:
+            for_customs.append(slot)
+    for_pa.sort(key=lambda s: s.container.arrived)
+    for_customs.sort(key=lambda s: s.container.arrived)
+    return for_pa, for_customs
+
+
+def idle(agents: list) -> list:
+    return [agent for agent in agents if agent.state == AgentState.IDLE]
+
+
+def distance(a: (int, int), b: (int, int)) -> float:
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+class FirstIdleScheduler(Scheduler):
+    """Slots in their order are given to the first idle agent in the list; stops when no agent of the needed kind is idle"""
+    name = 'first-idle'
+
+    def assign(self, simulation) -> None:
+        while True:
+            slot = simulation.slots.slot_with_unassigned_container()
+            if slot:
+                if slot.container.cleared_by_pa == ContainerState.DELIVERED:  # container not yet cleared by PA
+                    agent = simulation.available_pa()
+                    if agent:
+                        simulation.assign_to_pa(slot, agent)
+                    else:
+                        logging.info('No PA agent available')
+                        break
+                elif slot.container.cleared_by_pa == ContainerState.CLEARED and slot.container.cleared_by_customs == ContainerState.DELIVERED:  # cleared by PA but not by customs
+                    agents = simulation.agents_for_checks()
+                    agent = agents[0] if agents else None
+                    if agent:
+                        simulation.assign_to_agent(slot, agent)
+                    else:
+                        logging.info('No customs agent available')
+                        break
+            else:
+                logging.info('No unassigned container')
+                break
+
+
+class FifoScheduler(Scheduler):
+    """The longest waiting containers are given to the first idle agents"""
+    name = 'fifo'
+
+    def assign(self, simulation) -> None:
+        for_pa, for_customs = waiting_slots(simulation)
+        for slot, officer in zip(for_pa, idle(simulation.paagents)):
+            simulation.assign_to_pa(slot, officer)
+        for slot, agent in zip(for_customs, simulation.agents_for_checks()):
+            simulation.assign_to_agent(slot, agent)
+
+
+class GridIndex:
+    """Items bucketed by their positions into square cells, for nearest-item queries"""
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._cells = defaultdict(dict)
+        self._count = 0
+        self._bounds = None  # (min x, min y, max x, max y) of the cells ever occupied since the index was empty
+
+    def _cell(self, position: (int, int)) -> (int, int):
+        return int(position[0] // self.cell_size), int(position[1] // self.cell_size)
+
+    def insert(self, item, position: (int, int)) -> None:
+        x, y = cell = self._cell(position)
+        self._cells[cell][item] = position
+        self._count += 1
+        if self._bounds is None:
+            self._bounds = (x, y, x, y)
+        else:
+            min_x, min_y, max_x, max_y = self._bounds
+            self._bounds = (min(min_x, x), min(min_y, y), max(max_x, x), max(max_y, y))
+
+    def remove(self, item, position: (int, int)) -> None:
+        cell = self._cell(position)
+        del self._cells[cell][item]
+        if not self._cells[cell]:
+            del self._cells[cell]
+        self._count -= 1
+        if not self._count:
+            self._bounds = None
+
+    def _ring(self, cx: int, cy: int, r: int):
+        """Cells at the Chebyshev distance r from the cell (cx, cy)"""
+        if r == 0:
+            yield cx, cy
+            return
+        for x in range(cx - r, cx + r + 1):
+            yield x, cy - r
+            yield x, cy + r
+        for y in range(cy - r + 1, cy + r):
+            yield cx - r, y
+            yield cx + r, y
+
+    def nearest(self, position: (int, int)):
+        """The nearest item or None if the index is empty"""
+        if not self._count:
+            return None
+        cx, cy = self._cell(position)
+        min_x, min_y, max_x, max_y = self._bounds
+        radius = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)  # no item is further
+        best = None
+        best_distance = math.inf
+        cells = self._cells
+        for r in range(radius + 1):
+            # items in the ring r are further than r - 1 cells
+            if best_distance <= (r - 1) * self.cell_size:
+                break
+            for cell in self._ring(cx, cy, r):
+                items = cells.get(cell)
+                if items is None:
+                    continue
+                for item, item_position in items.items():
+                    d = distance(position, item_position)
+                    if d < best_distance:
+                        best = item
+                        best_distance = d
+        return best
+
+
+class NearestIdleScheduler(Scheduler):
+    """The longest waiting containers are given to the nearest idle agents"""
+    name = 'nearest'
+    CELL_SIZE = 200
+
+    def _assign_nearest(self, slots: list, agents: list, assign) -> None:
+        index = GridIndex(NearestIdleScheduler.CELL_SIZE)
+        for agent in agents:
+            index.insert(agent, agent.position)
+        for slot in slots:
+            agent = index.nearest(slot.inspection_point)
+            if agent is None:
+                break
+            index.remove(agent, agent.position)
+            assign(slot, agent)
+
+    def assign(self, simulation) -> None:
+        for_pa, for_customs = waiting_slots(simulation)
+        if for_pa:
+            self._assign_nearest(for_pa, idle(simulation.paagents), simulation.assign_to_pa)
+        if for_customs:
+            self._assign_nearest(for_customs, simulation.agents_for_checks(), simulation.assign_to_agent)
+
+
+def min_cost_matching(cost: list[list[float]]) -> list[(int, int)]:
+    """Assignment of rows to columns with the minimal total cost (Hungarian method)
+
+    Returns (row, column) pairs, all rows are assigned if there are not more rows than columns, all columns otherwise.
+    """
+    n = len(cost)
+    if not n or not cost[0]:
+        return []
+    m = len(cost[0])
+    if n > m:
+        return [(i, j) for j, i in min_cost_matching([list(column) for column in zip(*cost)])]
+    u = [0.] * (n + 1)
+    v = [0.] * (m + 1)
+    p = [0] * (m + 1)  # row assigned to a column (1-based, 0 = none)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = math.inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    return [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+class MatchingScheduler(Scheduler):
+    """All waiting containers and idle agents are matched at once minimizing walking time (in steps, see topology.py), longer waiting is preferred"""
+    name = 'matching'
+    WAITING_WEIGHT = 1.  # how many steps of walking are worth one step of waiting
+
+    def __init__(self):
+        self._travel_times = None  # of the simulation, created by the first assignment
+
+    def _match(self, slots: list, agents: list, simulation, assign) -> None:
+        if self._travel_times is None:
+            self._travel_times = travel_times(simulation.points_of_interest())
+        cost = [[self._travel_times.ticks(agent.position, slot.inspection_point, agent.SPEED) - MatchingScheduler.WAITING_WEIGHT * (simulation.tick - slot.container.arrived)
+                 for agent in agents] for slot in slots]
+        for i, j in min_cost_matching(cost):
+            assign(slots[i], agents[j])
+
+    def assign(self, simulation) -> None:
+        for_pa, for_customs = waiting_slots(simulation)
+        if for_pa:
+            officers = idle(simulation.paagents)
+            if officers:
+                self._match(for_pa, officers, simulation, simulation.assign_to_pa)
+        if for_customs:
+            agents = simulation.agents_for_checks()
+            if agents:
+                self._match(for_customs, agents, simulation, simulation.assign_to_agent)
+
+
+SCHEDULERS = {scheduler.name: scheduler for scheduler in (FirstIdleScheduler, FifoScheduler, NearestIdleScheduler, MatchingScheduler)}
+
+
+def create_scheduler(name: str) -> Scheduler:
+    try:
+        return SCHEDULERS[name]()
+    except KeyError:
+        raise ValueError(f'unknown scheduler {name}, use one of {", ".join(SCHEDULERS.keys())}') from None
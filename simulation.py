@@ -1,27 +1,25 @@
 #!/usr/bin/env python3
+import random
 import utils
-from components import Container, CustomsAgent, AgentState, ContainerState, LeadCustomsAgent, PortAuthorityOfficer
-from rules import CustomsAgentTooLazyRule
+import analysis
+from components import Container, ContainerPool, ContainerRecord, CustomsAgent, AgentState, ContainerState, Decisions, LeadCustomsAgent, PortAuthorityOfficer, analysis_queries
+from rules import CustomsAgentAnomalyRule, CustomsAgentTooLazyRule
 from special import LazyCustomsAgent
-from helpers import generate_container, Statistics
-from utils import setup_logging
+from helpers import Statistics
+from arrivals import ArrivalSource, create_arrivals
+from scheduling import Scheduler, create_scheduler
+from admission import AdmissionControl, PA_CHECK, CUSTOMS_CHECK, PA_ASSISTANCE
+from detectors import THRESHOLD, create_detector
 
-from tkinter import *
-from PIL import Image, ImageTk
 import logging
+from collections import deque
 
 
-CONTAINER_SLOTS_POSITIONS = [
-    (50, 10),
-    (50, 100),
-    (50, 190),
-    (50, 280),
-    (50, 370),
-    (50, 460),
-    (50, 550)
-]
+SLOT_DISTANCE = 90  # slots are placed in a column
 
-STATISTICS = Statistics()
+
+def container_slot_position(i: int) -> (int, int):
+    return 50, 10 + SLOT_DISTANCE * i
 
 
 class ContainerSlot:
@@ -60,11 +58,10 @@ class ContainerSlot:
 
 
 class Slots:
-    def __init__(self):
+    def __init__(self, number: int = 7):
         self.slots = []
-        self.removed_containers = []
-        for i in range(len(CONTAINER_SLOTS_POSITIONS)):
-            self.slots.append(ContainerSlot(CONTAINER_SLOTS_POSITIONS[i]))
+        for i in range(number):
+            self.slots.append(ContainerSlot(container_slot_position(i)))
 
     def slot(self, i):
         return self.slots[i]
@@ -90,19 +87,89 @@ class Slots:
                 return slot
         return None
 
-    def remove_container(self, container):
+    def remove_container(self, container, tick: int = None) -> ContainerRecord:
+        container.removed = tick
+        record = container.record()
         for slot in self.slots:
             if container is slot.container:
                 slot.remove_container()
-                self.removed_containers.append(container)
                 break
+        return record
+
+
+# overflow policies of the yard
+BLOCK = 'blocked'
+DROP = 'dropped'
+DIVERT = 'diverted'
+OVERFLOWS = {'block': BLOCK, 'drop': DROP, 'divert': DIVERT}
+
+YARD = 'yard'  # key of the yard waits in the queue-wait statistics
+
+# stepping of agents
+SEQUENTIAL = 'sequential'
+TWO_PHASE = 'two-phase'
+
+
+def step_agent(agent):
+    agent.random.start_plan()
+    with analysis.random_source(agent.random):
+        agent.step()
+
+
+def plan_step(agent, repeat: bool = False):
+    """Plan of the agent, a repeated plan draws the same random decisions as the previous one"""
+    if repeat:
+        agent.random.repeat_plan()
+    else:
+        agent.random.start_plan()
+    with analysis.random_source(agent.random):
+        return agent.plan()
+
+
+class Yard:
+    """Arrived containers waiting in their order for an empty slot
+
+    When the yard is full, an arrival is blocked (waits outside the terminal and delays the following ones),
+    dropped or diverted to another terminal.
+    """
+
+    def __init__(self, capacity: int = 0, overflow: str = 'block'):
+        if overflow not in OVERFLOWS:
+            raise ValueError(f'unknown overflow policy {overflow}, use one of {", ".join(OVERFLOWS.keys())}')
+        self.capacity = capacity
+        self.overflow = OVERFLOWS[overflow]
+        self.containers = deque()
+        self.blocked = False  # the ready arrival was refused and waits outside the terminal
+
+    def __len__(self):
+        return len(self.containers)
+
+    def __iter__(self):
+        return iter(self.containers)
+
+    def full(self) -> bool:
+        return len(self.containers) >= self.capacity
+
+    def put(self, container: Container):
+        self.containers.append(container)
+
+    def get(self) -> Container:
+        return self.containers.popleft()
 
 
 class Simulation:
     SMALLEST_PERIOD_FOR_CONTAINER = 10
 
-    def __init__(self):
-        self.slots = Slots()
+    def __init__(self, statistics: Statistics = None, scheduler: Scheduler = None, arrivals: ArrivalSource = None):
+        if statistics is None:
+            statistics = Statistics()
+        self.statistics = statistics
+        self.scheduler = scheduler if scheduler is not None else create_scheduler(utils.CONFIG.simulation.scheduler)
+        self.admission = AdmissionControl.from_config(utils.CONFIG.admission)
+        self._pa_requests = {}  # PA officer waiting for a customs agent -> step of the first attempt to pair it
+        self.tick = 0
+        self.slots = Slots(utils.CONFIG.simulation.slots)
+        self.yard = Yard(utils.CONFIG.yard.capacity, utils.CONFIG.yard.overflow)
         agent_classes = []
         num_of_lazy = utils.CONFIG.simulation.lazy_agents
         for i in range(3):
@@ -112,20 +179,45 @@ class Simulation:
             else:
                 agent_classes.append(CustomsAgent)
         self.agents = [
-             agent_classes[0]('Agent01', (700, 100), STATISTICS),
-             agent_classes[1]('Agent02', (700, 270), STATISTICS),
-             agent_classes[2]('Agent03', (700, 440), STATISTICS)
+             agent_classes[0]('Agent01', (700, 100), statistics),
+             agent_classes[1]('Agent02', (700, 270), statistics),
+             agent_classes[2]('Agent03', (700, 440), statistics)
         ]
-        self.lead_agent = LeadCustomsAgent('LeadAgent01', (975, 270), STATISTICS)
+        self.lead_agent = LeadCustomsAgent('LeadAgent01', (975, 270), statistics)
         self.cust_computer_for_pa = (975, 440)
         self.paagents = [
-            PortAuthorityOfficer('PortAuthorityAgent01', (340, 735), self.cust_computer_for_pa, STATISTICS),
-            PortAuthorityOfficer('PortAuthorityAgent02', (580, 735), self.cust_computer_for_pa, STATISTICS),
-            PortAuthorityOfficer('PortAuthorityAgent03', (820, 735), self.cust_computer_for_pa, STATISTICS)
+            PortAuthorityOfficer('PortAuthorityAgent01', (340, 735), self.cust_computer_for_pa, statistics),
+            PortAuthorityOfficer('PortAuthorityAgent02', (580, 735), self.cust_computer_for_pa, statistics),
+            PortAuthorityOfficer('PortAuthorityAgent03', (820, 735), self.cust_computer_for_pa, statistics)
         ]
-        self.containers = []
-        self.steps_from_last_container = Simulation.SMALLEST_PERIOD_FOR_CONTAINER
-        self.rules = [CustomsAgentTooLazyRule(self.lead_agent, STATISTICS, self.agents)]
+        # each agent has its own random decisions, so the plans do not depend on the order of planning
+        for agent in self.paagents + self.agents:
+            agent.random = Decisions(random.getrandbits(64))
+        self.stepping = utils.CONFIG.simulation.stepping
+        self._planner = None
+        self.replanned = 0  # plans of the two-phase stepping repeated after the commits of other agents
+        if self.stepping == TWO_PHASE:
+            if utils.CONFIG.simulation.plan_workers > 1:
+                from concurrent.futures import ThreadPoolExecutor
+                self._planner = ThreadPoolExecutor(utils.CONFIG.simulation.plan_workers, thread_name_prefix='Planner')
+        elif self.stepping != SEQUENTIAL:
+            raise ValueError(f'unknown stepping {self.stepping}, use {SEQUENTIAL} or {TWO_PHASE}')
+        self.pool = ContainerPool(utils.CONFIG.simulation.container_pool)
+        self.removal_sinks = []  # called with the record of each removed container
+        if arrivals is None:
+            arrivals = create_arrivals(utils.CONFIG.simulation.manifests, Simulation.SMALLEST_PERIOD_FOR_CONTAINER, utils.CONFIG.simulation.read_ahead, self.pool)
+        self.arrivals = arrivals
+        if utils.CONFIG.detector.method == THRESHOLD:
+            self.rules = [CustomsAgentTooLazyRule(self.lead_agent, statistics, self.agents)]
+        else:
+            rule = CustomsAgentAnomalyRule(self.lead_agent, self.agents)
+            statistics.inspection_listeners.append(create_detector(utils.CONFIG.detector, rule.alarm).observe)
+            self.rules = [rule]
+
+    def points_of_interest(self) -> tuple:
+        """Fixed points of the terminal the agents move between"""
+        homes = [agent.home_position for agent in self.agents + self.paagents]
+        return tuple(homes + [self.cust_computer_for_pa] + [slot.inspection_point for slot in self.slots])
 
     def available_agent(self):
         for agent in self.agents:
@@ -139,206 +231,146 @@ class Simulation:
                 return agent
         return None
 
+    def agents_for_checks(self) -> list:
+        """Idle customs agents which may be assigned a customs check (see AdmissionControl)"""
+        return self.admission.agents_for_checks(self.agents)
+
+    def assign_to_pa(self, slot: ContainerSlot, officer: PortAuthorityOfficer):
+        self.statistics.report_queue_wait(PA_CHECK, self.tick - slot.container.waiting_since)
+        slot.container.pa_assigned = self.tick
+        officer.assign_container(slot.container, slot.inspection_point)
+        logging.info('Assigning %s to %s', officer, slot.container)
+        slot.agent = officer
+
+    def assign_to_agent(self, slot: ContainerSlot, agent: CustomsAgent):
+        self.statistics.report_queue_wait(CUSTOMS_CHECK, self.tick - slot.container.waiting_since)
+        slot.container.customs_assigned = self.tick
+        slot.agent = agent
+        agent.assign_container(slot.container)
+        agent.set_container_position(slot.inspection_point)
+        logging.info('Assigning %s to %s', agent, slot.container)
+
+    def pair_pa_officers(self):
+        """Assigns customs agents to PA officers asking for assistance with a physical inspection"""
+        agents = self.admission.agents_for_assistance(self.agents, self.paagents)
+        for officer in self.paagents:
+            if officer.state == AgentState.PA_REQUEST_A:
+                requested = self._pa_requests.setdefault(officer.ident, self.tick)
+                if agents:
+                    cust_agent = agents.pop(0)
+                    logging.info('assigning %s to %s', cust_agent, officer)
+                    if self.admission.meet_at_container:
+                        officer.meet_agent_at_container(cust_agent)
+                    else:
+                        officer.assigned_agent = cust_agent
+                    self.statistics.report_pa_paired_with_agent(officer.ident, cust_agent.ident)
+                    self.statistics.report_queue_wait(PA_ASSISTANCE, self.tick - requested)
+                    del self._pa_requests[officer.ident]
+                else:
+                    logging.info('%s waits for the customs agent but no one is available', officer)
+
+    def place_container(self, slot: ContainerSlot, container: Container):
+        container.waiting_since = self.tick
+        slot.container = container
+        if analysis.prefetching():
+            container.prefetched = analysis.prefetch(analysis_queries(container, self.statistics))
+
+    def step_agents_in_two_phases(self):
+        """All agents plan their steps from the same state (possibly in parallel), then the plans are applied in order
+
+        A plan depending on an object changed by a commit before it is made again from the changed state (with the same
+        random decisions), so the results are the same as of the sequential stepping.
+        """
+        agents = self.paagents + self.agents
+        if self._planner is not None:
+            intents = list(self._planner.map(plan_step, agents))
+        else:
+            intents = [plan_step(agent) for agent in agents]
+        changed = set()  # ids of the objects changed by the commits of this step
+        for agent, intent in zip(agents, intents):
+            if changed and (id(agent) in changed or any(id(read) in changed for read in intent.reads)):
+                intent = plan_step(agent, repeat=True)
+                self.replanned += 1
+            agent.commit(intent)
+            changed.update(map(id, intent.changes(agent, self.statistics)))
+
     def step(self):
+        self.tick += 1
+        self.statistics.tick = self.tick
         for rule in self.rules:
             rule.evaluate()
 
-        if self.steps_from_last_container != Simulation.SMALLEST_PERIOD_FOR_CONTAINER:
-            self.steps_from_last_container += 1
-        else:  # generate new container
+        while self.yard:
             slot = self.slots.get_empty()
-            if slot is not None:
-                container = generate_container()
-                logging.info("%s arrived", container.identification)
-                slot.container = container
-                self.steps_from_last_container = 0
-            else:
+            if slot is None:
+                break
+            container = self.yard.get()
+            self.statistics.report_queue_wait(YARD, self.tick - container.arrived)
+            self.place_container(slot, container)
+
+        while self.arrivals.ready(self.tick):
+            slot = self.slots.get_empty() if not self.yard else None
+            if slot is None and self.yard.full():
                 logging.info('No empty slot')
+                if self.yard.overflow == BLOCK:
+                    if not self.yard.blocked:  # counted once, the following steps are the wait of the arrival
+                        self.yard.blocked = True
+                        self.statistics.report_yard_overflow(BLOCK)
+                    self.statistics.report_yard_blocked_step()
+                    break
+                self.statistics.report_yard_overflow(self.yard.overflow)
+                logging.info('%s %s', self.arrivals.take(self.tick), self.yard.overflow)
+                continue
+            self.yard.blocked = False
+            container = self.arrivals.take(self.tick)
+            logging.info("%s arrived", container)
+            container.arrived = self.tick
+            if slot is None:
+                self.yard.put(container)
+            else:
+                self.place_container(slot, container)
+        self.statistics.report_yard_length(len(self.yard))
 
         for slot in self.slots:
             if slot.container is not None and slot.container.state != ContainerState.DELIVERED:
-                self.slots.remove_container(slot.container)
+                container = slot.container
+                record = self.slots.remove_container(container, self.tick)
+                analysis.release(container.prefetched)
+                self.statistics.report_container_removed(record)
+                for sink in self.removal_sinks:
+                    sink(record)
+                self.pool.release(container)
             elif slot.container is not None and slot.container.cleared_by_pa != ContainerState.DELIVERED and slot.container.cleared_by_customs != ContainerState.DELIVERED:
                 slot.container.state = slot.container.cleared_by_pa
             elif slot.container is not None and slot.container.cleared_by_pa == ContainerState.CLEARED and slot.container.cleared_by_customs == ContainerState.DELIVERED and isinstance(slot.agent, PortAuthorityOfficer):
                 slot.agent = None
+                slot.container.waiting_since = self.tick
 
-        while True:
-            slot = self.slots.slot_with_unassigned_container()
-            if slot:
-                if slot.container.cleared_by_pa == ContainerState.DELIVERED:  # container not yet cleared by PA
-                    agent = self.available_pa()
-                    if agent:
-                        #ipoint = slot.inspection_point
-                        #ipoint = (ipoint[0] + 30, ipoint[1])
-                        agent.assign_container(slot.container, slot.inspection_point)
-                        logging.info('Assigning %s to %s', agent.identification, slot.container.identification)
-                        slot.agent = agent
-                    else:
-                        logging.info('No PA agent available')
-                        break
-                elif slot.container.cleared_by_pa == ContainerState.CLEARED and slot.container.cleared_by_customs ==ContainerState.DELIVERED:  # cleared by PA but not by customs
-                    agent = self.available_agent()
-                    if agent:
-                        slot.agent = agent
-                        agent.assign_container(slot.container)
-                        agent.set_container_position(slot.inspection_point)
-                        logging.info('Assigning %s to %s', agent.identification, slot.container.identification)
-                    else:
-                        logging.info('No customs agent available')
-                        break
-            else:
-                logging.info('No unassigned container')
-                break
-
-        for agent in self.paagents:
-            if agent.state == AgentState.PA_REQUEST_A:
-                cust_agent = self.available_agent()
-                if cust_agent:
-                    logging.info('assigning %s to %s', cust_agent.identification, agent.identification)
-                    agent.assigned_agent = cust_agent
-                    STATISTICS.report_pa_paired_with_agent(agent.identification, cust_agent.identification)
-                else:
-                    logging.info('%s waits for the customs agent but no one is available', agent.identification)
+        if self.admission.priority == PA_ASSISTANCE:
+            self.pair_pa_officers()
+            self.scheduler.assign(self)
+        else:
+            self.scheduler.assign(self)
+            self.pair_pa_officers()
 
-        for agent in self.paagents:
-            agent.step()
+        if self.stepping == TWO_PHASE:
+            self.step_agents_in_two_phases()
+        else:
+            for agent in self.paagents:
+                step_agent(agent)
 
-        for agent in self.agents:
-            agent.step()
+            for agent in self.agents:
+                step_agent(agent)
 
         self.lead_agent.step()
 
 
-root = Tk()
-root.title('FluidTrust demo')
-root.tk.call('wm', 'iconphoto', root._w, PhotoImage(file='images/icon.png'))
-
-
-def terminate_app():
-    logging.info('Terminating')
-    print(STATISTICS.print_statistics())
-    root.destroy()
-
-
-class App(Canvas):
-
-    STEP = 100
-    WIDTH = 1200
-    HEIGHT = 857
-
-    def __init__(self, parent):
-        super().__init__(parent, width=App.WIDTH, height=App.HEIGHT)
-        self.pack()
-        bgim = Image.open('images/back.png')
-        self.agent_im = Image.open('images/back.png')
-        self.bgimtk = ImageTk.PhotoImage(bgim)
-        self.create_image(0, 0, image=self.bgimtk, anchor=NW, tags="bg")
-
-        self.simulation = Simulation()
-        agentim = Image.open('images/agent.png')
-        leadagentim = Image.open('images/leadagent.png')
-        authagentim = Image.open('images/authagent.png')
-        inspim = Image.open('images/magnify.png')
-        self.agentimtk = ImageTk.PhotoImage(agentim)
-        self.leadagentimtk = ImageTk.PhotoImage(leadagentim)
-        self.authagentimtk = ImageTk.PhotoImage(authagentim)
-        self.inspimtk = ImageTk.PhotoImage(inspim)
-        for agent in self.simulation.agents:
-            self.create_image(agent.pos_x, agent.pos_y, image=self.agentimtk, anchor=NW, tags=agent.identification)
-        self.create_image(self.simulation.lead_agent.pos_x, self.simulation.lead_agent.pos_y, image=self.leadagentimtk, anchor=NW, tags=self.simulation.lead_agent.identification)
-        for agent in self.simulation.paagents:
-            self.create_image(agent.pos_x, agent.pos_y, image=self.authagentimtk, anchor=NW, tags=agent.identification)
-        contim = Image.open('images/container01.png')
-        self.contimtk = ImageTk.PhotoImage(contim)
-        dcontim = Image.open('images/dcontainer01.png')
-        self.dcontimtk = ImageTk.PhotoImage(dcontim)
-        self.after(App.STEP, self.on_timer)
-        self._terminate = False
-        self.bind("<F10>", self.terminate_simulation)
-        self.focus_set()
-
-    def update_containers(self):
-        for slot in self.simulation.slots:
-            container = slot.container
-            if container is not None:
-                if not self.find_withtag(container.identification):
-                    if container.dangerous:
-                        self.create_image(slot.position[0], slot.position[1], image=self.dcontimtk, anchor=NW, tags=container.identification)
-                    else:
-                        self.create_image(slot.position[0], slot.position[1], image=self.contimtk, anchor=NW, tags=container.identification)
-                    self.create_text(slot.position[0] + 32, slot.position[1], anchor=NW, text='CUST  ?', tags=container.identification+'_C', font=('Monospace 15 bold'))
-                    self.create_text(slot.position[0] + 32, slot.position[1] + 15, anchor=NW, text='PA    ?', tags=container.identification + '_PA', font=('Monospace 15 bold'))
-                    if set(container.declaration.items) != set(container.items):  # faked declaration
-                        self.create_text(slot.position[0] + 10, slot.position[1] + 30, anchor=NW, text='FAKED', tags=container.identification + '_FAKED', font=('Monospace 20 bold'), fill='orange')
-                    elif container.tax != container.declaration.declared_tax:
-                        self.create_text(slot.position[0] + 10, slot.position[1] + 30, anchor=NW, text='FAKED TAX', tags=container.identification + '_FAKED', font=('Monospace 20 bold'), fill='orange')
-                else:
-                    pa_text = self.find_withtag(container.identification + '_PA')
-                    if slot.container.cleared_by_pa == ContainerState.CLEARED:
-                        self.itemconfigure(pa_text[0], text='PA   OK', fill='green')
-                    elif slot.container.cleared_by_pa == ContainerState.UNCLEARED:
-                        self.itemconfigure(pa_text[0], text='PA    x', fill='red')
-                    cust_text = self.find_withtag(container.identification + '_C')
-                    if slot.container.cleared_by_customs == ContainerState.CLEARED:
-                        self.itemconfigure(cust_text[0], text='CUST OK', fill='green')
-                    elif slot.container.cleared_by_customs == ContainerState.UNCLEARED:
-                        self.itemconfigure(cust_text[0], text='CUST  x', fill='red')
-
-        for container in self.simulation.slots.removed_containers:
-            self.delete(container.identification)
-            self.delete(container.identification + '_PA')
-            self.delete(container.identification + '_C')
-            self.delete(container.identification + '_FAKED')
-        self.simulation.slots.removed_containers.clear()
-
-    def update_agents(self):
-        under_inspection = self.simulation.lead_agent.agents_under_inspection()
-        for agent in self.simulation.agents:
-            agent_im = self.find_withtag(agent.identification)
-            self.coords(agent_im[0], agent.pos_x, agent.pos_y)
-            if agent in under_inspection:
-                text = self.find_withtag(agent.identification + '_INSP_TEXT')
-                im = self.find_withtag(agent.identification + '_INSP_IM')
-                if not text:
-                    self.create_text(agent.pos_x, agent.pos_y + 60, anchor=NW, text='UNDER INSPECTION', tags=agent.identification + '_INSP_TEXT', font=('Monospace 15 bold'), fill='red')
-                    self.create_image(agent.pos_x + 10, agent.pos_y + 10, image=self.inspimtk, anchor=NW, tags=agent.identification + '_INSP_IM')
-                else:
-                    self.coords(text[0], agent.pos_x, agent.pos_y + 60)
-                    self.coords(im[0], agent.pos_x + 10, agent.pos_y + 10)
-            else:
-                text = self.find_withtag(agent.identification + '_INSP_TEXT')
-                im = self.find_withtag(agent.identification + '_INSP_IM')
-                if text:
-                    self.delete(text[0])
-                    self.delete(im[0])
-
-    def update_paagents(self):
-        for agent in self.simulation.paagents:
-            agent_im = self.find_withtag(agent.identification)
-            self.coords(agent_im[0], agent.pos_x, agent.pos_y)
-
-    def on_timer(self):
-        if not self._terminate:
-            logging.info('Tick')
-            self.simulation.step()
-            self.update_agents()
-            self.update_paagents()
-            self.update_containers()
-            self.after(App.STEP, self.on_timer)
-        else:
-            terminate_app()
-
-    def terminate_simulation(self, event):
-        self.create_text(App.WIDTH//2, App.HEIGHT//2, anchor=CENTER, text='Terminating....')
-        self._terminate = True
-
-
+def main():
+    utils.setup_logging()
+    utils.load_config()
+    import gui  # Tk and PIL are needed by the GUI only
+    gui.main()
 
-#  MAIN
-setup_logging()
 
-app = App(root)
-root.resizable(width=False, height=False)
-root.protocol("WM_DELETE_WINDOW", terminate_app)
-root.mainloop()
+if __name__ == '__main__':
+    main()
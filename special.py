@@ -4,6 +4,8 @@ from components import CustomsAgent
 
 
 class LazyCustomsAgent(CustomsAgent):
+    __slots__ = ('punished',)
+
     def __init__(self,  identification: str, home_position: (int, int), statistics):
         super().__init__(identification, home_position, statistics)
         self.punished = False
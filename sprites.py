@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Images of the GUI decoded once and shared by all canvas items (and by other renderers)."""
+from PIL import Image
+
+
+class SpriteCache:
+    """Images from the images directory keyed by their names (file name without .png)
+
+    Images are decoded on the first use (or by preload), scaled variants and crops are produced on demand
+    and memoized, so all canvas items showing the same sprite share a single image.
+    """
+
+    def __init__(self, directory: str = 'images'):
+        self._directory = directory
+        self._images = {}
+        self._photos = {}
+
+    def preload(self, names) -> None:
+        for name in names:
+            self.image(name)
+
+    def image(self, name: str, scale: float = 1.0, box: (int, int, int, int) = None) -> Image.Image:
+        """PIL image of the sprite, optionally cropped to the box (left, upper, right, lower) and scaled"""
+        key = (name, scale, box)
+        image = self._images.get(key)
+        if image is None:
+            if box is not None:
+                image = self.image(name).crop(box)
+                if scale != 1.0:
+                    image = image.resize((round(image.width * scale), round(image.height * scale)))
+            elif scale != 1.0:
+                original = self.image(name)
+                image = original.resize((round(original.width * scale), round(original.height * scale)))
+            else:
+                image = Image.open(f'{self._directory}/{name}.png')
+                image.load()
+            self._images[key] = image
+        return image
+
+    def photo(self, name: str, scale: float = 1.0, box: (int, int, int, int) = None):
+        """Tk image of the sprite (see image), requires an existing Tk root"""
+        key = (name, scale, box)
+        photo = self._photos.get(key)
+        if photo is None:
+            from PIL import ImageTk
+            photo = ImageTk.PhotoImage(self.image(name, scale, box))
+            self._photos[key] = photo
+        return photo
+
+    def __len__(self) -> int:
+        return len(self._images)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Parameter sweeps: headless runs of all combinations of configuration values and seeds.
+
+Each run is executed in its own process and its result is stored in the result cache (see results.py), so
+repeating a sweep with an extended or changed axis computes only the new points.
+
+Usage: python sweep.py --axis simulation.lazy-agents=0,1,2 --axis detector.method=threshold,sprt --seeds 10 --output sweep.jsonl,
+see python sweep.py --help
+"""
+import argparse
+import copy
+import itertools
+import json
+import logging
+import time
+from multiprocessing import Pool
+
+import yaml
+
+from outputs import Outputs
+import results
+import runner
+import utils
+
+
+def parse_axis(text: str) -> (str, str, list):
+    """Section, field and values of an axis given as section.field=value,value,..."""
+    name, _, values = text.partition('=')
+    section, _, key = name.partition('.')
+    key = key.replace('-', '_')
+    if not values or not hasattr(utils.CONFIG, section) or not hasattr(getattr(utils.CONFIG, section), key):
+        raise argparse.ArgumentTypeError(f'{text} is not section.field=value,value,... of the configuration')
+    return section, key, [yaml.safe_load(value) for value in values.split(',')]
+
+
+def point_config(axes: list, values: tuple) -> utils.Config:
+    config = copy.deepcopy(utils.CONFIG)
+    for (section, key, _), value in zip(axes, values):
+        setattr(getattr(config, section), key, value)
+    return config
+
+
+def run_point(config: utils.Config, steps: int, seed: int, traces: bool) -> dict:
+    """Body of a process running a single point of the sweep, returns its result"""
+    utils.CONFIG = config
+    outputs = Outputs(history_enabled=traces)
+    statistics, elapsed = runner.run(steps, seed, outputs.observers)
+    result = {'summary': statistics.summary(), 'steps_per_second': steps / elapsed}
+    if traces:
+        result.update(history=outputs.history.to_dict(), history_config=runner.history_config())
+    return result
+
+
+def run_point_args(task: tuple) -> dict:
+    return run_point(*task)
+
+
+def main():
+    utils.load_config()
+    parser = argparse.ArgumentParser(description='Runs the simulation for all combinations of the values of the axes and the seeds.')
+    parser.add_argument('--axis', type=parse_axis, action='append', default=[], help='section.field=value,value,... of the configuration (repeatable)')
+    parser.add_argument('--steps', type=int, default=10000, help='number of simulation steps of each run')
+    parser.add_argument('--seeds', type=int, default=1, help='number of seeds of each combination')
+    parser.add_argument('--first-seed', type=int, default=1, help='the first of the seeds')
+    parser.add_argument('--processes', type=int, default=None, help='runs executed at once (default = number of CPUs)')
+    parser.add_argument('--cache', default=utils.CONFIG.cache.directory, help='directory of cached results (empty = no caching)')
+    parser.add_argument('--force', action='store_true', help='run all points even if their results are cached (and replace them)')
+    parser.add_argument('--traces', action='store_true', default=utils.CONFIG.cache.traces, help='store the history of the metrics with the results')
+    parser.add_argument('--output', default='sweep.jsonl', help='JSON-lines file with the results of the points')
+    args = parser.parse_args()
+
+    cache = results.ResultCache(args.cache, utils.CONFIG.cache.max_size) if args.cache else None
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    points = []  # (values, seed, config, key, result)
+    for values in itertools.product(*(axis[2] for axis in args.axis)):
+        config = point_config(args.axis, values)
+        for seed in seeds:
+            key = results.run_key(config, args.steps, seed)
+            result = None if cache is None or args.force else cache.get(key)
+            if result is not None and args.traces and result.get('history_config') != [config.history.archives, config.history.every]:
+                result = None
+            points.append((values, seed, config, key, result))
+    pending = [point for point in points if point[4] is None]
+    logging.warning('Sweep of %d points, %d cached, %d to run', len(points), len(points) - len(pending), len(pending))
+
+    start = time.perf_counter()
+    computed = {}
+    with Pool(args.processes, maxtasksperchild=1) as pool:  # a new process for each run, as a headless run
+        tasks = ((config, args.steps, seed, args.traces) for _, seed, config, _, _ in pending)
+        for (_, _, _, key, _), result in zip(pending, pool.imap(run_point_args, tasks)):
+            computed[key] = result
+            if cache is not None:
+                cache.put(key, result)
+    elapsed = time.perf_counter() - start
+
+    names = [f'{section}.{key}' for section, key, _ in args.axis]
+    with open(args.output, 'w') as f:
+        for values, seed, _, key, result in points:
+            record = {'values': dict(zip(names, values)), 'seed': seed, 'key': key, 'cached': result is not None}
+            record.update(result if result is not None else computed[key])
+            f.write(json.dumps(record) + '\n')
+    print(f'{len(points)} points written to {args.output}: {len(pending)} run in {elapsed:.1f} s, {len(points) - len(pending)} cached')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Interning of names (countries, companies, agents) to small integer ids.
+
+The simulation works with the ids only; names are materialized for logging, the GUI and reports.
+"""
+
+
+class SymbolTable:
+    def __init__(self, names=()):
+        self._ids = {}
+        self._names = []
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name: str) -> int:
+        """Returns id of the name, a new id is assigned to an unknown name"""
+        symbol = self._ids.get(name)
+        if symbol is None:
+            symbol = len(self._names)
+            self._ids[name] = symbol
+            self._names.append(name)
+        return symbol
+
+    def id(self, name: str) -> int:
+        return self._ids[name]
+
+    def name(self, symbol: int) -> str:
+        return self._names[symbol]
+
+    def names(self) -> list[str]:
+        return list(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+
+AGENTS = SymbolTable()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Several terminals simulated in separate processes.
+
+Each terminal is a `Simulation` with its own slots and agents. Country and company error counters
+are periodically exchanged through an aggregator running in the parent process, so that the agents
+of every terminal see (nearly) global error rates.
+"""
+import logging
+import random
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+from helpers import ErrorCounters, Statistics
+from simulation import Simulation
+import utils
+
+
+class StatisticsAggregator:
+    """Keeps the latest error counters of each terminal"""
+
+    def __init__(self, terminals: int):
+        self._counters = [None] * terminals
+
+    def update(self, terminal: int, counters: dict) -> dict:
+        """Stores the counters of the terminal and returns the sum of the counters of all other terminals"""
+        self._counters[terminal] = counters
+        merged = {'country': ErrorCounters(), 'company': ErrorCounters()}
+        for i, other in enumerate(self._counters):
+            if i == terminal or other is None:
+                continue
+            for key in merged.keys():
+                merged[key].add(*other[key])
+        return {key: counters.counters() for key, counters in merged.items()}
+
+
+def run_terminal(terminal: int, steps: int, sync_interval: int, seed, config: utils.Config, conn) -> None:
+    """Body of a terminal process"""
+    utils.CONFIG = config
+    random.seed(None if seed is None else seed + terminal)
+    statistics = Statistics()
+    simulation = Simulation(statistics)
+    start = time.perf_counter()
+    for tick in range(1, steps + 1):
+        simulation.step()
+        if sync_interval and tick % sync_interval == 0:
+            conn.send(('sync', statistics.shared_counters()))
+            statistics.update_remote_counters(conn.recv())
+    elapsed = time.perf_counter() - start
+    conn.send(('done', {'steps': steps, 'elapsed': elapsed, 'summary': statistics.summary()}))
+    conn.close()
+
+
+def run_terminals(terminals: int, steps: int, sync_interval: int, seed=None) -> (Statistics, list[dict]):
+    """Runs the terminals in parallel and serves their synchronization requests until all of them finish.
+
+    Returns statistics summed over all terminals and the results of the individual terminals.
+    """
+    aggregator = StatisticsAggregator(terminals)
+    connections = {}
+    processes = []
+    for i in range(terminals):
+        parent_conn, child_conn = Pipe()
+        process = Process(target=run_terminal, args=(i, steps, sync_interval, seed, utils.CONFIG, child_conn), name=f'Terminal{i + 1:02}')
+        process.start()
+        child_conn.close()
+        connections[parent_conn] = i
+        processes.append(process)
+
+    results = [None] * terminals
+    while connections:
+        for conn in wait(list(connections.keys())):
+            terminal = connections[conn]
+            try:
+                kind, payload = conn.recv()
+            except EOFError:
+                logging.error('Terminal%02d terminated unexpectedly', terminal + 1)
+                connections.pop(conn)
+                continue
+            if kind == 'sync':
+                conn.send(aggregator.update(terminal, payload))
+            else:
+                results[terminal] = payload
+                connections.pop(conn)
+                conn.close()
+    for process in processes:
+        process.join()
+
+    if None in results:
+        raise RuntimeError('some of the terminals have not finished')
+    return Statistics.from_summaries([result['summary'] for result in results]), results
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Decision tables compiled from a stand-in of the analysis with threshold scenarios."""
+import json
+import random
+
+import analysis
+import decision_tables
+import helpers
+from components import tax_query
+from simulation import Simulation
+
+
+def threshold_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
+    """Decisions shaped as those of the model: thresholds of the numeric inputs"""
+    if scenario == 'Dangerous':
+        return variable_value == 'Dangerous'
+    value = float(variable_value)
+    return value > 0.3 if scenario == 'VirtualInspection' else value < 0.8 or value > 1.5
+
+
+def test_table_answers_the_queries_of_a_simulation(config, tmp_path, monkeypatch):
+    model = tmp_path / 'model'
+    model.mkdir()
+    (model / 'model.xml').write_text('<model/>')
+    config.analysis.fake = False
+    config.analysis.model_path = str(model)
+    config.analysis.decision_table = str(tmp_path / 'table.json')
+    with open(config.analysis.decision_table, 'w') as f:
+        json.dump(decision_tables.compile_table(threshold_analysis, config.analysis.model_path), f)
+
+    called = []  # queries not answered by the table
+
+    def actual_execute_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
+        called.append((scenario, variable_name, variable_value))
+        return threshold_analysis(scenario, variable_name, variable_value)
+    answered = []
+
+    def check(backend):
+        def checked_execute_analysis(scenario: str, variable_name: str, variable_value: str) -> bool:
+            decision = backend(scenario, variable_name, variable_value)
+            answered.append(decision == threshold_analysis(scenario, variable_name, variable_value))
+            return decision
+        return checked_execute_analysis
+    monkeypatch.setattr(analysis, 'actual_execute_analysis', actual_execute_analysis)
+    monkeypatch.setattr(analysis, 'timed', check)
+    for name in ('execute_analysis', 'PREFETCHER', '_configured'):  # restored after the test
+        monkeypatch.setattr(analysis, name, getattr(analysis, name))
+    analysis.configure(config.analysis)
+
+    config.simulation.lazy_agents = 3  # the virtual clearances leave companies without a last tax
+    random.seed(1)
+    simulation = Simulation()
+    for _ in range(5000):
+        simulation.step()
+    assert len(answered) > 100
+    assert called == []  # including the containers of companies whose last tax is the default one
+    assert all(answered)
+
+
+def test_table_covers_the_tax_of_companies_without_a_last_tax(config, tmp_path):
+    table = decision_tables.DecisionTable(decision_tables.compile_table(threshold_analysis, str(tmp_path)))
+    statistics = helpers.Statistics()
+    random.seed(1)
+    for _ in range(500):
+        query = tax_query(helpers.generate_container(), statistics)
+        assert table.decide(*query) == threshold_analysis(*query)
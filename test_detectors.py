@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""The streaming detectors against their statistics recomputed from all decisions, and on simulated agents."""
+import math
+import random
+
+import pytest
+
+from detectors import EwmaChart, SequentialProbabilityRatioTest
+
+NORMAL, LAZY, FALSE_ALARM, MISS, WEIGHT = 0.05, 0.5, 0.001, 0.01, 0.1
+
+
+def sprt_alarms(decisions: list) -> list:
+    """Alarms of Wald's test restarted after each conclusion, with the likelihoods of the decisions since it"""
+    upper = math.log((1 - MISS) / FALSE_ALARM)
+    lower = math.log(MISS / (1 - FALSE_ALARM))
+    alarms = []
+    since = {}  # agent -> decisions since the last conclusion
+    for agent, virtual in decisions:
+        tested = since.setdefault(agent, [])
+        tested.append(virtual)
+        lazy = math.prod(LAZY if v else 1 - LAZY for v in tested)
+        normal = math.prod(NORMAL if v else 1 - NORMAL for v in tested)
+        ratio = math.log(lazy) - math.log(normal)
+        if ratio >= upper - 1e-9:
+            alarms.append(agent)
+            tested.clear()
+        elif ratio <= lower + 1e-9:
+            tested.clear()
+    return alarms
+
+
+def ewma_alarms(decisions: list) -> list:
+    """Alarms when the weighted average of all decisions of an agent crosses the control limit upwards"""
+    detector = EwmaChart(None, NORMAL, FALSE_ALARM, WEIGHT)
+    alarms = []
+    history = {}
+    over = {}
+    for agent, virtual in decisions:
+        values = history.setdefault(agent, [])
+        values.append(1. if virtual else 0.)
+        n = len(values)
+        average = (1 - WEIGHT) ** n * NORMAL + sum(WEIGHT * (1 - WEIGHT) ** (n - 1 - k) * x for k, x in enumerate(values))
+        if average > detector.limit and not over.get(agent):
+            alarms.append(agent)
+        over[agent] = average > detector.limit
+    return alarms
+
+
+def random_decisions(seed: int, n: int = 600) -> list:
+    rng = random.Random(seed)
+    rates = [rng.choice((NORMAL, LAZY, 0.2)) for _ in range(rng.randint(1, 5))]
+    agents = [rng.randrange(len(rates)) for _ in range(n)]
+    return [(agent, rng.random() < rates[agent]) for agent in agents]
+
+
+def alarms_of(detector_class, decisions: list, *args) -> list:
+    alarms = []
+    detector = detector_class(alarms.append, *args)
+    for agent, virtual in decisions:
+        detector.observe(agent, virtual)
+    return alarms
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sprt_matches_the_recomputed_test(seed):
+    decisions = random_decisions(seed)
+    assert alarms_of(SequentialProbabilityRatioTest, decisions, NORMAL, LAZY, FALSE_ALARM, MISS) == sprt_alarms(decisions)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_ewma_matches_the_recomputed_average(seed):
+    decisions = random_decisions(seed, 300)
+    assert alarms_of(EwmaChart, decisions, NORMAL, FALSE_ALARM, WEIGHT) == ewma_alarms(decisions)
+
+
+def simulated_agents(seed: int) -> list:
+    """Decisions of a lazy agent 0 and nine diligent ones taking turns"""
+    rng = random.Random(seed)
+    return [(agent, rng.random() < (LAZY if agent == 0 else NORMAL)) for _ in range(200) for agent in range(10)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sprt_detects_lazy_agent_repeatedly(seed):
+    alarms = alarms_of(SequentialProbabilityRatioTest, simulated_agents(seed), NORMAL, LAZY, FALSE_ALARM, MISS)
+    assert alarms.count(0) >= 10
+    assert len(alarms) - alarms.count(0) <= 3
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_ewma_detects_lazy_agent_early(seed):
+    alarms = []  # (agent, decisions of the lazy agent so far)
+    lazy_decisions = 0
+    detector = EwmaChart(lambda agent: alarms.append((agent, lazy_decisions)), NORMAL, FALSE_ALARM, WEIGHT)
+    for agent, virtual in simulated_agents(seed):
+        lazy_decisions += agent == 0
+        detector.observe(agent, virtual)
+    assert min(n for agent, n in alarms if agent == 0) <= 30
+    assert sum(agent != 0 for agent, _ in alarms) <= 0.02 * 9 * 200  # of the decisions of the diligent agents
+
+
+def test_sprt_rejects_inverted_rates():
+    with pytest.raises(ValueError):
+        SequentialProbabilityRatioTest(None, LAZY, NORMAL, FALSE_ALARM, MISS)
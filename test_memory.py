@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Memory of long headless runs stays flat (see benchmarks.py memory for longer runs)."""
+import gc
+import random
+import tracemalloc
+
+from memory import object_counts, steady_memory
+from simulation import Simulation
+
+WARMUP = 10000  # fills the bounded buffers, e.g. analysis.LATENCIES
+STEPS = 3000
+TOLERANCE = 4 * 1024  # bytes
+
+
+def run(simulation, steps: int) -> None:
+    for _ in range(steps):
+        simulation.step()
+    gc.collect()
+
+
+def test_headless_run_stays_flat(config):
+    random.seed(1)
+    tracemalloc.start()  # before the warmup, otherwise the replacement of the untraced objects looks like a growth
+    try:
+        simulation = Simulation()
+        run(simulation, WARMUP)
+        steady_memory()  # the first call compiles the filters of the snapshots
+        run(simulation, STEPS)
+        middle = steady_memory()
+        run(simulation, STEPS)
+        late = steady_memory()
+    finally:
+        tracemalloc.stop()
+    assert simulation.statistics.summary()['containers']['removed'] > 100
+    assert not simulation.removal_sinks
+    assert object_counts()['ContainerRecord'] == 0  # the records of removed containers are not kept
+    assert late - middle < TOLERANCE
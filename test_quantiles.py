@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""The quantile sketch against exact quantiles of random values."""
+import math
+import random
+
+import pytest
+
+from quantiles import QuantileSketch
+
+QUANTILES = (0., 0.1, 0.5, 0.9, 0.99, 1.)
+
+
+def exact_quantile(values: list, q: float) -> float:
+    return sorted(values)[math.floor(q * (len(values) - 1))]
+
+
+def random_values(rng: random.Random, n: int) -> list:
+    kind = rng.choice(('steps', 'lognormal', 'zeros'))
+    if kind == 'steps':
+        return [rng.randint(0, 500) for _ in range(n)]
+    if kind == 'lognormal':
+        return [rng.lognormvariate(3, 2) for _ in range(n)]
+    return [rng.choice((0, 0, rng.uniform(0, 10))) for _ in range(n)]
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_quantiles_within_relative_accuracy(seed):
+    rng = random.Random(seed)
+    values = random_values(rng, rng.randint(1, 3000))
+    sketch = QuantileSketch(0.01)
+    for value in values:
+        sketch.add(value)
+    assert len(sketch) == len(values)
+    for q in QUANTILES:
+        exact = exact_quantile(values, q)
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01 + 1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_merged_sketches_equal_the_sketch_of_all_values(seed):
+    rng = random.Random(seed)
+    parts = [random_values(rng, rng.randint(0, 500)) for _ in range(3)]
+    merged = QuantileSketch()
+    whole = QuantileSketch()
+    for part in parts:
+        sketch = QuantileSketch()
+        for value in part:
+            sketch.add(value)
+            whole.add(value)
+        merged.merge(QuantileSketch.from_dict(sketch.to_dict()))
+    assert merged.to_dict() == whole.to_dict()
+    for q in QUANTILES:
+        assert merged.quantile(q) == whole.quantile(q)
+
+
+def test_empty_sketch():
+    assert QuantileSketch().quantile(0.5) == 0.
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""The assignment and the nearest-item index of the schedulers against brute force on random inputs."""
+import itertools
+import math
+import random
+
+import pytest
+
+from scheduling import GridIndex, min_cost_matching
+
+
+def brute_force_cost(cost: list[list[float]]) -> float:
+    """Minimal total cost of an assignment of min(rows, columns) pairs"""
+    rows, columns = len(cost), len(cost[0])
+    if rows <= columns:
+        return min(sum(cost[i][j] for i, j in enumerate(chosen)) for chosen in itertools.permutations(range(columns), rows))
+    return min(sum(cost[i][j] for j, i in enumerate(chosen)) for chosen in itertools.permutations(range(rows), columns))
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_min_cost_matching_is_optimal(seed):
+    rng = random.Random(seed)
+    rows, columns = rng.randint(1, 6), rng.randint(1, 6)
+    cost = [[rng.choice((rng.uniform(-50, 100), rng.randint(0, 5))) for _ in range(columns)] for _ in range(rows)]
+    pairs = min_cost_matching(cost)
+    assert len(pairs) == min(rows, columns)
+    assert len({i for i, _ in pairs}) == len({j for _, j in pairs}) == len(pairs)
+    assert sum(cost[i][j] for i, j in pairs) == pytest.approx(brute_force_cost(cost))
+
+
+def test_min_cost_matching_of_nothing():
+    assert min_cost_matching([]) == []
+    assert min_cost_matching([[]]) == []
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_grid_index_finds_the_nearest(seed):
+    rng = random.Random(seed)
+    index = GridIndex(rng.choice((50, 100, 200)))
+    items = {}
+    for n in range(300):
+        if items and rng.random() < 0.4:
+            item = rng.choice(list(items))
+            index.remove(item, items.pop(item))
+        else:
+            items[n] = (rng.uniform(-500, 1500), rng.uniform(-500, 1500))
+            index.insert(n, items[n])
+        query = (rng.uniform(-800, 1800), rng.uniform(-800, 1800))
+        nearest = index.nearest(query)
+        if not items:
+            assert nearest is None
+        else:
+            assert math.dist(query, items[nearest]) == pytest.approx(min(math.dist(query, p) for p in items.values()))
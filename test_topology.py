@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Travel times against the stepwise movement of the agents."""
+import random
+
+import pytest
+
+from components import CustomsAgent, PortAuthorityOfficer, move_towards
+from topology import TravelTimes, trip_ticks
+
+
+def stepped_ticks(start: (float, float), target: (float, float), speed: float) -> int:
+    ticks = 0
+    position = start
+    while position != target:
+        position = move_towards(position, target, speed)
+        ticks += 1
+    return ticks
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_trip_ticks_match_the_movement(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        start = (rng.randint(0, 1200), rng.randint(0, 900))
+        if rng.random() < 0.3:  # trips of an exact multiple of the speed
+            target = (start[0] + rng.choice((-1, 1)) * 3 * rng.randint(0, 20), start[1] + rng.choice((-1, 1)) * 4 * rng.randint(0, 20))
+        else:
+            target = (rng.randint(0, 1200), rng.randint(0, 900))
+        speed = rng.choice((CustomsAgent.SPEED, PortAuthorityOfficer.SPEED, 5, 3.5))
+        assert trip_ticks(start, target, speed) == stepped_ticks(start, target, speed)
+
+
+def test_travel_times_keep_only_the_points():
+    points = ((0, 0), (100, 0), (0, 120))
+    times = TravelTimes(points)
+    assert times.ticks((0, 0), (100, 0), 50) == 2
+    assert times.ticks((0, 0), (0, 120), 50) == 3
+    assert times.ticks((0, 0), (1, 1), 50) == 1
+    assert set(times._ticks) == {((0, 0), (100, 0), 50), ((0, 0), (0, 120), 50)}
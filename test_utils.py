@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""The configuration file against the configuration dataclasses."""
+import dataclasses
+import os
+import typing
+
+import pytest
+import yaml
+
+import utils
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+
+
+def test_keys_of_the_configuration_file_are_fields():
+    with open(CONFIG_FILE) as f:
+        data = utils.field_names(yaml.safe_load(f))
+    sections = typing.get_type_hints(utils.Config)
+    assert set(data) <= set(sections)
+    for name, values in data.items():
+        assert set(values) <= {field.name for field in dataclasses.fields(sections[name])}, name
+
+
+def test_configuration_file_is_loaded(monkeypatch):
+    pytest.importorskip('dataclass_wizard')
+    monkeypatch.setenv('FLUIDTRUST_CFG', CONFIG_FILE)
+    config = utils.get_config()
+    assert config.simulation.plan_workers == 1
+    assert config.analysis.jvm_flags[0] == '-XX:TieredStopAtLevel=1'
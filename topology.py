@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Travel times between the fixed points of the terminal (homes of agents, the customs computer, inspection points of slots)."""
+import math
+from functools import cache
+
+
+def trip_ticks(start: (float, float), target: (float, float), speed: float) -> int:
+    """Number of steps of moving from start to target at the speed (as the agents do, see components.move_towards)"""
+    return math.ceil(math.dist(start, target) / speed)
+
+
+class TravelTimes:
+    """Trip steps between the points, each pair is computed on its first use; trips from or to other points are not kept"""
+
+    def __init__(self, points: tuple):
+        self.points = frozenset(points)
+        self._ticks = {}  # (a, b, speed) -> steps
+
+    def ticks(self, a: (float, float), b: (float, float), speed: float) -> int:
+        """Number of steps of the trip from a to b"""
+        key = (a, b, speed)
+        ticks = self._ticks.get(key)
+        if ticks is None:
+            ticks = trip_ticks(a, b, speed)
+            if a in self.points and b in self.points:
+                self._ticks[key] = ticks
+        return ticks
+
+
+@cache
+def travel_times(points: tuple) -> TravelTimes:
+    """Travel times of the topology, shared by all simulations with the same points"""
+    return TravelTimes(points)
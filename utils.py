@@ -1,10 +1,7 @@
 #!/usr/bin/env python3
 import logging
-import logging.config
-import yaml
 import os
-from dataclasses import dataclass
-from dataclass_wizard import YAMLWizard
+from dataclasses import dataclass, field
 
 
 def setup_logging(default_path='logging.yaml', default_level=logging.WARN, env_key='LOG_CFG') -> None:
@@ -19,6 +16,8 @@ def setup_logging(default_path='logging.yaml', default_level=logging.WARN, env_k
     if value:
         path = value
     if os.path.exists(path):
+        import yaml
+        import logging.config
         with open(path, 'rt') as f:
             config = yaml.safe_load(f.read())
         logging.config.dictConfig(config)
@@ -30,32 +29,147 @@ def setup_logging(default_path='logging.yaml', default_level=logging.WARN, env_k
 class ConfigAnalysis:
     model_path: str
     fake: bool
+    decision_table: str = ''  # file with decisions of the analysis (see decision_tables.py), empty = always call the analysis
+    verify_rate: float = 0.  # fraction of decisions from the table verified by calling the analysis
+    executable: str = 'analysis/eclipse'  # launcher of the analysis (python analysis_standin.py for testing)
+    launcher: str = 'eclipse'  # eclipse (as configured in eclipse.ini) or appcds (JVM flags and a class data sharing archive)
+    jvm_flags: list[str] = field(default_factory=list)  # appended to the flags of eclipse.ini by the appcds launcher
+    cds_archive: str = 'analysis/analysis.jsa'  # created by the first call of the appcds launcher
+    timeout: float = 60.  # in seconds, the analysis is killed after it, 0 = no timeout
+    failure_threshold: int = 5  # consecutive failed calls opening the circuit breaker
+    reset_timeout: float = 30.  # in seconds, how long the circuit breaker stays open
+    fallback: str = 'inspect'  # decision of failed calls: cache (the last one for the same input), inspect or fake
+    prefetch: bool = False  # start the analysis of a container in the background when it arrives to a slot
+    prefetch_workers: int = 4  # analysis calls executed at once by the prefetching
 
 
 @dataclass()
 class Simulation:
     lazy_agents: int
+    slots: int = 7
+    scheduler: str = 'first-idle'  # see scheduling.SCHEDULERS
+    data_dir: str = '.'  # directory of locations.txt, shipping.txt and amazondata_electronics.txt (see worldgen.py)
+    manifests: str = ''  # JSON-lines file with manifests of arriving containers, empty = randomly generated containers
+    read_ahead: int = 1024  # number of manifests parsed ahead
+    container_pool: int = 0  # removed containers kept for reuse, 0 = no reuse
+    stepping: str = 'sequential'  # sequential or two-phase (agents plan from the same state, then the plans are applied)
+    plan_workers: int = 1  # threads planning the steps of agents in the two-phase stepping
+    terminals: int = 1
+    sync_interval: int = 50  # in steps
+
+
+@dataclass()
+class ConfigAdmission:
+    reserve: int = 0  # idle customs agents kept for assisting PA officers
+    limit: int = 0  # max customs agents assisting PA officers at once, 0 = unlimited
+    priority: str = 'customs-check'  # work of customs agents assigned first: customs-check or pa-assistance
+    meet_at_container: bool = False  # PA officer meets the customs agent at the container instead of at the office
+
+
+@dataclass()
+class ConfigDetector:
+    method: str = 'threshold'  # detection of lazy customs agents: threshold (cumulative ratios), sprt or ewma (see detectors.py)
+    normal_rate: float = 0.05  # rate of virtual inspections of a diligent agent
+    lazy_rate: float = 0.5  # rate of virtual inspections of a lazy agent (sprt)
+    false_alarm: float = 0.001  # probability of an alarm of a diligent agent (per test in sprt, per decision in ewma)
+    miss_rate: float = 0.01  # probability of not detecting a lazy agent (per test, sprt)
+    ewma_weight: float = 0.1  # weight of the last decision in the moving average (ewma)
+
+
+@dataclass()
+class ConfigYard:
+    capacity: int = 0  # containers waiting for an empty slot, 0 = no yard
+    overflow: str = 'block'  # arrival when the yard is full: block (waits for a place), drop or divert
+
+
+@dataclass()
+class ConfigMetrics:
+    port: int = 0  # HTTP server on localhost, 0 = disabled
+    file: str = ''  # periodically rewritten snapshot file, empty = disabled
+    interval: float = 1.0  # in seconds, how often the snapshot file is written
+    publish_every: int = 10  # in steps, how often the simulation publishes a snapshot
+
+
+@dataclass()
+class ConfigHistory:
+    archives: list[list[int]] = field(default_factory=lambda: [[1, 2000], [20, 2000], [400, 2000]])  # [samples per row, rows], finest first
+    every: int = 10  # in steps, how often the metrics are sampled (1 = every step)
+    file: str = ''  # JSON file with the history written at the end of a headless run, empty = disabled
+    chart: bool = False  # window with charts of the history in the GUI
+    chart_span: int = 2000  # in steps, the time range of the charts
+    chart_refresh: float = 1.0  # in seconds, how often the charts are redrawn
+
+
+@dataclass()
+class ConfigRecord:
+    output: str = ''  # directory (PNG files) or video file (encoded by ffmpeg) of a headless run, empty = disabled
+    every: int = 10  # in steps, how often a frame is rendered
+    fps: int = 30  # frames per second of the video
+    buffers: int = 8  # frames waiting for the encoder
+    scale: float = 1.0  # of the frames to the GUI
+
+
+@dataclass()
+class ConfigMemory:
+    every: int = 0  # in steps, how often the memory of a headless run is sampled (see memory.py), 0 = disabled
+    trace: bool = False  # memory attributed to the allocating modules by tracemalloc (slows down all allocations, several times)
+    frames: int = 1  # of the tracebacks of the allocations, more frames attribute generated code (e.g. __init__ of dataclasses) to its callers at a higher cost
+    top: int = 10  # modules reported
+
+
+@dataclass()
+class ConfigCache:
+    directory: str = ''  # of the results of seeded headless runs and sweeps (see results.py), empty = disabled
+    max_size: int = 512  # in MB, the least recently used results are evicted over it
+    traces: bool = False  # store the history of the metrics with the results of sweeps
 
 
 @dataclass
-class Config(YAMLWizard):
+class Config:
     analysis: ConfigAnalysis
     simulation: Simulation
+    admission: ConfigAdmission = field(default_factory=ConfigAdmission)
+    yard: ConfigYard = field(default_factory=ConfigYard)
+    detector: ConfigDetector = field(default_factory=ConfigDetector)
+    metrics: ConfigMetrics = field(default_factory=ConfigMetrics)
+    history: ConfigHistory = field(default_factory=ConfigHistory)
+    record: ConfigRecord = field(default_factory=ConfigRecord)
+    memory: ConfigMemory = field(default_factory=ConfigMemory)
+    cache: ConfigCache = field(default_factory=ConfigCache)
 
 
 default_config = Config(analysis=ConfigAnalysis('CaseStudies/bundles/fluidTrustCaseStudy-Simplified/', False),
                         simulation=Simulation(0))
 
 
+def field_names(data):
+    """The keys of the configuration file (kebab-case) as the names of the fields, so the loading does not
+    depend on the key case conversion of the dataclass_wizard version"""
+    if isinstance(data, dict):
+        return {key.replace('-', '_'): field_names(value) for key, value in data.items()}
+    return data
+
+
 def get_config(default_path='config.yaml', env_key='FLUIDTRUST_CFG') -> Config:
     path = default_path
     value = os.getenv(env_key, None)
     if value:
         path = value
     if os.path.exists(path):
-        return Config.from_yaml_file(path)
+        import yaml
+        from dataclass_wizard import fromdict
+        with open(path, 'rt') as f:
+            return fromdict(Config, field_names(yaml.safe_load(f)))
     else:
         return default_config
 
 
-CONFIG = get_config()
+# the default configuration is used until load_config() is called by the entry point
+CONFIG = default_config
+
+
+def load_config() -> Config:
+    """Reads the configuration file (see get_config) and makes it the current configuration"""
+    global CONFIG
+    CONFIG = get_config()
+    return CONFIG
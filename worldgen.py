@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Generator of synthetic worlds (countries, shipping companies, item catalogs and manifests) for scale testing.
+
+The files have the formats of locations.txt, shipping.txt and amazondata_electronics.txt, so a simulation uses
+them with simulation->data-dir set to the output directory. The distributions are skewed: most countries are of
+low risk and a few of high risk, product types and prices are heavy tailed, and the traffic of the manifests
+follows Zipf's law over countries, companies and items.
+
+Usage: python worldgen.py --output DIR [--countries N] [--companies N] [--items N] [--manifests N], see python worldgen.py --help
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+
+from helpers import DANGEROUS_TYPES
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ra', 'ne', 'su', 'to', 'va', 'di', 'en', 'or', 'ban', 'cor', 'del', 'fir', 'gan', 'hal', 'is', 'jor', 'mar')
+COMPANY_SUFFIXES = ('Lines', 'Shipping', 'Maritime', 'Logistics', 'Container Line', 'Freight')
+# product types with their relative frequencies (Zipf-like), the dangerous ones are rare
+PRODUCT_TYPES = [('HEADPHONES', 30), ('CABLE_OR_ADAPTER', 25), ('PHONE_ACCESSORY', 20), ('SPEAKERS', 12), ('CAMERA', 10), ('TV', 8),
+                 ('COMPUTER_COMPONENT', 8), ('PORTABLE_AUDIO', 6), ('MONITOR', 5), ('PRINTER', 3), ('NETWORKING_DEVICE', 3),
+                 ('GPS_OR_NAVIGATION_SYSTEM', 1), ('SURVEILANCE_SYSTEMS', 1)]
+assert all(kind in dict(PRODUCT_TYPES) for kind in DANGEROUS_TYPES)
+
+
+def names(rng: random.Random, count: int, suffixes=('',)):
+    """Unique pronounceable names"""
+    seen = set()
+    for i in itertools.count():
+        if len(seen) == count:
+            return
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        suffix = rng.choice(suffixes)
+        name = f'{name} {suffix}'.strip()
+        if name in seen:
+            name = f'{name} {i}'
+        if name not in seen:
+            seen.add(name)
+            yield name
+
+
+def risk(rng: random.Random) -> int:
+    """Heavy tailed probability in percents (most countries low, a few high)"""
+    return min(100, int(rng.paretovariate(1.5) * 3))
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    """Cumulative weights of ranks 1..count"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class ZipfSampler:
+    def __init__(self, rng: random.Random, values: list, exponent: float = 1.1):
+        self.rng = rng
+        self.values = values
+        self.cumulative = zipf_weights(len(values), exponent)
+
+    def __call__(self):
+        return self.values[bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+
+def write_locations(path: str, countries: list[str], rng: random.Random) -> None:
+    with open(path, 'w') as f:
+        for name in countries:
+            f.write(f'{name}\t{risk(rng)}\t{risk(rng)}\n')
+
+
+def write_companies(path: str, companies: list[str]) -> None:
+    with open(path, 'w') as f:
+        for name in companies:
+            f.write(f'{name}\n')
+
+
+def write_catalog(path: str, count: int, rng: random.Random) -> list[tuple]:
+    """Writes the catalog, returns (title, price) of the items"""
+    kinds = [kind for kind, _ in PRODUCT_TYPES]
+    cumulative = list(itertools.accumulate(weight for _, weight in PRODUCT_TYPES))
+    items = []
+    with open(path, 'w') as f:
+        for i in range(count):
+            kind = rng.choices(kinds, cum_weights=cumulative)[0]
+            price = max(1, int(rng.lognormvariate(4.5, 1.0)))  # median about 90 USD
+            title = f'{kind.title().replace("_", " ")} {i:07}'
+            f.write(f'ITEM {i}\nTitle={title}\nProductTypeName={kind}\nListPrice={price}USD\n\n')
+            items.append((title, price))
+    return items
+
+
+def write_manifests(path: str, count: int, countries: list[str], companies: list[str], items: list[tuple], rng: random.Random,
+                    period: int = 20, items_per_container: int = 10) -> None:
+    """Manifests of containers arriving on average each period steps, skewed to the first countries, companies and items"""
+    country = ZipfSampler(rng, countries)
+    company = ZipfSampler(rng, companies)
+    item = ZipfSampler(rng, items)
+    arrival = 0
+    with open(path, 'w') as f:
+        for _ in range(count):
+            arrival += max(1, int(rng.expovariate(1 / period)))
+            content = {title: price for title, price in (item() for _ in range(items_per_container))}
+            tax = max(1, sum(content.values()) * 15 // 100)
+            record = {'arrival': arrival, 'items': list(content), 'source': country(), 'destination': country(),
+                      'company': company(), 'declared_tax': tax if rng.random() > 0.1 else tax // 2}
+            f.write(json.dumps(record) + '\n')
+
+
+def generate(output: str, countries: int, companies: int, items: int, manifests: int = 0, seed: int = 1) -> None:
+    os.makedirs(output, exist_ok=True)
+    rng = random.Random(seed)
+    country_names = list(names(rng, countries))
+    company_names = list(names(rng, companies, COMPANY_SUFFIXES))
+    write_locations(os.path.join(output, 'locations.txt'), country_names, rng)
+    write_companies(os.path.join(output, 'shipping.txt'), company_names)
+    catalog = write_catalog(os.path.join(output, 'amazondata_electronics.txt'), items, rng)
+    if manifests:
+        write_manifests(os.path.join(output, 'manifests.jsonl'), manifests, country_names, company_names, catalog, rng)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes a synthetic world for the simulation (set simulation->data-dir to the output).')
+    parser.add_argument('--output', required=True, help='output directory')
+    parser.add_argument('--countries', type=int, default=100000, help='number of countries')
+    parser.add_argument('--companies', type=int, default=10000, help='number of shipping companies')
+    parser.add_argument('--items', type=int, default=1000000, help='number of items of the catalog')
+    parser.add_argument('--manifests', type=int, default=0, help='number of manifests of arriving containers (manifests.jsonl)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    args = parser.parse_args()
+    generate(args.output, args.countries, args.companies, args.items, args.manifests, args.seed)
+    print(f'World of {args.countries} countries, {args.companies} companies and {args.items} items written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()